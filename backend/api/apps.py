@@ -1,6 +1,16 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .db import configure_sqlite_connection
+
+        connection_created.connect(
+            configure_sqlite_connection,
+            dispatch_uid="api.db.configure_sqlite_connection",
+        )
@@ -0,0 +1,97 @@
+"""
+Versioned per-user cache for read-heavy endpoints.
+
+Every cached payload key embeds the user's current version number for a
+scope ("google", "notifications", ...). Invalidating a scope bumps that
+version, so stale entries are never read again and simply expire. Cache
+failures are logged and fall back to computing the value.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import time
+from typing import Any, Callable
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+SCOPE_GOOGLE = "google"
+SCOPE_BRIGHTSPACE = "brightspace"
+SCOPE_NOTIFICATIONS = "notifications"
+SCOPE_EVENTS = "events"
+
+_MISSING = object()
+
+
+def _version_key(scope: str, user_id: int) -> str:
+    return f"ver:{scope}:{user_id}"
+
+
+def _fresh_version() -> int:
+    # Time-based so a version key lost to eviction never reuses an old number.
+    return time.time_ns() // 1000
+
+
+def _get_version(scope: str, user_id: int) -> int:
+    key = _version_key(scope, user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _fresh_version(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def _bump_version(scope: str, user_id: int) -> None:
+    key = _version_key(scope, user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _fresh_version(), timeout=None)
+    except Exception as exc:
+        logger.warning("Failed to invalidate %s cache for user %s: %s", scope, user_id, exc)
+
+
+def invalidate_user_cache(scope: str, user_id: int | None) -> None:
+    """Drop cached payloads for ``scope`` once the current transaction commits."""
+    if user_id is None:
+        return
+    transaction.on_commit(lambda: _bump_version(scope, user_id))
+
+
+def cached_for_user(
+    scope: str,
+    user_id: int,
+    name: str,
+    builder: Callable[[], Any],
+    timeout: int | None = None,
+) -> Any:
+    """Return the cached value for ``name`` or compute it with ``builder``."""
+    if timeout is None:
+        timeout = getattr(settings, "API_CACHE_TIMEOUT_SECONDS", 300)
+    try:
+        version = _get_version(scope, user_id)
+        key = f"{scope}:{user_id}:{version}:{name}"
+        value = cache.get(key, _MISSING)
+    except Exception as exc:
+        logger.warning("Cache read failed for %s/%s: %s", scope, name, exc)
+        return builder()
+
+    if value is not _MISSING:
+        return value
+
+    value = builder()
+    try:
+        cache.set(key, value, timeout)
+    except Exception as exc:
+        logger.warning("Cache write failed for %s/%s: %s", scope, name, exc)
+    return value
+
+
+def query_fingerprint(*parts: Any) -> str:
+    """Short stable digest for building keys out of request parameters."""
+    raw = "|".join("" if part is None else str(part) for part in parts)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
@@ -0,0 +1,59 @@
+import threading
+from contextlib import contextmanager, nullcontext
+from itertools import islice
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+SQLITE_JOURNAL_MODES = {"delete", "truncate", "persist", "memory", "wal", "off"}
+SQLITE_SYNCHRONOUS_MODES = {"off", "normal", "full", "extra"}
+
+# SQLite allows a single writer at a time. Serializing writers inside the
+# process keeps bulk imports from tripping over each other's locks.
+_sqlite_write_lock = threading.RLock()
+
+
+def configure_sqlite_connection(sender, connection, **kwargs):
+  """connection_created hook that applies the SQLITE_* pragmas."""
+  if connection.vendor != "sqlite":
+    return
+
+  journal_mode = getattr(settings, "SQLITE_JOURNAL_MODE", "wal").lower()
+  synchronous = getattr(settings, "SQLITE_SYNCHRONOUS", "normal").lower()
+  if journal_mode not in SQLITE_JOURNAL_MODES:
+    journal_mode = "wal"
+  if synchronous not in SQLITE_SYNCHRONOUS_MODES:
+    synchronous = "normal"
+
+  pragmas = [
+    f"PRAGMA journal_mode={journal_mode}",
+    f"PRAGMA synchronous={synchronous}",
+    f"PRAGMA busy_timeout={int(getattr(settings, 'SQLITE_BUSY_TIMEOUT_MS', 5000))}",
+    f"PRAGMA mmap_size={int(getattr(settings, 'SQLITE_MMAP_SIZE', 0))}",
+    # Negative cache_size is expressed in KiB rather than pages.
+    f"PRAGMA cache_size=-{int(getattr(settings, 'SQLITE_CACHE_SIZE_KB', 2000))}",
+    "PRAGMA temp_store=memory",
+  ]
+  with connection.cursor() as cursor:
+    for pragma in pragmas:
+      cursor.execute(pragma)
+
+
+@contextmanager
+def serialized_write(using: str = DEFAULT_DB_ALIAS):
+  """Run a block in one transaction, serializing writers when on SQLite."""
+  lock = _sqlite_write_lock if connections[using].vendor == "sqlite" else nullcontext()
+  with lock:
+    with transaction.atomic(using=using):
+      yield
+
+
+def chunked(iterable, size: int | None = None):
+  """Yield lists of at most ``size`` items (BULK_WRITE_CHUNK_SIZE by default)."""
+  size = size or getattr(settings, "BULK_WRITE_CHUNK_SIZE", 200)
+  iterator = iter(iterable)
+  while True:
+    batch = list(islice(iterator, size))
+    if not batch:
+      return
+    yield batch
@@ -1,22 +1,291 @@
 """
 Email parsing module using Groq AI to extract calendar event details.
+
+Structured invites (a text/calendar part, as sent by Google Calendar and
+Outlook) are read directly with icalendar; only free-form text goes to Groq.
 """
-import os
+import re
 import json
+import hashlib
 import logging
-from datetime import datetime
-from typing import Dict, Any
+from datetime import date, datetime, timedelta
+from typing import Dict, Any, List, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 
-from groq import Groq
 from django.conf import settings
+from django.core.cache import cache
+from icalendar import Calendar
+
+from .llm import LLMError, complete_json, estimate_tokens, get_client
 
 logger = logging.getLogger(__name__)
 
+# Bump when the prompt or post-processing changes so old cached results are
+# no longer read.
+PARSE_CACHE_VERSION = 4
+PARSE_CACHE_HITS_KEY = "llm:parse:hits"
+PARSE_CACHE_MISSES_KEY = "llm:parse:misses"
+
+_QUOTE_PREFIX_RE = re.compile(r"^[ \t]*(?:>[ \t]?)+", re.MULTILINE)
+_WHITESPACE_RE = re.compile(r"\s+")
+# iTIP methods that describe an event to add; the others (REPLY, CANCEL,
+# COUNTER, REFRESH, ...) are answers about an existing one.
+INVITE_METHODS = ("", "REQUEST", "PUBLISH")
+_VCALENDAR_RE = re.compile(r"BEGIN:VCALENDAR.*?END:VCALENDAR", re.DOTALL | re.IGNORECASE)
+
+# Preprocessing before text goes into a prompt.
+_REPLY_MARKER_RE = re.compile(
+    r"^(?:On [^\n]{1,200}(?:\n[^\n]{1,200})?\bwrote:[ \t]*$|-{3,}[ \t]*Original Message[ \t]*-{3,})",
+    re.MULTILINE | re.IGNORECASE,
+)
+_QUOTED_LINE_RE = re.compile(r"^[ \t]*>.*$\n?", re.MULTILINE)
+_SIGNATURE_RE = re.compile(r"^-- ?$", re.MULTILINE)
+_SENT_FROM_RE = re.compile(r"^[ \t]*Sent from my [^\n]*$\n?", re.MULTILINE | re.IGNORECASE)
+_DISCLAIMER_RE = re.compile(
+    r"\b(?:confidentiality notice|disclaimer|this (?:e-?mail|message)[^.]{0,80}"
+    r"(?:confidential|intended (?:solely |only )?for)|to unsubscribe|you are receiving this)",
+    re.IGNORECASE,
+)
+_URL_RE = re.compile(r"https?://[^\s<>\"')\]]+", re.IGNORECASE)
+_MEETING_HOSTS = ("zoom.us", "teams.microsoft.com", "teams.live.com", "meet.google.com", "webex.com")
+_TRACKING_PARAM_RE = re.compile(r"^(?:utm_\w+|mc_[ce]id|fbclid|gclid|_hs\w+)$", re.IGNORECASE)
+_SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?])[ \t]+|\n+")
+_DATE_TIME_RE = re.compile(
+    r"\b(?:today|tonight|tomorrow|next (?:week|month)|monday|tuesday|wednesday|thursday|friday|saturday|sunday"
+    r"|jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|june?|july?|aug(?:ust)?|sept?(?:ember)?"
+    r"|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?|noon|midnight)\b"
+    # "May" only next to a day number, so the verb ("we may need...") doesn't count.
+    r"|\bmay\s+\d{1,2}(?:st|nd|rd|th)?\b|\b\d{1,2}(?:st|nd|rd|th)?\s+may\b"
+    r"|\b\d{1,2}(?::\d{2})?\s*(?:am|pm)\b|\b\d{1,2}:\d{2}\b|\b\d{1,4}[/-]\d{1,2}[/-]\d{1,4}\b",
+    re.IGNORECASE,
+)
+
+
+def normalize_email_text(email_text: str) -> str:
+    """
+    Reduce an email to the text that matters for parsing.
+
+    Quote markers added by replies and forwards and differences in
+    whitespace are dropped, so the same message reaching us twice hashes
+    the same.
+    """
+    text = _QUOTE_PREFIX_RE.sub("", email_text)
+    return _WHITESPACE_RE.sub(" ", text).strip()
+
+
+def parse_cache_key(email_text: str, reference: datetime) -> str:
+    """
+    Key a parse result by normalized content and reference date.
+
+    Relative phrases ("tomorrow", "next Tuesday") resolve differently from
+    one day to the next, so results are only shared within the same day.
+    """
+    digest = hashlib.sha256(normalize_email_text(email_text).encode("utf-8")).hexdigest()
+    return f"llm:parse:v{PARSE_CACHE_VERSION}:{reference.date().isoformat()}:{digest}"
+
+
+def _count(key: str) -> None:
+    try:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key)
+    except Exception as exc:
+        logger.warning(f"Failed to record email parse cache metric {key}: {exc}")
+
+
+def parse_cache_stats() -> Dict[str, Any]:
+    """Return hit/miss counts and hit rate of the email parse cache."""
+    try:
+        counts = cache.get_many([PARSE_CACHE_HITS_KEY, PARSE_CACHE_MISSES_KEY])
+    except Exception as exc:
+        logger.warning(f"Failed to read email parse cache metrics: {exc}")
+        counts = {}
+    hits = counts.get(PARSE_CACHE_HITS_KEY, 0)
+    misses = counts.get(PARSE_CACHE_MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": round(hits / total, 3) if total else 0.0,
+    }
+
+
+def parse_calendar_invite(ics_text: str) -> Optional[Dict[str, Any]]:
+    """
+    Read an iCalendar invite into the same shape parse_email_to_event returns.
+
+    Returns None when there is no usable VEVENT, so the caller can fall back
+    to the AI parser. Raises ValueError for anything but an invite or a
+    published event (METHOD REQUEST, PUBLISH or none): cancellations, replies,
+    counter-proposals and refresh requests.
+    """
+    from .feeds import recurrence_series
+
+    try:
+        calendar = Calendar.from_ical(ics_text)
+    except ValueError:
+        return None
+    method = str(calendar.get("method", "")).upper()
+    if method == "CANCEL":
+        raise ValueError("The calendar invite was cancelled")
+    if method not in INVITE_METHODS:
+        # RSVPs and counter-proposals to the organizer are not new events.
+        raise ValueError(f"Calendar {method} messages are not event invites")
+    component = next(
+        (vevent for vevent in calendar.walk("vevent") if vevent.get("dtstart") is not None and "recurrence-id" not in vevent),
+        None,
+    )
+    if component is None:
+        return None
+
+    start = component.get("dtstart").dt
+    all_day = isinstance(start, date) and not isinstance(start, datetime)
+    if all_day:
+        start = datetime.combine(start, datetime.min.time())
+    if component.get("dtend") is not None:
+        end = component.get("dtend").dt
+        if all_day:
+            # DTEND is exclusive for all-day events.
+            end = datetime.combine(end, datetime.min.time()) - timedelta(seconds=1)
+    elif component.get("duration") is not None:
+        end = start + component.get("duration").dt
+    else:
+        end = start + (timedelta(days=1, seconds=-1) if all_day else timedelta(hours=1))
+    if end <= start:
+        end = start + timedelta(hours=1)
+
+    attendees = component.get("attendee", [])
+    if not isinstance(attendees, list):
+        attendees = [attendees]
+    event_data = {
+        "title": str(component.get("summary", "")).strip() or "Calendar event",
+        "start": start,
+        "end": end,
+        "description": str(component.get("description", "")).strip(),
+        "all_day": all_day,
+        "location": str(component.get("location", "")).strip(),
+        "attendees": [re.sub(r"^mailto:", "", str(attendee), flags=re.IGNORECASE) for attendee in attendees],
+        "recurrence_frequency": "none",
+        "recurrence_interval": 1,
+        "recurrence_count": None,
+        "recurrence_end_date": None,
+        "timezone": getattr(start.tzinfo, "key", None) or ("UTC" if start.tzinfo is None else str(start.tzinfo)),
+    }
+    rule = component.get("rrule")
+    series = recurrence_series(rule, start, all_day) if rule is not None else None
+    if series and len(series) == 1:
+        event_data.update(series[0][2])
+    elif rule is not None:
+        logger.info(f"Calendar invite '{event_data['title']}' has a recurrence rule the app cannot store")
+    return event_data
+
+
+def _clean_url(match) -> str:
+    url = match.group(0)
+    parts = urlsplit(url)
+    host = (parts.hostname or "").lower()
+    if any(host == meeting or host.endswith(f".{meeting}") for meeting in _MEETING_HOSTS):
+        return url
+    query = [(key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+             if not _TRACKING_PARAM_RE.match(key)]
+    url = urlunsplit(parts._replace(query=urlencode(query)))
+    # Long opaque links are click trackers; the model can't use them anyway.
+    return url if len(url) <= 120 else "[link]"
+
+
+def _strip_boilerplate(email_text: str) -> str:
+    text = email_text.replace("\r\n", "\n")
+
+    # Quoted history goes only when the new part still mentions a date or
+    # time; otherwise the event is probably in the quoted message.
+    marker = _REPLY_MARKER_RE.search(text)
+    if marker and _DATE_TIME_RE.search(text[:marker.start()]):
+        text = text[:marker.start()]
+    unquoted = _QUOTED_LINE_RE.sub("", text)
+    if _DATE_TIME_RE.search(_REPLY_MARKER_RE.sub("", unquoted)):
+        text = unquoted
+
+    signature = _SIGNATURE_RE.search(text)
+    if signature:
+        text = text[:signature.start()]
+    text = _SENT_FROM_RE.sub("", text)
+    paragraphs = [
+        paragraph for paragraph in re.split(r"\n[ \t]*\n", text)
+        if not _DISCLAIMER_RE.search(paragraph)
+    ]
+    text = "\n\n".join(paragraphs)
+    text = _URL_RE.sub(_clean_url, text)
+    return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+
+def _truncate_to_budget(text: str, budget: int) -> str:
+    """
+    Keep the sentences that carry dates and times (with their neighbours and
+    the opening lines) until ``budget`` tokens are used, in original order.
+    """
+    sentences = [sentence.strip() for sentence in _SENTENCE_SPLIT_RE.split(text) if sentence.strip()]
+    dated = {index for index, sentence in enumerate(sentences) if _DATE_TIME_RE.search(sentence)}
+    context = {neighbour for index in dated for neighbour in (index - 1, index + 1)} | {0, 1}
+    order = sorted(
+        range(len(sentences)),
+        key=lambda index: (0 if index in dated else 1 if index in context else 2, index),
+    )
+    kept, used = set(), 0
+    for index in order:
+        tokens = estimate_tokens(sentences[index])
+        if used + tokens > budget:
+            continue
+        kept.add(index)
+        used += tokens
+
+    pieces = []
+    for index in sorted(kept):
+        if pieces and index - 1 not in kept:
+            pieces.append("[…]")
+        pieces.append(sentences[index])
+    return "\n".join(pieces)
+
+
+def prepare_email_text(email_text: str) -> str:
+    """
+    Shrink an email before it goes into a prompt.
+
+    Quoted reply history, signatures, disclaimers and tracking links are
+    removed. What remains is cut down to EMAIL_PARSE_MAX_INPUT_TOKENS around
+    the sentences that mention dates and times. The saving is logged per
+    email.
+    """
+    before = estimate_tokens(email_text)
+    text = _strip_boilerplate(email_text) or email_text.strip()
+    budget = getattr(settings, "EMAIL_PARSE_MAX_INPUT_TOKENS", 1500)
+    if budget and estimate_tokens(text) > budget:
+        text = _truncate_to_budget(text, budget) or text[:budget * 4]
+    after = estimate_tokens(text)
+    if after < before:
+        logger.info(f"Email prompt trimmed from ~{before} to ~{after} tokens (saved ~{before - after})")
+    return text
+
+
+def _invite_in_text(email_text: str) -> Optional[Dict[str, Any]]:
+    """Fast path for emails that are (or contain) a raw VCALENDAR block."""
+    match = _VCALENDAR_RE.search(email_text)
+    if match is None:
+        return None
+    event_data = parse_calendar_invite(match.group(0))
+    if event_data is not None:
+        logger.info(f"Parsed calendar invite without AI: {event_data['title']}")
+    return event_data
+
 
 def parse_email_to_event(email_text: str) -> Dict[str, Any]:
     """
     Parse email text using Groq AI to extract calendar event details.
 
+    Text holding a raw VCALENDAR block is read with parse_calendar_invite
+    instead. Results are cached for EMAIL_PARSE_CACHE_SECONDS by normalized
+    content and reference date, so the same email seen again the same day
+    (a forward, a webhook redelivery, a manual paste of a message Gmail
+    already parsed) does not call Groq again.
+
     Args:
         email_text: Raw email text content
 
@@ -30,19 +299,168 @@ def parse_email_to_event(email_text: str) -> Dict[str, Any]:
     if not email_text or not email_text.strip():
         raise ValueError("Email text cannot be empty")
 
-    # Get API key from environment
-    api_key = os.getenv("GROQ_API_KEY")
-    if not api_key:
-        raise ValueError("GROQ_API_KEY not configured in environment")
+    invite = _invite_in_text(email_text)
+    if invite is not None:
+        return invite
 
-    # Initialize Groq client
-    client = Groq(api_key=api_key)
+    now = datetime.now()
+    timeout = getattr(settings, "EMAIL_PARSE_CACHE_SECONDS", 86400)
+    if not timeout:
+        return _parse_with_groq(email_text, now)
+
+    cached = _cached_result(email_text, now)
+    if cached is not None:
+        logger.info(f"Email parse cache hit: {cached['title']}")
+        return cached
+
+    event_data = _parse_with_groq(email_text, now)
+    _store_result(email_text, now, event_data, timeout)
+    return event_data
+
+
+def parse_emails_to_events(emails: Dict[str, str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Parse several emails, packing them into as few Groq calls as possible.
+
+    Args:
+        emails: Raw email text keyed by message id
+
+    Returns:
+        Event dictionaries (as from parse_email_to_event) keyed by message id.
+        Emails that could not be parsed are logged and left out.
+
+    Raw calendar invites and cached results are used first. The rest go to
+    Groq in batches of up to EMAIL_PARSE_BATCH_SIZE emails and
+    EMAIL_PARSE_BATCH_TOKENS estimated prompt tokens, with one JSON array
+    back per batch, after each email is trimmed by prepare_email_text. Any
+    email the batch answer leaves out or gets wrong is retried on its own.
+    """
+    now = datetime.now()
+    timeout = getattr(settings, "EMAIL_PARSE_CACHE_SECONDS", 86400)
+    results = {}
+    pending = {}
+    for message_id, email_text in emails.items():
+        if not email_text or not email_text.strip():
+            continue
+        try:
+            invite = _invite_in_text(email_text)
+        except ValueError as e:
+            logger.info(f"Skipping email {message_id}: {e}")
+            continue
+        if invite is not None:
+            results[message_id] = invite
+            continue
+        cached = _cached_result(email_text, now) if timeout else None
+        if cached is not None:
+            results[message_id] = cached
+        else:
+            pending[message_id] = email_text
+
+    prepared = {message_id: prepare_email_text(email_text) for message_id, email_text in pending.items()}
+    for batch in _pack_batches(prepared):
+        parsed = _parse_batch_with_groq(batch, pending, now) if len(batch) > 1 else {}
+        for message_id, prompt_text in batch.items():
+            event_data = parsed.get(message_id)
+            if event_data is None:
+                try:
+                    event_data = _parse_with_groq(pending[message_id], now, prompt_text)
+                except ValueError as e:
+                    logger.warning(f"Failed to parse email {message_id}: {e}")
+                    continue
+            results[message_id] = event_data
+            if timeout:
+                _store_result(pending[message_id], now, event_data, timeout)
+    return results
+
+
+def _cached_result(email_text: str, now: datetime):
+    try:
+        cached = cache.get(parse_cache_key(email_text, now))
+    except Exception as exc:
+        logger.warning(f"Email parse cache read failed: {exc}")
+        return None
+    _count(PARSE_CACHE_HITS_KEY if cached is not None else PARSE_CACHE_MISSES_KEY)
+    return dict(cached) if cached is not None else None
+
+
+def _store_result(email_text: str, now: datetime, event_data: Dict[str, Any], timeout: int) -> None:
+    try:
+        cache.set(parse_cache_key(email_text, now), event_data, timeout)
+    except Exception as exc:
+        logger.warning(f"Email parse cache write failed: {exc}")
 
-    # Create the prompt for AI
-    current_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    prompt = f"""You are a calendar event parser. Extract event details from the following email and return ONLY a valid JSON object with these exact fields:
 
-Required fields:
+def _pack_batches(emails: Dict[str, str]) -> List[Dict[str, str]]:
+    """Group emails so each batch stays within the size and token budget."""
+    max_size = getattr(settings, "EMAIL_PARSE_BATCH_SIZE", 8)
+    max_tokens = getattr(settings, "EMAIL_PARSE_BATCH_TOKENS", 6000)
+    batches = []
+    current, used = {}, 0
+    for message_id, email_text in emails.items():
+        tokens = estimate_tokens(email_text)
+        if current and (len(current) >= max_size or used + tokens > max_tokens):
+            batches.append(current)
+            current, used = {}, 0
+        current[message_id] = email_text
+        used += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _event_from_response(event_data: Any, email_text: str) -> Dict[str, Any]:
+    """Validate one parsed event and fill in defaults for optional fields."""
+    if not isinstance(event_data, dict):
+        raise ValueError("AI returned an event that is not a JSON object")
+
+    # Validate required fields
+    required_fields = ["title", "start", "end"]
+    for field in required_fields:
+        if field not in event_data:
+            raise ValueError(f"Missing required field: {field}")
+
+    # Convert ISO datetime strings to datetime objects
+    event_data['start'] = datetime.fromisoformat(event_data['start'].replace('Z', '+00:00'))
+    event_data['end'] = datetime.fromisoformat(event_data['end'].replace('Z', '+00:00'))
+
+    # Set defaults for optional fields
+    if 'all_day' not in event_data:
+        event_data['all_day'] = False
+
+    if 'description' not in event_data or not event_data['description']:
+        event_data['description'] = email_text.strip()
+
+    if 'location' not in event_data or not event_data['location']:
+        event_data['location'] = ""
+
+    if 'attendees' not in event_data or not isinstance(event_data['attendees'], list):
+        event_data['attendees'] = []
+
+    if 'recurrence_frequency' not in event_data:
+        event_data['recurrence_frequency'] = "none"
+
+    if 'recurrence_interval' not in event_data:
+        event_data['recurrence_interval'] = 1
+
+    if 'recurrence_count' not in event_data:
+        event_data['recurrence_count'] = None
+
+    if 'recurrence_end_date' not in event_data:
+        event_data['recurrence_end_date'] = None
+
+    if 'timezone' not in event_data or not event_data['timezone']:
+        event_data['timezone'] = "UTC"
+
+    # Validate recurrence frequency
+    valid_frequencies = ["none", "daily", "weekly", "monthly", "yearly"]
+    if event_data['recurrence_frequency'] not in valid_frequencies:
+        logger.warning(f"Invalid recurrence frequency '{event_data['recurrence_frequency']}', defaulting to 'none'")
+        event_data['recurrence_frequency'] = "none"
+
+    return event_data
+
+
+EVENT_FIELDS_PROMPT = """Required fields:
 - "title": string (event name/subject)
 - "start": ISO 8601 datetime string (e.g., "2025-01-15T14:00:00")
 - "end": ISO 8601 datetime string (e.g., "2025-01-15T15:00:00")
@@ -67,86 +485,53 @@ Parsing Rules:
 6. Extract attendees from "cc:", "to:", or phrases like "with John and Mary", "team members"
 7. Detect recurrence from: "every day", "weekly", "every Monday", "monthly meeting", "annual review"
 8. For recurrence: if "for 4 weeks" → count=4, if "until March 1st" → end_date, if "every week" → no count/end
-9. Use email subject as title if available and descriptive
+9. Use email subject as title if available and descriptive"""
+
+
+def _complete_json(prompt: str, max_tokens: int) -> Any:
+    # Streamed in JSON mode; the answer is parsed the moment its JSON closes.
+    return complete_json(
+        messages=[
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ],
+        temperature=0.1,  # Low temperature for consistent parsing
+        max_tokens=max_tokens,
+    )
+
+
+def _parse_with_groq(email_text: str, now: datetime, prompt_text: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Call Groq to parse ``email_text`` relative to ``now``.
+
+    The prompt gets ``prompt_text`` (by default the email trimmed by
+    prepare_email_text); the original text stays the description fallback.
+    """
+    get_client()  # fail early when Groq is not configured
+    if prompt_text is None:
+        prompt_text = prepare_email_text(email_text)
+
+    # Create the prompt for AI
+    fields = EVENT_FIELDS_PROMPT.format(current_date=now.strftime("%Y-%m-%d %H:%M:%S"))
+    prompt = f"""You are a calendar event parser. Extract event details from the following email and return ONLY a valid JSON object with these exact fields:
+
+{fields}
 10. Return ONLY the JSON object, no markdown, no explanations
 
 Email to parse:
-{email_text}
+{prompt_text}
 
 JSON output:"""
 
     try:
         # Call Groq API
         logger.info("Calling Groq API to parse email")
-        chat_completion = client.chat.completions.create(
-            messages=[
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ],
-            model="llama-3.3-70b-versatile",  # Updated to current model (llama-3.1 was decommissioned)
-            temperature=0.1,  # Low temperature for consistent parsing
-            max_tokens=1024,
-        )
-
-        # Extract response
-        response_text = chat_completion.choices[0].message.content.strip()
-        logger.info(f"Groq API response: {response_text}")
-
-        # Sometimes AI adds markdown code blocks, remove them
-        if response_text.startswith("```json"):
-            response_text = response_text.replace("```json", "").replace("```", "").strip()
-        elif response_text.startswith("```"):
-            response_text = response_text.replace("```", "").strip()
-
-        # Parse JSON
-        event_data = json.loads(response_text)
-
-        # Validate required fields
-        required_fields = ["title", "start", "end"]
-        for field in required_fields:
-            if field not in event_data:
-                raise ValueError(f"Missing required field: {field}")
-
-        # Convert ISO datetime strings to datetime objects
-        event_data['start'] = datetime.fromisoformat(event_data['start'].replace('Z', '+00:00'))
-        event_data['end'] = datetime.fromisoformat(event_data['end'].replace('Z', '+00:00'))
-
-        # Set defaults for optional fields
-        if 'all_day' not in event_data:
-            event_data['all_day'] = False
-
-        if 'description' not in event_data or not event_data['description']:
-            event_data['description'] = email_text.strip()
-
-        if 'location' not in event_data or not event_data['location']:
-            event_data['location'] = ""
-
-        if 'attendees' not in event_data or not isinstance(event_data['attendees'], list):
-            event_data['attendees'] = []
-
-        if 'recurrence_frequency' not in event_data:
-            event_data['recurrence_frequency'] = "none"
-
-        if 'recurrence_interval' not in event_data:
-            event_data['recurrence_interval'] = 1
-
-        if 'recurrence_count' not in event_data:
-            event_data['recurrence_count'] = None
-
-        if 'recurrence_end_date' not in event_data:
-            event_data['recurrence_end_date'] = None
-
-        if 'timezone' not in event_data or not event_data['timezone']:
-            event_data['timezone'] = "UTC"
-
-        # Validate recurrence frequency
-        valid_frequencies = ["none", "daily", "weekly", "monthly", "yearly"]
-        if event_data['recurrence_frequency'] not in valid_frequencies:
-            logger.warning(f"Invalid recurrence frequency '{event_data['recurrence_frequency']}', defaulting to 'none'")
-            event_data['recurrence_frequency'] = "none"
+        response_data = _complete_json(prompt, max_tokens=1024)
+        logger.info(f"Groq API response: {response_data}")
 
+        event_data = _event_from_response(response_data, email_text)
         logger.info(f"Successfully parsed email to event: {event_data['title']}")
         return event_data
 
@@ -154,6 +539,67 @@ JSON output:"""
         logger.error(f"Failed to parse JSON from Groq response: {e}")
         raise ValueError(f"AI returned invalid JSON: {str(e)}")
 
+    except LLMError:
+        raise
+
     except Exception as e:
         logger.error(f"Error parsing email with Groq: {e}")
         raise ValueError(f"Failed to parse email: {str(e)}")
+
+
+def _parse_batch_with_groq(
+    prompt_texts: Dict[str, str],
+    originals: Dict[str, str],
+    now: datetime,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Parse a batch of emails with one Groq call.
+
+    ``prompt_texts`` are the trimmed emails that go into the prompt;
+    ``originals`` hold the full text, used as the description fallback.
+
+    Returns the events that came back valid, keyed by message id; the caller
+    retries the rest one at a time. Never raises for a bad answer, only
+    LLMError when Groq stays unavailable.
+    """
+    fields = EVENT_FIELDS_PROMPT.format(current_date=now.strftime("%Y-%m-%d %H:%M:%S"))
+    blocks = "\n\n".join(
+        f"=== Email {message_id} ===\n{prompt_text}" for message_id, prompt_text in prompt_texts.items()
+    )
+    prompt = f"""You are a calendar event parser. Each email below is introduced by a line "=== Email <id> ===". Extract the event details from every email and return ONLY a valid JSON object of the form {{"events": [...]}} with one object per email in the "events" array. Each object has a "message_id" field holding the email's <id>, plus these exact fields:
+
+{fields}
+10. Return ONLY the JSON object, no markdown, no explanations
+
+Emails to parse:
+{blocks}
+
+JSON output:"""
+
+    try:
+        logger.info(f"Calling Groq API to parse {len(prompt_texts)} emails")
+        items = _complete_json(prompt, max_tokens=min(1024 * len(prompt_texts), 8192))
+    except LLMError:
+        # Single calls would hit the same limits; let the caller retry later.
+        raise
+    except Exception as e:
+        logger.warning(f"Batch email parse failed, falling back to single calls: {e}")
+        return {}
+    if isinstance(items, dict):
+        items = items.get("events")
+    if not isinstance(items, list):
+        logger.warning("Batch email parse did not return an events array, falling back to single calls")
+        return {}
+
+    results = {}
+    for item in items:
+        message_id = str(item.get("message_id", "")) if isinstance(item, dict) else ""
+        if message_id not in prompt_texts or message_id in results:
+            continue
+        item.pop("message_id")
+        try:
+            results[message_id] = _event_from_response(item, originals[message_id])
+        except (ValueError, TypeError, AttributeError) as e:
+            logger.warning(f"Batch email parse returned an invalid event for {message_id}: {e}")
+    logger.info(f"Parsed {len(results)} of {len(prompt_texts)} emails in one Groq call")
+    return results
@@ -0,0 +1,981 @@
+"""
+iCal feed import engine: download, parse, diff and bulk upsert.
+
+Serves the Brightspace feed and every IcsSubscription. The import views use
+it for one feed at a time; the scheduled refresh task downloads all due feeds
+on a bounded thread pool with per-host limits and applies them one at a time
+on the calling thread.
+"""
+import ipaddress
+import logging
+import re
+import socket
+import threading
+import time as time_module
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from http.cookiejar import DefaultCookiePolicy
+from typing import Dict, Optional, Tuple
+from urllib.parse import urljoin, urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .cache import SCOPE_EVENTS, invalidate_user_cache
+from .db import serialized_write
+from .ics import FeedDownload, iter_vevents, spool_feed
+from .models import (
+  BrightspaceFeed,
+  Event,
+  EventException,
+  IcsFeed,
+  IcsSubscription,
+  Notification,
+)
+from .notifications import create_notification
+
+logger = logging.getLogger(__name__)
+
+REDIRECT_LIMIT = 3
+# Statuses that mean the host is struggling rather than the feed being wrong.
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+DNS_CACHE_MAX_ENTRIES = 1024
+UTC = dt_timezone.utc
+RRULE_FREQUENCIES = {
+  "DAILY": Event.RecurrenceFrequency.DAILY,
+  "WEEKLY": Event.RecurrenceFrequency.WEEKLY,
+  "MONTHLY": Event.RecurrenceFrequency.MONTHLY,
+  "YEARLY": Event.RecurrenceFrequency.YEARLY,
+}
+WEEKDAY_CODES = ("MO", "TU", "WE", "TH", "FR", "SA", "SU")
+EXCEPTION_DEFAULTS = {
+  "is_cancelled": False,
+  "title": "",
+  "description": "",
+  "location": "",
+  "start": None,
+  "end": None,
+}
+
+# hostname -> (expires at, validated addresses)
+_dns_cache: Dict[str, Tuple[float, Tuple[str, ...]]] = {}
+_dns_lock = threading.Lock()
+
+# One adapter (and so one urllib3 pool manager) shared by every fetch; each
+# thread gets its own Session on top of it since Sessions aren't thread-safe.
+_http_adapter = None
+_http_adapter_lock = threading.Lock()
+_http_local = threading.local()
+
+
+class FeedFetchError(ValueError):
+  """A download failed. ``retryable`` marks failures worth backing off the host for."""
+
+  def __init__(self, message: str, retryable: bool = False, retry_after: Optional[float] = None):
+    super().__init__(message)
+    self.retryable = retryable
+    self.retry_after = retry_after
+
+
+def _is_public_address(ip_str: str) -> bool:
+  ip = ipaddress.ip_address(ip_str)
+  return not any(
+    (
+      ip.is_loopback,
+      ip.is_link_local,
+      ip.is_private,
+      ip.is_reserved,
+      ip.is_multicast,
+    )
+  )
+
+
+def resolve_public_addresses(hostname: str) -> Tuple[str, ...]:
+  """
+  Resolve ``hostname`` and check every address is public.
+
+  Validated results are cached for BRIGHTSPACE_DNS_CACHE_SECONDS so redirects,
+  repeat imports and pinned connections don't resolve the host again.
+  """
+  key = hostname.lower()
+  now = time_module.monotonic()
+  with _dns_lock:
+    cached = _dns_cache.get(key)
+  if cached and cached[0] > now:
+    return cached[1]
+
+  try:
+    addr_info = socket.getaddrinfo(hostname, None, type=socket.SOCK_STREAM)
+  except socket.gaierror as exc:
+    raise ValueError(f"Could not resolve host {hostname}.") from exc
+
+  addresses = tuple(dict.fromkeys(sockaddr[0] for _, _, _, _, sockaddr in addr_info))
+  if not addresses or not all(_is_public_address(ip_str) for ip_str in addresses):
+    raise ValueError("ICS URL resolves to a non-public address.")
+
+  ttl = getattr(settings, "BRIGHTSPACE_DNS_CACHE_SECONDS", 300)
+  with _dns_lock:
+    if len(_dns_cache) >= DNS_CACHE_MAX_ENTRIES:
+      _dns_cache.clear()
+    _dns_cache[key] = (now + ttl, addresses)
+  return addresses
+
+
+def validate_ics_url(raw_url: str) -> str:
+  parsed = urlparse(raw_url)
+  if parsed.scheme not in ("http", "https") or not parsed.netloc:
+    raise ValueError("ICS URL must be an absolute http(s) URL.")
+
+  hostname = parsed.hostname
+  if hostname is None:
+    raise ValueError("ICS URL is missing a hostname.")
+
+  resolve_public_addresses(hostname)
+  return parsed.geturl()
+
+
+def validate_ics_urls(urls) -> Dict[str, object]:
+  """
+  Validate many URLs at once, resolving each distinct host a single time in
+  parallel. Maps every URL to its validated form or the ValueError it raised.
+  """
+  urls = list(dict.fromkeys(urls))
+  one_per_host = list({urlparse(url).hostname: url for url in urls}.values())
+  results = {}
+  if one_per_host:
+    workers = max(1, min(len(one_per_host), getattr(settings, "BRIGHTSPACE_REFRESH_WORKERS", 8)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ics-dns") as pool:
+      results.update(zip(one_per_host, pool.map(_try_validate, one_per_host)))
+  # The remaining URLs hit the warm resolver cache.
+  for url in urls:
+    if url not in results:
+      results[url] = _try_validate(url)
+  return results
+
+
+def _try_validate(url: str):
+  try:
+    return validate_ics_url(url)
+  except ValueError as exc:
+    return exc
+
+
+class PinnedAddressAdapter(HTTPAdapter):
+  """
+  Connects to an address from the validated resolver cache instead of letting
+  urllib3 resolve the hostname again, which closes the DNS-rebinding window.
+  TLS still verifies the certificate against the original hostname.
+  """
+
+  def build_connection_pool_key_attributes(self, request, verify, cert=None):
+    host_params, pool_kwargs = super().build_connection_pool_key_attributes(request, verify, cert)
+    hostname = host_params["host"]
+    host_params = {**host_params, "host": resolve_public_addresses(hostname)[0]}
+    if host_params["scheme"] == "https":
+      pool_kwargs = {**pool_kwargs, "server_hostname": hostname, "assert_hostname": hostname}
+    return host_params, pool_kwargs
+
+  def send(self, request, **kwargs):
+    parsed = urlparse(request.url)
+    if "Host" not in request.headers and parsed.hostname:
+      request.headers["Host"] = parsed.netloc.rsplit("@", 1)[-1]
+    return super().send(request, **kwargs)
+
+
+def _resolve_redirect(current_url: str, location: str) -> str:
+  next_url = urljoin(current_url, location)
+  return validate_ics_url(next_url)
+
+
+def _retry_after_seconds(value: Optional[str]) -> Optional[float]:
+  try:
+    return float(value) if value else None
+  except ValueError:
+    return None
+
+
+def _shared_adapter() -> "PinnedAddressAdapter":
+  global _http_adapter
+  if _http_adapter is None:
+    with _http_adapter_lock:
+      if _http_adapter is None:
+        _http_adapter = PinnedAddressAdapter(
+          pool_connections=getattr(settings, "BRIGHTSPACE_HTTP_POOL_HOSTS", 16),
+          pool_maxsize=getattr(settings, "BRIGHTSPACE_HTTP_POOL_SIZE", 8),
+          # Only connection failures are retried here; redirects and 429/5xx
+          # are handled by download_ics and the refresh throttle.
+          max_retries=Retry(
+            total=getattr(settings, "BRIGHTSPACE_HTTP_RETRIES", 2),
+            connect=getattr(settings, "BRIGHTSPACE_HTTP_RETRIES", 2),
+            read=0,
+            redirect=0,
+            status=0,
+            backoff_factor=0.5,
+            allowed_methods=frozenset({"GET"}),
+            raise_on_redirect=False,
+          ),
+        )
+  return _http_adapter
+
+
+def get_session() -> requests.Session:
+  """This thread's Session, mounted on the shared pooled adapter."""
+  session = getattr(_http_local, "session", None)
+  if session is None:
+    session = requests.Session()
+    # Sessions outlive a single feed, so never carry one user's cookies into another's fetch.
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    adapter = _shared_adapter()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    _http_local.session = session
+  return session
+
+
+def http_pool_stats() -> Dict[str, int]:
+  """Connections opened vs requests served by the shared pools; the gap is reuse."""
+  stats = {"pools": 0, "connections": 0, "requests": 0, "reused": 0}
+  if _http_adapter is None:
+    return stats
+  pools = _http_adapter.poolmanager.pools
+  for key in list(pools.keys()):
+    pool = pools.get(key)
+    if pool is None:
+      continue
+    stats["pools"] += 1
+    stats["connections"] += pool.num_connections
+    stats["requests"] += pool.num_requests
+  stats["reused"] = max(stats["requests"] - stats["connections"], 0)
+  return stats
+
+
+def download_ics(initial_url: str, etag: str = "", last_modified: str = "") -> FeedDownload:
+  """
+  Fetch the feed conditionally. Returns a body-less download on 304,
+  otherwise the spooled body with its validators and content hash.
+  """
+  max_bytes = getattr(settings, "BRIGHTSPACE_MAX_STREAM_BYTES", 50 * 1024 * 1024)
+  session = get_session()
+  current_url = initial_url
+  headers = {}
+  if etag:
+    headers["If-None-Match"] = etag
+  if last_modified:
+    headers["If-Modified-Since"] = last_modified
+
+  for _ in range(REDIRECT_LIMIT + 1):
+    try:
+      with session.get(
+        current_url,
+        timeout=15,
+        stream=True,
+        allow_redirects=False,
+        headers=headers,
+      ) as response:
+        if response.is_redirect or response.status_code in (301, 302, 303, 307, 308):
+          location = response.headers.get("Location")
+          if not location:
+            raise ValueError("Redirect response missing Location header.")
+          current_url = _resolve_redirect(current_url, location)
+          continue
+
+        if response.status_code == 304:
+          return FeedDownload(None, etag=etag, last_modified=last_modified)
+
+        if response.status_code in RETRYABLE_STATUSES:
+          raise FeedFetchError(
+            f"ICS host answered {response.status_code}.",
+            retryable=True,
+            retry_after=_retry_after_seconds(response.headers.get("Retry-After")),
+          )
+        response.raise_for_status()
+
+        content_length = response.headers.get("Content-Length")
+        if content_length:
+          try:
+            declared_size = int(content_length)
+          except ValueError:
+            declared_size = None
+          else:
+            if declared_size > max_bytes:
+              raise ValueError("ICS feed exceeds allowed size.")
+
+        return spool_feed(
+          response.iter_content(chunk_size=65536),
+          etag=response.headers.get("ETag", ""),
+          last_modified=response.headers.get("Last-Modified", ""),
+        )
+    except (requests.ConnectionError, requests.Timeout) as exc:
+      raise FeedFetchError(f"Failed to download ICS feed: {exc}", retryable=True) from exc
+    except requests.RequestException as exc:
+      raise FeedFetchError(f"Failed to download ICS feed: {exc}") from exc
+
+  raise ValueError("ICS feed exceeded redirect limit.")
+
+
+def _normalize_datetime(value):
+  if isinstance(value, datetime):
+    if timezone.is_naive(value):
+      value = timezone.make_aware(value, timezone.get_current_timezone())
+    return value
+  if isinstance(value, date):
+    naive = datetime.combine(value, time.min)
+    return timezone.make_aware(naive, timezone.get_current_timezone())
+  return None
+
+
+def component_fields(
+  component,
+  ics_url: str,
+  extra_fields: Optional[Dict] = None,
+) -> Optional[Tuple[str, Dict]]:
+  """
+  Map a VEVENT to ``(uid, field values)``, or None if it can't be imported.
+  ``extra_fields`` come from the feed (its source and, for subscriptions, its id).
+  """
+  extra_fields = extra_fields or {"source": Event.Source.BRIGHTSPACE}
+  if component is None:
+    return None
+
+  dtstart_prop = component.get("dtstart")
+  if dtstart_prop is None:
+    return None
+
+  uid = str(component.get("uid", "")).strip()
+  if not uid:
+    return None
+
+  summary = component.get("summary")
+  description = component.get("description")
+  location = component.get("location")
+  dtend_prop = component.get("dtend")
+  duration_prop = component.get("duration")
+
+  dtstart_raw = dtstart_prop.dt
+  dtend_raw = dtend_prop.dt if dtend_prop else None
+  duration_value = duration_prop.dt if duration_prop else None
+
+  is_all_day = isinstance(dtstart_raw, date) and not isinstance(dtstart_raw, datetime)
+
+  start_dt = _normalize_datetime(dtstart_raw)
+  if start_dt is None:
+    return None
+
+  if dtend_raw is not None:
+    end_dt = _normalize_datetime(dtend_raw)
+    if end_dt is not None and is_all_day:
+      end_dt = end_dt - timedelta(seconds=1)
+  elif isinstance(duration_value, timedelta):
+    end_dt = start_dt + duration_value
+  else:
+    end_dt = start_dt + (timedelta(days=1) if is_all_day else timedelta(hours=1))
+
+  if end_dt <= start_dt:
+    end_dt = start_dt + (timedelta(days=1) if is_all_day else timedelta(hours=1))
+
+  description_text = ""
+  if summary:
+    title = str(summary)
+  elif extra_fields["source"] == Event.Source.BRIGHTSPACE:
+    title = "Brightspace event"
+  else:
+    title = "Calendar event"
+  if description:
+    raw_description = str(description)
+    description_clean = re.sub(r"https?://\S+", "", raw_description, flags=re.IGNORECASE)
+    description_text = description_clean.strip()
+  if location:
+    location_text = str(location)
+    if description_text:
+      description_text = f"{description_text}\nLocation: {location_text}"
+    else:
+      description_text = f"Location: {location_text}"
+
+  fields = {
+    "title": title[:Event._meta.get_field("title").max_length],
+    "description": description_text,
+    "start": start_dt,
+    "end": end_dt,
+    "all_day": is_all_day,
+    "recurrence_frequency": Event.RecurrenceFrequency.NONE,
+    "recurrence_interval": 1,
+    "recurrence_count": None,
+    "recurrence_end_date": None,
+    "google_event_id": "",
+    "google_etag": "",
+    "google_raw": {
+      "source": str(extra_fields["source"]),
+      "ics_url": ics_url,
+    },
+    **extra_fields,
+  }
+
+  return uid, fields
+
+
+def _until_date(until, start_dt: datetime, all_day: bool) -> date:
+  """
+  The last day an UNTIL bound allows, in the terms EventOccurrencesView uses:
+  the series' start time on that day (in UTC, as stored) must not pass UNTIL.
+  """
+  if not isinstance(until, datetime):
+    return until
+  until = _normalize_datetime(until).astimezone(UTC)
+  start_utc = start_dt.astimezone(UTC)
+  if not all_day and until.timetz().replace(tzinfo=None) < start_utc.time():
+    return until.date() - timedelta(days=1)
+  return until.date()
+
+
+def recurrence_series(rule, start_dt: datetime, all_day: bool = False):
+  """
+  Map an RRULE onto ``Event.recurrence_*`` values.
+
+  Returns ``[(weekday, series start, fields)]``: one entry for a plain rule,
+  or one weekly series per day for ``FREQ=WEEKLY;BYDAY=MO,WE`` style rules
+  (the common class-timetable shape). Returns None for anything the model
+  can't express (multiple rules, BYSETPOS, ``2TU``-style days, ...).
+  """
+  if isinstance(rule, list):
+    if len(rule) != 1:
+      return None
+    rule = rule[0]
+  parts = {str(key).upper(): list(value) for key, value in rule.items()}
+  frequency = RRULE_FREQUENCIES.get(str((parts.pop("FREQ", None) or [""])[0]).upper())
+  if frequency is None:
+    return None
+  try:
+    interval = int((parts.pop("INTERVAL", None) or [1])[0])
+    count = parts.pop("COUNT", None)
+    count = int(count[0]) if count else None
+  except (TypeError, ValueError):
+    return None
+  until = (parts.pop("UNTIL", None) or [None])[0]
+  wkst = str((parts.pop("WKST", None) or ["MO"])[0]).upper()
+  by_day = [str(day).upper() for day in parts.pop("BYDAY", [])]
+  by_month_day = parts.pop("BYMONTHDAY", [])
+  if parts or interval < 1 or (count is not None and count < 1) or wkst not in WEEKDAY_CODES:
+    return None
+  if count is not None and until is not None:
+    return None
+
+  start_weekday = start_dt.weekday()
+  if by_month_day and (
+    frequency != Event.RecurrenceFrequency.MONTHLY
+    or [int(day) for day in by_month_day] != [start_dt.day]
+  ):
+    return None
+  weekdays = [start_weekday]
+  if by_day:
+    if frequency != Event.RecurrenceFrequency.WEEKLY or not set(by_day) <= set(WEEKDAY_CODES):
+      return None
+    weekdays = sorted({WEEKDAY_CODES.index(day) for day in by_day})
+    # COUNT spans all the days together, so it can't be split per day.
+    if len(weekdays) > 1 and count is not None:
+      return None
+
+  fields = {
+    "recurrence_frequency": frequency,
+    "recurrence_interval": interval,
+    "recurrence_count": count,
+    "recurrence_end_date": _until_date(until, start_dt, all_day) if until is not None else None,
+  }
+  series = []
+  week_start = WEEKDAY_CODES.index(wkst)
+  start_offset = (start_weekday - week_start) % 7
+  for weekday in weekdays:
+    offset = (weekday - week_start) % 7 - start_offset
+    if offset < 0:
+      # That day has already passed in DTSTART's week, so the series starts
+      # in the next week the rule actually covers.
+      offset += 7 * interval
+    series.append((weekday, start_dt + timedelta(days=offset), fields))
+  return series
+
+
+def exception_starts(component, start_dt: datetime):
+  """EXDATE values as aware datetimes comparable with the series' starts."""
+  exdates = component.get("exdate")
+  if exdates is None:
+    return []
+  if not isinstance(exdates, list):
+    exdates = [exdates]
+  starts = []
+  for prop in exdates:
+    for entry in prop.dts:
+      value = entry.dt
+      if not isinstance(value, datetime) and start_dt.time() != time.min:
+        # A bare date cancels that day's occurrence of a timed series.
+        value = datetime.combine(value, start_dt.timetz())
+      starts.append(_normalize_datetime(value))
+  return starts
+
+
+def collect_rows(components, ics_url: str, extra_fields: Optional[Dict] = None):
+  """
+  Turn parsed VEVENTs into ``(rows, exceptions, skipped)`` for ``sync_events``.
+
+  A recurring VEVENT becomes one series row instead of a row per occurrence.
+  EXDATEs and ``RECURRENCE-ID`` overrides become exceptions of their series;
+  an override whose series can't be stored as a rule is imported on its own.
+  Rules the model can't express fall back to importing the first occurrence.
+  """
+  rows = {}
+  exceptions = defaultdict(dict)
+  overrides = []
+  routes = {}
+  skipped = 0
+  for component in components:
+    parsed = component_fields(component, ics_url, extra_fields)
+    if parsed is None:
+      skipped += 1
+      continue
+    uid, fields = parsed
+    recurrence_id = component.get("recurrence-id")
+    if recurrence_id is not None:
+      original = _normalize_datetime(recurrence_id.dt)
+      if original is None:
+        skipped += 1
+        continue
+      cancelled = str(component.get("status", "")).upper() == "CANCELLED"
+      overrides.append((uid, original, fields, cancelled))
+      continue
+
+    rule = component.get("rrule")
+    series = recurrence_series(rule, fields["start"], fields["all_day"]) if rule is not None else None
+    if not series:
+      if rule is not None:
+        logger.info("Importing only the first occurrence of %s: unsupported RRULE.", uid)
+      rows[uid] = fields
+      continue
+
+    duration = fields["end"] - fields["start"]
+    route = {}
+    for weekday, series_start, recurrence in series:
+      series_uid = uid if len(series) == 1 else f"{uid}#{WEEKDAY_CODES[weekday]}"
+      rows[series_uid] = {
+        **fields,
+        **recurrence,
+        "start": series_start,
+        "end": series_start + duration,
+      }
+      route[weekday] = series_uid
+    routes[uid] = (fields["start"].tzinfo, route)
+    for original in exception_starts(component, fields["start"]):
+      series_uid = _series_for(routes[uid], original)
+      if series_uid:
+        exceptions[series_uid][original] = {"is_cancelled": True}
+
+  for uid, original, fields, cancelled in overrides:
+    series_uid = _series_for(routes[uid], original) if uid in routes else None
+    if series_uid is None:
+      if not cancelled:
+        rows[f"{uid}#{original.isoformat()}"] = fields
+      continue
+    if cancelled:
+      exceptions[series_uid][original] = {"is_cancelled": True}
+    else:
+      exceptions[series_uid][original] = {
+        "title": fields["title"],
+        "description": fields["description"],
+        "start": fields["start"],
+        "end": fields["end"],
+      }
+  return rows, dict(exceptions), skipped
+
+
+def _series_for(route, original: datetime) -> Optional[str]:
+  tzinfo, by_weekday = route
+  if len(by_weekday) == 1:
+    return next(iter(by_weekday.values()))
+  return by_weekday.get(original.astimezone(tzinfo).weekday())
+
+
+def _exception_rows(exceptions: Dict[datetime, Dict]) -> Dict[datetime, Dict]:
+  return {original: {**EXCEPTION_DEFAULTS, **values} for original, values in exceptions.items()}
+
+
+def sync_events(
+  feed: IcsFeed,
+  rows: Dict[str, Dict],
+  exceptions: Optional[Dict[str, Dict]] = None,
+) -> Dict[str, int]:
+  """
+  Upsert ``rows`` (UID -> field values) into ``feed``'s events and drop the
+  ones no longer in the feed, in one transaction and a handful of queries.
+  ``exceptions`` (UID -> original start -> values) replace each series'
+  stored exceptions when they differ.
+  """
+  exceptions = exceptions or {}
+  existing = {
+    event.google_ical_uid: event
+    for event in feed.matching_events().filter(google_ical_uid__in=list(rows))
+  }
+  stored_exceptions = defaultdict(dict)
+  if existing:
+    for exception in EventException.objects.filter(event__in=feed.owned_events()):
+      stored_exceptions[exception.event_id][exception.original_start] = {
+        name: getattr(exception, name) for name in EXCEPTION_DEFAULTS
+      }
+  now = timezone.now()
+  to_create = []
+  to_update = []
+  exception_writes = []
+  update_fields = {"updated_at"}
+  for uid, fields in rows.items():
+    event = existing.get(uid)
+    wanted = _exception_rows(exceptions.get(uid, {}))
+    if event is None:
+      event = Event(pilot=feed.user, google_ical_uid=uid, **fields)
+      to_create.append(event)
+      if wanted:
+        exception_writes.append((event, wanted))
+      continue
+    exceptions_changed = stored_exceptions.get(event.pk, {}) != wanted
+    if exceptions_changed:
+      exception_writes.append((event, wanted))
+    if not exceptions_changed and all(getattr(event, name) == value for name, value in fields.items()):
+      continue
+    for name, value in fields.items():
+      setattr(event, name, value)
+    update_fields.update(fields)
+    # bulk_update skips auto_now.
+    event.updated_at = now
+    to_update.append(event)
+
+  batch_size = getattr(settings, "BULK_WRITE_CHUNK_SIZE", 200)
+  removed = 0
+  with serialized_write():
+    Event.objects.bulk_create(to_create, batch_size=batch_size)
+    if to_update:
+      Event.objects.bulk_update(to_update, sorted(update_fields), batch_size=batch_size)
+    if exception_writes:
+      stale = [event.pk for event, _ in exception_writes if event.pk in stored_exceptions]
+      if stale:
+        EventException.objects.filter(event_id__in=stale).delete()
+      EventException.objects.bulk_create(
+        [
+          EventException(event=event, original_start=original, **values)
+          for event, wanted in exception_writes
+          for original, values in wanted.items()
+        ],
+        batch_size=batch_size,
+      )
+    # An empty feed is more likely an LMS hiccup than a cleared calendar, so
+    # removals only happen when the feed had events.
+    if rows:
+      _, deleted = feed.owned_events().exclude(google_ical_uid__in=list(rows)).delete()
+      removed = deleted.get(Event._meta.label, 0)
+    # Bulk writes skip post_save, so invalidate explicitly.
+    invalidate_user_cache(SCOPE_EVENTS, feed.user_id)
+
+  return {
+    "created": len(to_create),
+    "updated": len(to_update),
+    "unchanged": len(existing) - len(to_update),
+    "removed": removed,
+  }
+
+
+def apply_download(feed: IcsFeed, download: FeedDownload, ics_url: str) -> Dict:
+  """
+  Apply a downloaded feed to its user's calendar and store its validators.
+
+  Unchanged feeds (304 or identical hash) are not parsed at all.
+  """
+  try:
+    if download.not_modified or download.content_hash == feed.content_hash:
+      # Servers may rotate validators on unchanged content; keep the latest
+      # so the next fetch can still get a 304.
+      feed.last_imported_at = timezone.now()
+      feed.etag = download.etag
+      feed.last_modified = download.last_modified
+      feed.save(update_fields=["last_imported_at", "etag", "last_modified", "updated_at"])
+      return {"created": 0, "updated": 0, "removed": 0, "skipped": 0, "not_modified": True}
+
+    # Events are parsed from the spooled body; only their field values are
+    # kept, so memory does not grow with the raw feed.
+    rows, exceptions, skipped = collect_rows(
+      iter_vevents(download.iter_chunks()),
+      ics_url,
+      feed.new_event_fields(),
+    )
+  finally:
+    download.close()
+
+  counts = sync_events(feed, rows, exceptions)
+
+  # Validators are only stored once the feed has been applied.
+  feed.last_imported_at = timezone.now()
+  feed.etag = download.etag
+  feed.last_modified = download.last_modified
+  feed.content_hash = download.content_hash
+  feed.save(
+    update_fields=["last_imported_at", "etag", "last_modified", "content_hash", "updated_at"],
+  )
+  return {**counts, "skipped": skipped, "not_modified": False}
+
+
+def import_feed(feed: IcsFeed, ics_url: str) -> Dict:
+  """Download and apply one feed right away, recording the attempt. Raises ValueError."""
+  started = time_module.monotonic()
+  try:
+    download = download_ics(ics_url, etag=feed.etag, last_modified=feed.last_modified)
+    summary = apply_download(feed, download, ics_url)
+  except ValueError as exc:
+    record_attempt(feed, started, exc)
+    raise
+  record_attempt(feed, started)
+  return summary
+
+
+def reset_feed_state(feed: IcsFeed) -> None:
+  """Forget validators and failure history, e.g. after the URL changed."""
+  feed.etag = ""
+  feed.last_modified = ""
+  feed.content_hash = ""
+  feed.consecutive_failures = 0
+  feed.last_error = ""
+  feed.next_attempt_at = None
+
+
+def notify_import(feed: IcsFeed, summary: Dict) -> None:
+  if isinstance(feed, IcsSubscription):
+    notification_type = Notification.Type.SUBSCRIPTION_IMPORT
+    title = f"{feed.name} calendar updated"
+    data = {**summary, "subscription_id": feed.pk}
+  else:
+    notification_type = Notification.Type.BRIGHTSPACE_IMPORT
+    title = "Brightspace calendar import completed"
+    data = summary
+  create_notification(
+    user=feed.user,
+    type=notification_type,
+    title=title,
+    message=f"Imported {summary['created']} new and updated {summary['updated']} missions.",
+    data=data,
+  )
+
+
+def record_attempt(feed: IcsFeed, started: float, error: Optional[Exception] = None) -> None:
+  """Store timing and error stats and schedule the feed's next refresh."""
+  now = timezone.now()
+  feed.last_attempted_at = now
+  feed.last_duration_ms = int((time_module.monotonic() - started) * 1000)
+  if error is None:
+    feed.consecutive_failures = 0
+    feed.last_error = ""
+    delay = timedelta(minutes=getattr(settings, "BRIGHTSPACE_REFRESH_INTERVAL_MINUTES", 60))
+  else:
+    feed.consecutive_failures += 1
+    feed.last_error = str(error)[:500]
+    retry = getattr(settings, "BRIGHTSPACE_REFRESH_RETRY_MINUTES", 15)
+    cap = getattr(settings, "BRIGHTSPACE_REFRESH_MAX_BACKOFF_MINUTES", 24 * 60)
+    delay = timedelta(minutes=min(retry * 2 ** (feed.consecutive_failures - 1), cap))
+  feed.next_attempt_at = now + delay
+  feed.save(
+    update_fields=[
+      "last_attempted_at",
+      "last_duration_ms",
+      "consecutive_failures",
+      "last_error",
+      "next_attempt_at",
+      "updated_at",
+    ],
+  )
+
+
+class HostThrottle:
+  """
+  Per-host concurrency cap and request spacing for the refresh pool.
+
+  Retryable failures double a host's spacing (up to a ceiling) and honour
+  Retry-After; after enough of them the host is skipped for the rest of the run.
+  """
+
+  def __init__(self):
+    self.per_host = getattr(settings, "BRIGHTSPACE_REFRESH_PER_HOST", 2)
+    self.base_interval = getattr(settings, "BRIGHTSPACE_REFRESH_HOST_INTERVAL_SECONDS", 1.0)
+    self.max_interval = getattr(settings, "BRIGHTSPACE_REFRESH_HOST_MAX_BACKOFF_SECONDS", 60.0)
+    self.failure_limit = getattr(settings, "BRIGHTSPACE_REFRESH_HOST_FAILURE_LIMIT", 3)
+    self._lock = threading.Lock()
+    self._semaphores = defaultdict(lambda: threading.BoundedSemaphore(self.per_host))
+    self._interval = defaultdict(lambda: self.base_interval)
+    self._next_start = defaultdict(float)
+    self._failures = defaultdict(int)
+
+  def blocked(self, host: str) -> bool:
+    with self._lock:
+      return self._failures[host] >= self.failure_limit
+
+  @contextmanager
+  def slot(self, host: str):
+    with self._lock:
+      semaphore = self._semaphores[host]
+    with semaphore:
+      with self._lock:
+        now = time_module.monotonic()
+        start_at = max(now, self._next_start[host])
+        self._next_start[host] = start_at + self._interval[host]
+      if start_at > now:
+        time_module.sleep(start_at - now)
+      yield
+
+  def record(self, host: str, error: Optional[Exception] = None) -> None:
+    with self._lock:
+      if not isinstance(error, FeedFetchError) or not error.retryable:
+        self._failures[host] = 0
+        self._interval[host] = self.base_interval
+        return
+      self._failures[host] += 1
+      self._interval[host] = min(self._interval[host] * 2, self.max_interval)
+      if error.retry_after:
+        pause = min(error.retry_after, self.max_interval)
+        self._next_start[host] = max(self._next_start[host], time_module.monotonic() + pause)
+
+
+def _host_of(url: str) -> str:
+  return (urlparse(url).hostname or "").lower()
+
+
+def _interleave_by_host(feeds):
+  """Order feeds round-robin across hosts so no host hogs the pool."""
+  queues = defaultdict(deque)
+  for feed in feeds:
+    queues[_host_of(feed.ics_url)].append(feed)
+  ordered = []
+  while queues:
+    for host in list(queues):
+      ordered.append(queues[host].popleft())
+      if not queues[host]:
+        del queues[host]
+  return ordered
+
+
+def _fetch(feed: IcsFeed, ics_url: str, throttle: HostThrottle):
+  """Worker: download one already-validated feed. Never touches the database."""
+  started = time_module.monotonic()
+  host = _host_of(ics_url)
+  if throttle.blocked(host):
+    # Left due, so the next run picks it up once the host has recovered.
+    return started, None, None
+  try:
+    with throttle.slot(host):
+      download = download_ics(ics_url, etag=feed.etag, last_modified=feed.last_modified)
+  except ValueError as exc:
+    throttle.record(host, exc)
+    return started, None, exc
+  throttle.record(host)
+  return started, download, None
+
+
+def due_feeds(now=None):
+  """Brightspace feeds and active subscriptions whose next attempt is due."""
+  now = now or timezone.now()
+  batch_size = getattr(settings, "BRIGHTSPACE_REFRESH_BATCH_SIZE", 500)
+  is_due = Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=now)
+  feeds = list(
+    BrightspaceFeed.objects.select_related("user")
+    .filter(is_due)
+    .exclude(ics_url="")
+    .order_by("next_attempt_at", "pk")[:batch_size]
+  )
+  if len(feeds) < batch_size:
+    feeds.extend(
+      IcsSubscription.objects.select_related("user")
+      .filter(is_due, is_active=True)
+      .order_by("next_attempt_at", "pk")[:batch_size - len(feeds)]
+    )
+  return feeds
+
+
+def claim_feeds(feeds, now=None):
+  """
+  Move each feed's next attempt past the current run and return the ones claimed.
+
+  The update only matches while ``next_attempt_at`` is still the value that
+  was read, so when two runs overlap each feed goes to exactly one of them.
+  A run that dies leaves its feeds due again once the claim runs out.
+  """
+  now = now or timezone.now()
+  claim_until = now + timedelta(minutes=getattr(settings, "BRIGHTSPACE_REFRESH_CLAIM_MINUTES", 60))
+  claimed = []
+  for feed in feeds:
+    updated = type(feed).objects.filter(pk=feed.pk, next_attempt_at=feed.next_attempt_at).update(
+      next_attempt_at=claim_until,
+    )
+    if updated:
+      feed.next_attempt_at = claim_until
+      claimed.append(feed)
+  return claimed
+
+
+def refresh_due_feeds(now=None) -> Dict[str, int]:
+  """
+  Refresh every feed whose next attempt is due.
+
+  Feeds are claimed first so an overlapping run skips them. Downloads run
+  on a bounded pool; parsing and database writes happen here, one feed at
+  a time, as downloads complete. A feed that fails to apply is recorded as
+  failed without stopping the others.
+  """
+  feeds = _interleave_by_host(claim_feeds(due_feeds(now), now))
+  stats = {"feeds": len(feeds), "imported": 0, "not_modified": 0, "failed": 0, "deferred": 0}
+  if not feeds:
+    return stats
+
+  validated = validate_ics_urls(feed.ics_url for feed in feeds)
+  throttle = HostThrottle()
+  workers = max(1, getattr(settings, "BRIGHTSPACE_REFRESH_WORKERS", 8))
+  with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ics-feed") as pool:
+    futures = {}
+    for feed in feeds:
+      ics_url = validated[feed.ics_url]
+      if isinstance(ics_url, Exception):
+        stats["failed"] += 1
+        record_attempt(feed, time_module.monotonic(), ics_url)
+        continue
+      futures[pool.submit(_fetch, feed, ics_url, throttle)] = (feed, ics_url)
+    try:
+      for future in as_completed(futures):
+        feed, ics_url = futures.pop(future)
+        started, download, error = future.result()
+        if download is None and error is None:
+          stats["deferred"] += 1
+          # Hand the claim back so the next run picks it up.
+          type(feed).objects.filter(pk=feed.pk).update(next_attempt_at=timezone.now())
+          continue
+        if error is None:
+          try:
+            summary = apply_download(feed, download, ics_url)
+          except Exception as exc:
+            # A database error (a duplicate UID, a locked SQLite file) fails
+            # this feed only.
+            error = exc
+          else:
+            if summary["not_modified"]:
+              stats["not_modified"] += 1
+            else:
+              stats["imported"] += 1
+              if summary["created"] or summary["updated"] or summary["removed"]:
+                notify_import(feed, summary)
+        if error is not None:
+          stats["failed"] += 1
+          logger.warning("Refresh failed for %s: %s", feed, error)
+        record_attempt(feed, started, error)
+    finally:
+      # Downloads not applied because the loop stopped early still hold a
+      # spooled body.
+      for future in futures:
+        if future.exception() is None and future.result()[1] is not None:
+          future.result()[1].close()
+
+  stats["http"] = http_pool_stats()
+  logger.info("Feed HTTP pools: %s", stats["http"])
+  return stats
@@ -2,10 +2,12 @@ import logging
 import base64
 import re
 from datetime import datetime, timedelta, timezone as dt_timezone
-from typing import Dict, Optional, List, Tuple
+from typing import Dict, Optional, List, Set, Tuple
 import uuid
 
 from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError
 from django.utils import timezone
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
@@ -14,12 +16,48 @@ from googleapiclient.errors import HttpError
 import httplib2
 from google_auth_httplib2 import AuthorizedHttp
 
-from .models import GoogleAccount
+from .models import GoogleAccount, Notification, ParsedEmail
+from .notifications import create_notification, notification_buffer
 
 logger = logging.getLogger(__name__)
 
 TOKEN_URI = "https://oauth2.googleapis.com/token"
 
+# MIME types of iCalendar invites, read without the AI parser.
+CALENDAR_MIME_TYPES = ("text/calendar", "application/ics")
+
+# Headers requested for the metadata-only first pass over new mail.
+METADATA_HEADERS = ["Subject", "From", "Content-Type"]
+
+# Calendar-related keyword categories. A message scores one point per
+# category present, however often it repeats.
+CALENDAR_KEYWORD_PATTERNS = {
+    # Time indicators
+    "meeting": r'\b(?:meeting|appointment|event|conference|call|session)\b',
+    "scheduling": r'\b(?:schedule|scheduled|scheduling)\b',
+    "invitation": r'\b(?:invite|invitation|invited)\b',
+
+    # Date/time patterns
+    "weekday": r'\b(?:today|tomorrow|monday|tuesday|wednesday|thursday|friday|saturday|sunday)\b',
+    "month": r'\b(?:january|february|march|april|may|june|july|august|september|october|november|december)\b',
+    "clock_time": r'\d{1,2}:\d{2}\s*(?:am|pm)',
+    "numeric_date": r'\d{1,2}/\d{1,2}/\d{2,4}',
+
+    # Location indicators
+    "location": r'\b(?:room|location|venue|address)\b',
+    "video_call": r'\b(?:zoom|teams|meet|webex)\b',
+
+    # Action words
+    "rsvp": r'\b(?:rsvp|confirm|attendance|attending)\b',
+    "reminder": r'\b(?:reminder|upcoming)\b',
+}
+
+# All categories in one alternation, so a message is scanned once.
+CALENDAR_KEYWORDS_RE = re.compile(
+    "|".join(f"(?P<{name}>{pattern})" for name, pattern in CALENDAR_KEYWORD_PATTERNS.items()),
+    re.IGNORECASE,
+)
+
 class GmailError(Exception):
     """Raised when a Gmail API call fails."""
 
@@ -94,7 +132,13 @@ def start_gmail_watch(account: GoogleAccount) -> Dict:
         account.watch_channel_id = watch_data["channel_id"]
         account.watch_resource_id = watch_data["resource_id"]
         account.watch_expires_at = watch_data["expires_at"]
-        account.save(update_fields=["watch_channel_id", "watch_resource_id", "watch_expires_at", "updated_at"])
+        update_fields = ["watch_channel_id", "watch_resource_id", "watch_expires_at", "updated_at"]
+        # Start the history cursor here; a renewal keeps the older cursor so
+        # nothing that arrived in between is skipped.
+        if not account.gmail_history_id and response.get("historyId"):
+            account.gmail_history_id = str(response["historyId"])
+            update_fields.append("gmail_history_id")
+        account.save(update_fields=update_fields)
 
         logger.info(f"Started Gmail watch for user {account.user_id}: {channel_id}")
         return watch_data
@@ -164,46 +208,102 @@ def get_message_content(service, message_id: str, user_id: str = "me") -> Option
         return None
 
 
-def get_message_details(service, message_id: str, user_id: str = "me") -> Optional[Dict]:
+def _message_headers(message: Dict) -> Dict[str, str]:
+    """Map lower-cased header names to values (first occurrence wins)."""
+    headers = {}
+    for header in message.get("payload", {}).get("headers", []):
+        headers.setdefault(header.get("name", "").lower(), header.get("value", ""))
+    return headers
+
+
+def message_details(message: Dict, service=None) -> Dict:
     """
-    Fetch full details of a Gmail message including headers and content.
+    Turn a ``format="full"`` message resource into the dict the parser takes.
 
-    Returns dict with 'id', 'subject', 'sender', 'content', or None if not found.
+    'calendar' holds the message's iCalendar invite, if it carries one. An
+    invite sent as an attachment is only downloaded when ``service`` is given.
     """
+    headers = _message_headers(message)
+    return {
+        "id": message.get("id", ""),
+        "subject": headers.get("subject", ""),
+        "sender": headers.get("from", ""),
+        "content": _extract_text_from_payload(message.get("payload", {})) or "",
+        "calendar": _calendar_text(service, message),
+    }
+
+
+def _find_calendar_part(payload: Dict) -> Optional[Dict]:
+    """Find the first text/calendar or .ics part of a message payload."""
+    mime_type = payload.get("mimeType", "").lower()
+    if mime_type in CALENDAR_MIME_TYPES or payload.get("filename", "").lower().endswith(".ics"):
+        return payload
+    for part in payload.get("parts", []):
+        found = _find_calendar_part(part)
+        if found:
+            return found
+    return None
+
+
+def _calendar_text(service, message: Dict, user_id: str = "me") -> str:
+    part = _find_calendar_part(message.get("payload", {}))
+    if part is None:
+        return ""
+    body = part.get("body", {})
+    if body.get("data"):
+        return _decode_base64_url(body["data"])
+    if not body.get("attachmentId") or service is None:
+        return ""
     try:
-        message = service.users().messages().get(
+        attachment = service.users().messages().attachments().get(
             userId=user_id,
-            id=message_id,
-            format="full"
+            messageId=message.get("id", ""),
+            id=body["attachmentId"],
         ).execute()
+    except HttpError as exc:
+        logger.warning(f"Failed to fetch calendar attachment of message {message.get('id')}: {exc}")
+        return ""
+    return _decode_base64_url(attachment.get("data", ""))
 
-        payload = message.get("payload", {})
-        headers = payload.get("headers", [])
-
-        # Extract subject and sender from headers
-        subject = ""
-        sender = ""
-        for header in headers:
-            name = header.get("name", "").lower()
-            value = header.get("value", "")
-            if name == "subject":
-                subject = value
-            elif name == "from":
-                sender = value
-
-        # Extract email body
-        content = _extract_text_from_payload(payload) or ""
 
-        return {
-            "id": message_id,
-            "subject": subject,
-            "sender": sender,
-            "content": content
-        }
+def fetch_messages(service, message_ids: List[str], message_format: str = "full", user_id: str = "me") -> Dict[str, Dict]:
+    """
+    Fetch many messages through the Gmail batch endpoint.
 
-    except HttpError as exc:
-        logger.error(f"Failed to fetch message details {message_id}: {exc}")
-        return None
+    Requests go out GMAIL_BATCH_SIZE at a time instead of one HTTP round trip
+    per message. ``format="metadata"`` asks only for the headers the
+    prefilter needs (plus Gmail's snippet). Returns message resources keyed by
+    ID; messages deleted in the meantime are left out. Rate limits and server
+    errors raise GmailError so the caller retries before moving its cursor.
+    """
+    messages = {}
+    failures = []
+
+    def collect(request_id, response, exception):
+        if exception is None:
+            messages[request_id] = response
+            return
+        status_code = getattr(getattr(exception, "resp", None), "status", None)
+        if status_code == 404:
+            logger.info(f"Gmail message {request_id} no longer exists, skipping")
+        else:
+            failures.append(exception)
+
+    batch_size = getattr(settings, "GMAIL_BATCH_SIZE", 50)
+    for start in range(0, len(message_ids), batch_size):
+        batch = service.new_batch_http_request(callback=collect)
+        for message_id in message_ids[start:start + batch_size]:
+            params = {"userId": user_id, "id": message_id, "format": message_format}
+            if message_format == "metadata":
+                params["metadataHeaders"] = METADATA_HEADERS
+            batch.add(service.users().messages().get(**params), request_id=message_id)
+        try:
+            batch.execute()
+        except HttpError as exc:
+            raise GmailError(f"Gmail batch fetch failed: {exc}") from exc
+        if failures:
+            raise GmailError(f"Failed to fetch {len(failures)} Gmail message(s): {failures[0]}")
+    return messages
 
 
 def _extract_text_from_payload(payload: Dict) -> Optional[str]:
@@ -238,48 +338,55 @@ def _decode_base64_url(data: str) -> str:
         return ""
 
 
-def is_calendar_related(email_content: str) -> bool:
+def calendar_categories(text: str, stop_at: Optional[int] = None) -> Set[str]:
+    """
+    Return the calendar keyword categories found in ``text``.
+
+    Only the first GMAIL_CLASSIFIER_MAX_CHARS characters are scanned, and the
+    scan stops as soon as ``stop_at`` distinct categories have been seen.
+    """
+    found = set()
+    if not text:
+        return found
+    max_chars = getattr(settings, "GMAIL_CLASSIFIER_MAX_CHARS", 20000)
+    for match in CALENDAR_KEYWORDS_RE.finditer(text, 0, max_chars):
+        found.add(match.lastgroup)
+        if stop_at is not None and len(found) >= stop_at:
+            break
+    return found
+
+
+def calendar_score(text: str) -> int:
+    """Score ``text`` by how many calendar keyword categories it contains."""
+    return len(calendar_categories(text))
+
+
+def is_calendar_related(email_content: str, threshold: Optional[int] = None) -> bool:
     """
     Determine if an email appears to contain calendar/event information.
 
-    Uses keyword matching to identify potential event invitations or scheduling emails.
+    Uses keyword matching to identify potential event invitations or scheduling
+    emails: at least ``threshold`` categories (GMAIL_CALENDAR_THRESHOLD by
+    default) must match.
     """
-    if not email_content:
-        return False
+    if threshold is None:
+        threshold = getattr(settings, "GMAIL_CALENDAR_THRESHOLD", 2)
+    return len(calendar_categories(email_content, stop_at=threshold)) >= threshold
 
-    # Convert to lowercase for case-insensitive matching
-    content_lower = email_content.lower()
-
-    # Calendar-related keywords and patterns
-    calendar_keywords = [
-        # Time indicators
-        r'\b(meeting|appointment|event|conference|call|session)\b',
-        r'\b(schedule|scheduled|scheduling)\b',
-        r'\b(invite|invitation|invited)\b',
-
-        # Date/time patterns
-        r'\b(today|tomorrow|monday|tuesday|wednesday|thursday|friday|saturday|sunday)\b',
-        r'\b(january|february|march|april|may|june|july|august|september|october|november|december)\b',
-        r'\d{1,2}:\d{2}\s*(am|pm)',
-        r'\d{1,2}/\d{1,2}/\d{2,4}',
-
-        # Location indicators
-        r'\b(room|location|venue|address)\b',
-        r'\b(zoom|teams|meet|webex)\b',
-
-        # Action words
-        r'\b(rsvp|confirm|attendance|attending)\b',
-        r'\b(reminder|upcoming)\b',
-    ]
 
-    # Count keyword matches
-    matches = 0
-    for pattern in calendar_keywords:
-        if re.search(pattern, content_lower):
-            matches += 1
+def is_calendar_candidate(message: Dict) -> bool:
+    """
+    Cheap first-pass check on a ``format="metadata"`` message.
 
-    # Consider it calendar-related if we have at least 2 matches
-    return matches >= 2
+    Looks only at the subject and Gmail's snippet of the body, so a single
+    keyword is enough to fetch the full message for is_calendar_related.
+    Messages sent as calendar invites always pass.
+    """
+    headers = _message_headers(message)
+    if "calendar" in headers.get("content-type", "").lower():
+        return True
+    text = f"{headers.get('subject', '')}\n{message.get('snippet', '')}"
+    return is_calendar_related(text, threshold=1)
 
 
 def list_recent_messages(account: GoogleAccount, max_results: int = 10) -> List[Dict]:
@@ -305,55 +412,285 @@ def list_recent_messages(account: GoogleAccount, max_results: int = 10) -> List[
         raise GmailError(f"Failed to list messages: {exc}") from exc
 
 
-def process_new_messages(account: GoogleAccount, history_id: str) -> List[Dict]:
+def _history_newer(history_id: str, than: str) -> bool:
+    """Compare Gmail history IDs, which are increasing integers sent as strings."""
+    try:
+        return int(history_id) > int(than)
+    except (TypeError, ValueError):
+        return True
+
+
+def list_added_message_ids(service, start_history_id: str, user_id: str = "me") -> Tuple[List[str], str]:
     """
-    Process new messages since the given history ID.
+    List INBOX messages added since ``start_history_id``, across every page.
 
-    Returns list of message details dicts for calendar-related emails.
-    Each dict contains: 'id', 'subject', 'sender', 'content'
+    Returns the message IDs (oldest first, without repeats) and the mailbox's
+    current history ID. Raises HttpError 404 when the start ID has expired.
     """
-    service = build_gmail_service(account)
-    calendar_emails = []
+    message_ids = []
+    latest = start_history_id
+    params = {
+        "userId": user_id,
+        "startHistoryId": start_history_id,
+        "historyTypes": ["messageAdded"],
+        "labelId": "INBOX",
+        "maxResults": 500,
+    }
+    while True:
+        response = service.users().history().list(**params).execute()
+        for history_item in response.get("history", []):
+            for message_entry in history_item.get("messagesAdded", []):
+                message_id = message_entry.get("message", {}).get("id")
+                if message_id:
+                    message_ids.append(message_id)
+        latest = response.get("historyId", latest)
+        page_token = response.get("nextPageToken")
+        if not page_token:
+            break
+        params["pageToken"] = page_token
+    return list(dict.fromkeys(message_ids)), str(latest)
+
+
+def store_parsed_email(account: GoogleAccount, message_details: Dict, event_data: Optional[Dict] = None) -> Optional[ParsedEmail]:
+    """
+    Queue a calendar-related email for review.
+
+    ``event_data`` is the AI parser's result when the caller already has it;
+    otherwise the email is parsed here. Returns the new ParsedEmail, or None
+    if parsing failed or the message was already stored.
+    """
+    message_id = message_details["id"]
+    if event_data is None:
+        from .email_parser import parse_email_to_event
+
+        try:
+            event_data = parse_email_to_event(message_details["content"])
+        except Exception as e:
+            logger.warning(f"Failed to parse calendar email {message_id}: {e}")
+            return None
+
+    # Convert datetime objects to ISO strings for JSON storage
+    json_safe_data = {**event_data}
+    for field in ("start", "end", "recurrence_end_date"):
+        if json_safe_data.get(field):
+            json_safe_data[field] = json_safe_data[field].isoformat()
 
     try:
-        # Get history of changes since last check
-        response = service.users().history().list(
-            userId="me",
-            startHistoryId=history_id,
-            historyTypes=["messageAdded"],
-            labelId="INBOX"
-        ).execute()
+        parsed_email = ParsedEmail.objects.create(
+            user=account.user,
+            message_id=message_id,
+            subject=message_details.get("subject", "No subject"),
+            email_body=message_details.get("content", ""),
+            sender=message_details.get("sender", ""),
+            parsed_data=json_safe_data,
+            status=ParsedEmail.Status.PENDING,
+        )
+    except IntegrityError:
+        # A concurrent delivery stored it first.
+        logger.info(f"Gmail message {message_id} already processed, skipping")
+        return None
 
-        if "history" not in response:
-            return calendar_emails
+    create_notification(
+        user=account.user,
+        type=Notification.Type.EVENT_CREATED,  # Reusing existing type
+        title=f"New event suggestion: {event_data.get('title', 'Untitled')}",
+        message=f"Gmail found a calendar invitation from {message_details.get('sender', 'unknown sender')}. Review and approve to add to your calendar.",
+        data={
+            "parsed_email_id": parsed_email.pk,
+            "action": "parsed_email_pending_review",
+            "subject": message_details.get("subject", ""),
+            "message_id": message_id,
+        },
+    )
+    logger.info(f"Created ParsedEmail {parsed_email.pk} from Gmail message {message_id}")
+    return parsed_email
 
-        # Process each history entry
-        for history_item in response.get("history", []):
-            messages_added = history_item.get("messagesAdded", [])
 
-            for message_entry in messages_added:
-                message = message_entry.get("message", {})
-                message_id = message.get("id")
+def sync_gmail_history(account: GoogleAccount, history_id: str) -> Dict[str, int]:
+    """
+    Handle one Gmail push notification.
+
+    Only messages added since the account's stored history cursor are looked
+    at, and ones already in ParsedEmail are skipped before any fetch or parse.
+    The rest are screened on metadata before any full body is downloaded.
+    The cursor then moves to ``history_id``. Without a usable cursor (first
+    notification, or Gmail expired it) the newest INBOX messages are checked
+    instead.
+    """
+    stats = {"listed": 0, "known": 0, "screened": 0, "fetched": 0, "invites": 0, "parsed_emails_created": 0}
+    cursor = account.gmail_history_id
+    if cursor and not _history_newer(history_id, cursor):
+        # Redelivered or out-of-order notification: already covered.
+        return stats
+
+    service = build_gmail_service(account)
+    latest = history_id
+    message_ids = None
+    try:
+        if cursor:
+            try:
+                message_ids, latest = list_added_message_ids(service, cursor)
+            except HttpError as exc:
+                if exc.resp.status != 404:
+                    raise
+                logger.info(f"Gmail history cursor expired for user {account.user_id}; rescanning inbox")
+
+        if message_ids is None:
+            response = service.users().messages().list(
+                userId="me",
+                labelIds=["INBOX"],
+                maxResults=getattr(settings, "GMAIL_RESCAN_MAX_MESSAGES", 10),
+            ).execute()
+            message_ids = [msg["id"] for msg in response.get("messages", []) if msg.get("id")]
+    except HttpError as exc:
+        logger.error(f"Failed to list Gmail history for user {account.user_id}: {exc}")
+        raise GmailError(f"Failed to list Gmail history: {exc}") from exc
 
-                if not message_id:
-                    continue
+    stats["listed"] = len(message_ids)
+    known = set(
+        ParsedEmail.objects.filter(user=account.user, message_id__in=message_ids)
+        .values_list("message_id", flat=True)
+    )
+    new_ids = [message_id for message_id in message_ids if message_id not in known]
+    stats["known"] = len(message_ids) - len(new_ids)
+
+    # Headers and snippet first; full bodies only for likely invitations.
+    metadata = fetch_messages(service, new_ids, message_format="metadata")
+    stats["screened"] = len(metadata)
+    candidates = [
+        message_id for message_id in new_ids
+        if message_id in metadata and is_calendar_candidate(metadata[message_id])
+    ]
+    messages = fetch_messages(service, candidates)
+    stats["fetched"] = len(messages)
+    related = []
+    for message_id in candidates:
+        if message_id not in messages:
+            continue
+        details = message_details(messages[message_id], service)
+        if details["calendar"]:
+            from .email_parser import parse_calendar_invite
+
+            try:
+                event_data = parse_calendar_invite(details["calendar"])
+            except ValueError as e:
+                logger.info(f"Skipping Gmail message {message_id}: {e}")
+                continue
+            if event_data is not None:
+                # Structured invite: no AI call needed.
+                stats["invites"] += 1
+                if store_parsed_email(account, details, event_data):
+                    stats["parsed_emails_created"] += 1
+                continue
+        if not details["content"] or not is_calendar_related(details["content"]):
+            continue
+        logger.info(f"Found calendar-related email: {message_id} - {details['subject'] or 'No subject'}")
+        related.append(details)
+
+    if related:
+        from .email_parser import parse_emails_to_events
+
+        # One Groq round trip per batch of emails rather than per email.
+        parsed = parse_emails_to_events({details["id"]: details["content"] for details in related})
+        for details in related:
+            event_data = parsed.get(details["id"])
+            if event_data and store_parsed_email(account, details, event_data):
+                stats["parsed_emails_created"] += 1
+
+    new_cursor = latest if _history_newer(latest, history_id) else history_id
+    if not cursor or _history_newer(new_cursor, cursor):
+        account.gmail_history_id = new_cursor
+        account.save(update_fields=["gmail_history_id", "updated_at"])
+    return stats
+
+
+def _push_keys(account_id: int) -> Tuple[str, str]:
+    return f"gmail:sync-lock:{account_id}", f"gmail:sync-pending:{account_id}"
+
+
+def _push_dedup_key(account: GoogleAccount, history_id: str) -> str:
+    return f"gmail:push:{account.pk}:{history_id}"
+
+
+def accept_push(account: GoogleAccount, history_id: str) -> bool:
+    """
+    Decide in the webhook whether a push needs a sync task at all.
 
-                # Fetch full message details
-                message_details = get_message_details(service, message_id)
+    Pushes already covered by the stored cursor, and Pub/Sub redeliveries of
+    one that is already queued, are dropped without touching Gmail.
+    """
+    if account.gmail_history_id and not _history_newer(history_id, account.gmail_history_id):
+        return False
+    ttl = getattr(settings, "GMAIL_PUSH_DEDUP_SECONDS", 600)
+    return cache.add(_push_dedup_key(account, history_id), True, timeout=ttl)
 
-                if not message_details or not message_details.get("content"):
-                    continue
 
-                # Check if calendar-related
-                if is_calendar_related(message_details["content"]):
-                    logger.info(f"Found calendar-related email: {message_id} - {message_details.get('subject', 'No subject')}")
-                    calendar_emails.append(message_details)
+def release_push(account: GoogleAccount, history_id: str) -> None:
+    """Forget an accepted push that could not be queued, so a redelivery is taken."""
+    cache.delete(_push_dedup_key(account, history_id))
 
-        return calendar_emails
 
-    except HttpError as exc:
-        logger.error(f"Failed to process message history for user {account.user_id}: {exc}")
-        return calendar_emails
+def _hold_lock(lock_key: str, token: str, timeout: int) -> bool:
+    """Extend our sync lock for another ``timeout``; False if another worker took it."""
+    holder = cache.get(lock_key)
+    if holder == token:
+        return cache.touch(lock_key, timeout)
+    return holder is None and cache.add(lock_key, token, timeout=timeout)
+
+
+def run_gmail_sync(account_id: int, history_id: str) -> Dict:
+    """
+    Sync one account's mail up to ``history_id``, one worker per account.
+
+    When another worker already holds the account, the newest history ID is
+    left for it to pick up before it lets go, so overlapping pushes collapse
+    into a single pass over the history range.
+
+    The pending ID is never deleted, only compared with the last ID synced,
+    so a push parked between two reads can't be lost. The lock is extended
+    before every pass so slow passes (LLM retries, rate-limit waits) don't
+    let a second worker in.
+    """
+    lock_key, pending_key = _push_keys(account_id)
+    lock_seconds = getattr(settings, "GMAIL_SYNC_LOCK_SECONDS", 300)
+    token = uuid.uuid4().hex
+    if not cache.add(lock_key, token, timeout=lock_seconds):
+        pending = cache.get(pending_key)
+        if not pending or _history_newer(history_id, pending):
+            cache.set(pending_key, history_id, timeout=lock_seconds)
+        return {"status": "deferred"}
+
+    totals = {"passes": 0, "parsed_emails_created": 0}
+    synced = None
+    try:
+        while history_id:
+            if totals["passes"] and not _hold_lock(lock_key, token, lock_seconds):
+                # Lost the lock to another worker; it picks up the pending ID.
+                break
+            account = GoogleAccount.objects.filter(pk=account_id).first()
+            if account is None:
+                break
+            with notification_buffer() as buffer:
+                try:
+                    stats = sync_gmail_history(account, history_id)
+                except Exception:
+                    # ParsedEmail rows stored before the error stay, and a
+                    # retry skips them as known, so write their notifications.
+                    buffer.flush()
+                    raise
+            synced = history_id
+            totals["passes"] += 1
+            totals["parsed_emails_created"] += stats["parsed_emails_created"]
+            pending = cache.get(pending_key)
+            history_id = pending if pending and _history_newer(pending, synced) else None
+    finally:
+        if cache.get(lock_key) == token:
+            cache.delete(lock_key)
+    # A push that arrived while the lock was being released is handed back
+    # so the caller can queue it again.
+    pending = cache.get(pending_key)
+    requeue = pending if pending and synced and _history_newer(pending, synced) else None
+    return {"status": "processed", "requeue": requeue, **totals}
 
 
 def get_watch_status(account: GoogleAccount) -> Dict:
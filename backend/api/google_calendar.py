@@ -1,6 +1,7 @@
 import logging
 from datetime import datetime, timedelta, timezone as dt_timezone, time
 from typing import Dict, Tuple, Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
@@ -18,8 +19,12 @@ from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 from google_auth_oauthlib.flow import Flow
 from google_auth_httplib2 import AuthorizedHttp
+from icalendar import Event as IcalEvent
 
-from .models import Event, EventAttendee, GoogleAccount
+from .cache import SCOPE_EVENTS, invalidate_user_cache
+from .db import chunked, serialized_write
+from .feeds import exception_starts, recurrence_series
+from .models import Event, EventAttendee, EventException, GoogleAccount
 
 UTC = dt_timezone.utc
 
@@ -30,6 +35,12 @@ User = get_user_model()
 AUTH_URI = "https://accounts.google.com/o/oauth2/auth"
 TOKEN_URI = "https://oauth2.googleapis.com/token"
 STATE_SALT = "api.google.state"
+NON_RECURRING = {
+  "recurrence_frequency": Event.RecurrenceFrequency.NONE,
+  "recurrence_interval": 1,
+  "recurrence_count": None,
+  "recurrence_end_date": None,
+}
 
 
 class StateError(Exception):
@@ -177,6 +188,34 @@ def _render_google_datetime(dt: datetime, all_day: bool) -> Dict:
   }
 
 
+def _google_recurrence(google_event: Dict, start: datetime, all_day: bool):
+  """
+  Parse a recurring event's ``recurrence`` lines into Event recurrence fields
+  plus its EXDATE starts. Returns None when the rule needs more than the model
+  stores (RDATEs, several weekdays, ``2TU``-style days, ...).
+  """
+  lines = google_event.get("recurrence") or []
+  try:
+    component = IcalEvent.from_ical("BEGIN:VEVENT\r\n" + "\r\n".join(lines) + "\r\nEND:VEVENT\r\n")
+  except ValueError:
+    return None
+  rule = component.get("rrule")
+  if rule is None or component.get("rdate") is not None:
+    return None
+  # BYDAY is relative to the event's own zone, not UTC.
+  local_start = start
+  tz_name = google_event.get("start", {}).get("timeZone")
+  if tz_name and not all_day:
+    try:
+      local_start = start.astimezone(ZoneInfo(tz_name))
+    except (ZoneInfoNotFoundError, ValueError):
+      pass
+  series = recurrence_series(rule, local_start, all_day)
+  if not series or len(series) != 1 or series[0][1] != local_start:
+    return None
+  return series[0][2], exception_starts(component, local_start)
+
+
 def _event_defaults_from_google(google_event: Dict) -> Dict:
   start, all_day = _parse_google_datetime(google_event["start"])
   end, end_all_day = _parse_google_datetime(google_event["end"])
@@ -185,12 +224,16 @@ def _event_defaults_from_google(google_event: Dict) -> Dict:
   if all_day:
     end = end - timedelta(seconds=1)
   description = google_event.get("description") or ""
+  recurrence = None
+  if google_event.get("recurrence"):
+    recurrence = _google_recurrence(google_event, start, all_day)
   return {
     "title": google_event.get("summary") or "Untitled event",
     "description": description,
     "start": start,
     "end": end,
     "all_day": all_day,
+    **(recurrence[0] if recurrence else NON_RECURRING),
     "google_event_id": google_event.get("id", ""),
     "google_etag": google_event.get("etag", ""),
     "google_ical_uid": google_event.get("iCalUID", ""),
@@ -266,16 +309,67 @@ def sync_attendees_from_google(
     EventAttendee.objects.filter(event=event).delete()
 
 
+def apply_google_exception(master: Event, google_event: Dict) -> Tuple[str, Optional[Event]]:
+  """Store a changed or cancelled instance of ``master`` as an EventException."""
+  original_start, _ = _parse_google_datetime(google_event["originalStartTime"])
+  if google_event.get("status") == "cancelled":
+    values = {"is_cancelled": True, "title": "", "description": "", "location": "", "start": None, "end": None}
+  else:
+    defaults = _event_defaults_from_google(google_event)
+    values = {
+      "is_cancelled": False,
+      "title": defaults["title"],
+      "description": defaults["description"],
+      "location": google_event.get("location") or "",
+      "start": defaults["start"],
+      "end": defaults["end"],
+    }
+  EventException.objects.update_or_create(
+    event=master,
+    original_start=original_start,
+    defaults=values,
+  )
+  return "exceptions", master
+
+
+def _apply_exdates(event: Event, starts) -> None:
+  cancelled = set(
+    event.exceptions.filter(is_cancelled=True).values_list("original_start", flat=True)
+  )
+  for original_start in starts:
+    if original_start not in cancelled:
+      EventException.objects.update_or_create(
+        event=event,
+        original_start=original_start,
+        defaults={"is_cancelled": True},
+      )
+
+
 @transaction.atomic
 def apply_google_event(account: GoogleAccount, google_event: Dict) -> Tuple[str, Optional[Event]]:
+  """
+  Apply one item from ``events().list(singleEvents=False)``.
+
+  Changed instances of a stored series become exceptions. Series whose rule
+  the model can't store return ``"expand"`` so the caller pulls their
+  instances one by one instead.
+  """
   user = account.user
   event_id = google_event.get("id", "")
   ical_uid = google_event.get("iCalUID", "")
   status = google_event.get("status")
-
-  lookup = Event.objects.filter(pilot=user).filter(
-    Q(google_event_id=event_id) | Q(google_ical_uid=ical_uid)
-  )
+  master_id = google_event.get("recurringEventId")
+
+  if master_id:
+    master = Event.objects.filter(pilot=user, google_event_id=master_id).first()
+    if master is not None and master.recurrence_frequency != Event.RecurrenceFrequency.NONE:
+      return apply_google_exception(master, google_event)
+    # Instances share the series' iCalUID, so only their own id identifies them.
+    lookup = Event.objects.filter(pilot=user, google_event_id=event_id)
+  else:
+    lookup = Event.objects.filter(pilot=user).filter(
+      Q(google_event_id=event_id) | Q(google_ical_uid=ical_uid)
+    )
 
   app_event_id = google_event.get("extendedProperties", {}).get("private", {}).get("app_event_id")
   if app_event_id:
@@ -290,31 +384,70 @@ def apply_google_event(account: GoogleAccount, google_event: Dict) -> Tuple[str,
     return "ignored", None
 
   defaults = _event_defaults_from_google(google_event)
+  if master_id:
+    # Expanded instances would all claim the series' iCalUID.
+    defaults["google_ical_uid"] = ""
+  recurrence = None
+  if google_event.get("recurrence"):
+    recurrence = _google_recurrence(google_event, defaults["start"], defaults["all_day"])
+    if recurrence is None:
+      if event:
+        event.delete()
+      return "expand", None
 
   if event:
     for field, value in defaults.items():
       setattr(event, field, value)
     event.source = Event.Source.SYNCED
     event.save()
-    sync_attendees_from_google(event, google_event, account)
-    return "updated", event
-
-  event = Event.objects.create(
-    pilot=user,
-    source=Event.Source.GOOGLE,
-    **defaults,
-  )
+    result = "updated"
+  else:
+    event = Event.objects.create(
+      pilot=user,
+      source=Event.Source.GOOGLE,
+      **defaults,
+    )
+    result = "created"
   sync_attendees_from_google(event, google_event, account)
-  return "created", event
+  if recurrence:
+    _apply_exdates(event, recurrence[1])
+    # Rows left over from when series were pulled as expanded instances.
+    Event.objects.filter(pilot=user, google_event_id__startswith=f"{event_id}_").delete()
+  return result, event
+
+
+def _pull_instances(service, account: GoogleAccount, google_event: Dict, stats: Dict[str, int]) -> None:
+  """Pull every instance of a series whose rule can't be stored as one row."""
+  window_start = (timezone.now() - timedelta(days=90)).astimezone(UTC)
+  params = {
+    "calendarId": "primary",
+    "eventId": google_event["id"],
+    "showDeleted": True,
+    "maxResults": 2500,
+    "timeMin": window_start.replace(hour=0, minute=0, second=0, microsecond=0).isoformat(),
+  }
+  while True:
+    response = service.events().instances(**params).execute()
+    for batch in chunked(response.get("items", [])):
+      with serialized_write():
+        for item in batch:
+          status, _ = apply_google_event(account, item)
+          stats[status] = stats.get(status, 0) + 1
+    page_token = response.get("nextPageToken")
+    if not page_token:
+      return
+    params["pageToken"] = page_token
 
 
 def pull_events_from_google(account: GoogleAccount) -> Dict[str, int]:
   service = build_service(account)
-  stats = {"created": 0, "updated": 0, "deleted": 0, "ignored": 0}
+  stats = {"created": 0, "updated": 0, "deleted": 0, "ignored": 0, "exceptions": 0}
+  # Series arrive as one item plus their changed instances rather than an
+  # item per occurrence.
   params = {
     "calendarId": "primary",
     "showDeleted": True,
-    "singleEvents": True,
+    "singleEvents": False,
     "maxResults": 2500,
   }
   if account.sync_token:
@@ -324,12 +457,23 @@ def pull_events_from_google(account: GoogleAccount) -> Dict[str, int]:
     window_start = window_start.astimezone(UTC)
     params["timeMin"] = window_start.replace(hour=0, minute=0, second=0, microsecond=0).isoformat()
 
+  instances = []
+  expand = []
   try:
     while True:
       response = service.events().list(**params).execute()
-      for item in response.get("items", []):
-        status, _ = apply_google_event(account, item)
-        stats[status] = stats.get(status, 0) + 1
+      for batch in chunked(response.get("items", [])):
+        with serialized_write():
+          for item in batch:
+            if item.get("recurringEventId"):
+              # Applied once every series is in; its series may be on a later page.
+              instances.append(item)
+              continue
+            status, _ = apply_google_event(account, item)
+            if status == "expand":
+              expand.append(item)
+              continue
+            stats[status] = stats.get(status, 0) + 1
 
       page_token = response.get("nextPageToken")
       if not page_token:
@@ -337,6 +481,9 @@ def pull_events_from_google(account: GoogleAccount) -> Dict[str, int]:
         break
       params["pageToken"] = page_token
       params.pop("timeMin", None)
+
+    for item in expand:
+      _pull_instances(service, account, item, stats)
   except HttpError as exc:
     if exc.resp.status == 410:
       logger.info("Google sync token expired for user %s; resetting.", account.user_id)
@@ -345,6 +492,12 @@ def pull_events_from_google(account: GoogleAccount) -> Dict[str, int]:
       return pull_events_from_google(account)
     raise GoogleSyncError(f"Google API error: {exc}") from exc
 
+  for batch in chunked(instances):
+    with serialized_write():
+      for item in batch:
+        status, _ = apply_google_event(account, item)
+        stats[status] = stats.get(status, 0) + 1
+
   account.last_synced_at = timezone.now()
   account.save(update_fields=["sync_token", "last_synced_at", "updated_at"])
   return stats
@@ -394,11 +547,56 @@ def _event_body_for_google(event: Event) -> Dict:
       until = end_time.astimezone(UTC).strftime("%Y%m%dT%H%M%SZ")
       rule_parts.append(f"UNTIL={until}")
     body["recurrence"] = [f"RRULE:{';'.join(rule_parts)}"]
+    cancelled = [exception.original_start for exception in event.exceptions.all() if exception.is_cancelled]
+    if cancelled and event.all_day:
+      dates = ",".join(start.date().strftime("%Y%m%d") for start in cancelled)
+      body["recurrence"].append(f"EXDATE;VALUE=DATE:{dates}")
+    elif cancelled:
+      stamps = ",".join(start.astimezone(UTC).strftime("%Y%m%dT%H%M%SZ") for start in cancelled)
+      body["recurrence"].append(f"EXDATE:{stamps}")
   else:
     body["recurrence"] = []
   return body
 
 
+def _instance_id(event: Event, original_start: datetime) -> str:
+  """Google's id for one instance of a recurring event."""
+  if event.all_day:
+    return f"{event.google_event_id}_{original_start.strftime('%Y%m%d')}"
+  return f"{event.google_event_id}_{original_start.astimezone(UTC).strftime('%Y%m%dT%H%M%SZ')}"
+
+
+def _push_overrides(service, event: Event) -> None:
+  """Patch the instances a series overrides; cancellations travel as EXDATEs."""
+  for exception in event.exceptions.all():
+    if exception.is_cancelled:
+      continue
+    body = {}
+    if exception.title:
+      body["summary"] = exception.title
+    if exception.description:
+      body["description"] = exception.description
+    if exception.location:
+      body["location"] = exception.location
+    if exception.start:
+      body["start"] = _render_google_datetime(exception.start, event.all_day)
+      end = exception.end or exception.start + (event.end - event.start)
+      if event.all_day:
+        end = end + timedelta(days=1)
+      body["end"] = _render_google_datetime(end, event.all_day)
+    if not body:
+      continue
+    try:
+      service.events().patch(
+        calendarId="primary",
+        eventId=_instance_id(event, exception.original_start),
+        body=body,
+        sendUpdates="all",
+      ).execute()
+    except HttpError as exc:
+      logger.warning("Failed to push occurrence %s of event %s: %s", exception.original_start, event.pk, exc)
+
+
 def push_event_to_google(account: GoogleAccount, event: Event) -> Event:
   service = build_service(account)
   body = _event_body_for_google(event)
@@ -423,6 +621,8 @@ def push_event_to_google(account: GoogleAccount, event: Event) -> Event:
   event.source = Event.Source.SYNCED
   event.save()
   sync_attendees_from_google(event, updated, account)
+  if event.recurrence_frequency != Event.RecurrenceFrequency.NONE:
+    _push_overrides(service, event)
   return event
 
 
@@ -611,6 +811,7 @@ def revoke_google_account(account: GoogleAccount):
     google_raw={},
     source=Event.Source.LOCAL,
   )
+  invalidate_user_cache(SCOPE_EVENTS, account.user_id)
 
 
 def complete_oauth_flow(state: str, code: str) -> Tuple[GoogleAccount, Dict[str, int]]:
@@ -0,0 +1,200 @@
+"""
+Streaming iCalendar reader.
+
+Feeds are read line by line as chunks arrive and each VEVENT is parsed on its
+own, so memory is bounded by the largest single event rather than the feed.
+Downloads are spooled and hashed first so an unchanged feed is never parsed.
+"""
+import codecs
+import hashlib
+import re
+import tempfile
+from dataclasses import dataclass
+from typing import IO, Optional
+
+from django.conf import settings
+from icalendar import Calendar
+
+_TZID_PARAM_RE = re.compile(r";TZID=(\"[^\"]*\"|[^;:]*)", re.IGNORECASE)
+SPOOL_MEMORY_BYTES = 1024 * 1024
+READ_CHUNK_BYTES = 65536
+
+
+class IcsFeedError(ValueError):
+  """Raised when a feed is not a usable iCalendar stream."""
+
+
+@dataclass
+class FeedDownload:
+  """A downloaded feed body plus the validators needed to fetch it conditionally."""
+
+  body: Optional[IO[bytes]]
+  etag: str = ""
+  last_modified: str = ""
+  content_hash: str = ""
+
+  @property
+  def not_modified(self) -> bool:
+    return self.body is None
+
+  def iter_chunks(self):
+    self.body.seek(0)
+    while chunk := self.body.read(READ_CHUNK_BYTES):
+      yield chunk
+
+  def close(self) -> None:
+    if self.body is not None:
+      self.body.close()
+
+
+def spool_feed(chunks, etag: str = "", last_modified: str = "") -> FeedDownload:
+  """
+  Copy a streamed body into a spooled temp file while hashing it.
+
+  Small feeds stay in memory and large ones roll over to disk, so the hash can
+  be compared before anything is parsed.
+  """
+  limit = getattr(settings, "BRIGHTSPACE_MAX_STREAM_BYTES", 50 * 1024 * 1024)
+  digest = hashlib.sha256()
+  body = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY_BYTES)
+  received = 0
+  try:
+    for chunk in chunks:
+      received += len(chunk)
+      if received > limit:
+        raise ValueError("ICS feed exceeds allowed size.")
+      digest.update(chunk)
+      body.write(chunk)
+  except BaseException:
+    body.close()
+    raise
+  return FeedDownload(body, etag=etag, last_modified=last_modified, content_hash=digest.hexdigest())
+
+
+def _max_component_chars() -> int:
+  return getattr(settings, "BRIGHTSPACE_MAX_ICS_BYTES", 5 * 1024 * 1024)
+
+
+def _iter_physical_lines(chunks, max_chars: int):
+  decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+  tail = ""
+  for chunk in chunks:
+    tail += decoder.decode(chunk)
+    *lines, tail = tail.split("\n")
+    for line in lines:
+      yield line[:-1] if line.endswith("\r") else line
+    if len(tail) > max_chars:
+      raise IcsFeedError("ICS line exceeds allowed size.")
+  tail += decoder.decode(b"", final=True)
+  if tail:
+    yield tail.rstrip("\r")
+
+
+def iter_content_lines(chunks, max_chars: int | None = None):
+  """Yield unfolded content lines from an iterable of byte chunks."""
+  max_chars = max_chars or _max_component_chars()
+  current = None
+  for line in _iter_physical_lines(chunks, max_chars):
+    if current is not None and line[:1] in (" ", "\t"):
+      current += line[1:]
+      if len(current) > max_chars:
+        raise IcsFeedError("ICS line exceeds allowed size.")
+      continue
+    if current is not None:
+      yield current
+    current = line
+  if current is not None:
+    yield current
+
+
+def _split_line(line: str):
+  name, _, value = line.partition(":")
+  return name.split(";", 1)[0].strip().upper(), value.strip()
+
+
+def _referenced_tzids(lines) -> set:
+  tzids = set()
+  for line in lines:
+    for match in _TZID_PARAM_RE.findall(line.split(":", 1)[0]):
+      tzids.add(match.strip('"'))
+  return tzids
+
+
+def _parse_event(lines, timezones):
+  parts = ["BEGIN:VCALENDAR", "VERSION:2.0"]
+  for tzid in _referenced_tzids(lines):
+    parts.extend(timezones.get(tzid, ()))
+  parts.extend(lines)
+  parts.append("END:VCALENDAR")
+  try:
+    calendar = Calendar.from_ical("\r\n".join(parts))
+  except ValueError:
+    return None
+  return next(iter(calendar.walk("vevent")), None)
+
+
+def iter_vevents(chunks, max_component_chars: int | None = None):
+  """
+  Yield each VEVENT of a feed as an ``icalendar.Event`` while it streams in.
+
+  VTIMEZONE blocks seen earlier in the feed are attached to the events that
+  reference them. A malformed event yields ``None`` so callers can count it as
+  skipped; a feed that is not iCalendar at all raises ``IcsFeedError``.
+  """
+  limit = max_component_chars or _max_component_chars()
+  timezones = {}
+  started = False
+  block = None
+  block_kind = None
+  block_size = 0
+  depth = 0
+
+  for line in iter_content_lines(chunks, limit):
+    if not line.strip():
+      continue
+    name, value = _split_line(line)
+
+    if not started:
+      if name != "BEGIN" or value.upper() != "VCALENDAR":
+        raise IcsFeedError("The provided ICS feed is not valid.")
+      started = True
+      continue
+
+    if depth == 0:
+      if name != "BEGIN":
+        continue
+      depth = 1
+      block_kind = value.upper()
+      # Only events and their time zones are kept; other components are skipped.
+      block = [line] if block_kind in ("VEVENT", "VTIMEZONE") else None
+      block_size = len(line)
+      continue
+
+    if name == "BEGIN":
+      depth += 1
+    elif name == "END":
+      depth -= 1
+
+    if block is not None:
+      block.append(line)
+      block_size += len(line)
+      if block_size > limit:
+        raise IcsFeedError("ICS event exceeds allowed size.")
+
+    if depth:
+      continue
+
+    if block_kind == "VEVENT":
+      yield _parse_event(block, timezones)
+    elif block_kind == "VTIMEZONE":
+      tzid = next(
+        (_split_line(entry)[1] for entry in block if _split_line(entry)[0] == "TZID"),
+        "",
+      )
+      if tzid:
+        timezones[tzid] = block
+    block = None
+    block_kind = None
+
+  if not started:
+    raise IcsFeedError("The provided ICS feed is not valid.")
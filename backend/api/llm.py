@@ -0,0 +1,273 @@
+"""
+Shared Groq client and rate-limited completion calls.
+
+Every caller in a process goes through one Groq client (one HTTP connection
+pool) and one limiter: at most LLM_MAX_CONCURRENCY requests in flight, and
+token buckets for requests and tokens per minute matched to the Groq plan.
+Rate limits, timeouts and server errors are retried with exponential backoff
+and full jitter. The limits are per process, so divide the plan's limits
+between web and worker processes.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, List
+
+import groq
+import httpx
+from django.conf import settings
+from groq import Groq
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "llama-3.3-70b-versatile"  # Updated to current model (llama-3.1 was decommissioned)
+
+RETRYABLE_ERRORS = (
+    groq.RateLimitError,
+    groq.InternalServerError,
+    groq.APIConnectionError,  # includes APITimeoutError
+)
+# Raised while a stream is being read: groq does not wrap transport errors
+# there, and an SSE "error" event arrives as a bare APIError.
+STREAM_ERRORS = (
+    httpx.TransportError,
+    groq.APIError,
+)
+
+
+class LLMError(Exception):
+    """Raised when the LLM stays unavailable after every retry."""
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled at ``per_minute`` tokens a minute."""
+
+    def __init__(self, per_minute: int):
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        """Take ``amount`` tokens and return how long to wait before using them."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # A request bigger than the bucket still goes through, once it is full.
+            self.tokens -= min(amount, self.capacity)
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+_lock = threading.Lock()
+_client: Groq | None = None
+_client_key: str | None = None
+_slots: threading.BoundedSemaphore | None = None
+_buckets: Dict[str, TokenBucket] = {}
+
+
+def get_client() -> Groq:
+    """Return the process-wide Groq client, creating it on first use."""
+    global _client, _client_key
+    # Get API key from environment
+    api_key = os.getenv("GROQ_API_KEY")
+    if not api_key:
+        raise ValueError("GROQ_API_KEY not configured in environment")
+    with _lock:
+        if _client is None or _client_key != api_key:
+            _client = Groq(
+                api_key=api_key,
+                timeout=getattr(settings, "LLM_TIMEOUT_SECONDS", 30),
+                max_retries=0,  # complete() retries with its own backoff
+            )
+            _client_key = api_key
+        return _client
+
+
+def _limiter():
+    global _slots
+    with _lock:
+        if _slots is None:
+            _slots = threading.BoundedSemaphore(getattr(settings, "LLM_MAX_CONCURRENCY", 4))
+            for name, setting, default in (
+                ("requests", "LLM_REQUESTS_PER_MINUTE", 30),
+                ("tokens", "LLM_TOKENS_PER_MINUTE", 12000),
+            ):
+                per_minute = getattr(settings, setting, default)
+                if per_minute:
+                    _buckets[name] = TokenBucket(per_minute)
+        return _slots, _buckets
+
+
+def reset() -> None:
+    """Drop the shared client and limiter so settings are read again."""
+    global _client, _client_key, _slots
+    with _lock:
+        _client = None
+        _client_key = None
+        _slots = None
+        _buckets.clear()
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for budgeting prompts (about four characters each)."""
+    return len(text) // 4 + 1
+
+
+def _retry_delay(exc: Exception, attempt: int) -> float | None:
+    """
+    Seconds to wait before the next attempt, or None when Groq asks for a
+    longer wait (a daily quota) than LLM_MAX_RETRY_WAIT_SECONDS allows.
+    """
+    max_wait = getattr(settings, "LLM_MAX_RETRY_WAIT_SECONDS", 30)
+    response = getattr(exc, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    try:
+        delay = max(float(retry_after), 0.0)
+    except (TypeError, ValueError):
+        base = getattr(settings, "LLM_RETRY_BASE_SECONDS", 1.0)
+        return random.uniform(0, min(base * 2 ** attempt, max_wait))
+    return delay if delay <= max_wait else None
+
+
+def complete(
+    messages: List[Dict[str, str]],
+    max_tokens: int,
+    consume: Callable[[Any], Any] | None = None,
+    **kwargs: Any,
+):
+    """
+    Run one chat completion through the shared client and limiter.
+
+    Extra keyword arguments go to ``chat.completions.create``; ``model``
+    defaults to DEFAULT_MODEL. ``consume`` reads the response (a stream, with
+    ``stream=True``) while the concurrency slot is still held, and its result
+    is returned; connection errors while it reads are retried too. Raises
+    LLMError once retries are used up, and lets other Groq errors (bad
+    request, authentication) through unchanged.
+    """
+    client = get_client()
+    kwargs.setdefault("model", DEFAULT_MODEL)
+    prompt_tokens = sum(estimate_tokens(message["content"]) for message in messages)
+    slots, buckets = _limiter()
+    max_retries = getattr(settings, "LLM_MAX_RETRIES", 3)
+
+    for attempt in range(max_retries + 1):
+        wait = 0.0
+        if "requests" in buckets:
+            wait = max(wait, buckets["requests"].reserve(1))
+        if "tokens" in buckets:
+            wait = max(wait, buckets["tokens"].reserve(prompt_tokens + max_tokens))
+        if wait:
+            time.sleep(wait)
+        streaming = False
+        try:
+            with slots:
+                response = client.chat.completions.create(messages=messages, max_tokens=max_tokens, **kwargs)
+                if consume is None:
+                    return response
+                streaming = True
+                return consume(response)
+        except RETRYABLE_ERRORS + STREAM_ERRORS as exc:
+            if not streaming and not isinstance(exc, RETRYABLE_ERRORS):
+                raise
+            if attempt == max_retries:
+                raise LLMError(f"Groq request failed after {attempt + 1} attempts: {exc}") from exc
+            delay = _retry_delay(exc, attempt)
+            if delay is None:
+                raise LLMError(f"Groq asked to wait longer than allowed before retrying: {exc}") from exc
+            logger.warning(f"Groq request failed ({exc.__class__.__name__}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+
+class JsonScanner:
+    """
+    Incremental scanner for the first JSON object or array in streamed text.
+
+    Text before the opening bracket (a markdown fence, a stray sentence) is
+    skipped, up to ``max_preamble`` characters. ``feed`` returns the complete
+    JSON text as soon as the outer bracket closes, and None until then;
+    strings and escapes are tracked so brackets inside values don't count.
+    """
+
+    def __init__(self, max_preamble: int = 500):
+        self.max_preamble = max_preamble
+        self.preamble = 0
+        self.parts: List[str] = []
+        self.started = False
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+
+    def feed(self, text: str) -> str | None:
+        if not self.started:
+            starts = [index for index in (text.find("{"), text.find("[")) if index >= 0]
+            if not starts:
+                self.preamble += len(text)
+                if self.preamble > self.max_preamble:
+                    raise ValueError("AI response is not JSON")
+                return None
+            text = text[min(starts):]
+            self.started = True
+
+        for index, char in enumerate(text):
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char in "{[":
+                self.depth += 1
+            elif char in "}]":
+                self.depth -= 1
+                if self.depth == 0:
+                    self.parts.append(text[:index + 1])
+                    return "".join(self.parts)
+        self.parts.append(text)
+        return None
+
+
+def _read_json_stream(stream) -> Any:
+    scanner = JsonScanner()
+    try:
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            document = scanner.feed(chunk.choices[0].delta.content or "")
+            if document is not None:
+                # Stop generating: anything the model adds after the JSON is waste.
+                return json.loads(document)
+    finally:
+        stream.close()
+    raise ValueError("AI response ended before its JSON was complete")
+
+
+def complete_json(messages: List[Dict[str, str]], max_tokens: int, json_mode: bool = True, **kwargs: Any) -> Any:
+    """
+    Stream a completion and return the first JSON value in it, parsed.
+
+    The stream is closed as soon as that value is complete, and a response
+    that opens with prose instead of JSON is abandoned early. With
+    ``json_mode`` Groq's JSON object mode is requested (the value must then
+    be an object); if the model or Groq rejects it, the request is repeated
+    without it. Raises ValueError for a missing or malformed JSON value.
+    """
+    if json_mode:
+        try:
+            return complete(
+                messages, max_tokens, consume=_read_json_stream, stream=True,
+                response_format={"type": "json_object"}, **kwargs,
+            )
+        except groq.BadRequestError as exc:
+            logger.warning(f"Groq JSON mode request rejected, retrying without it: {exc}")
+    return complete(messages, max_tokens, consume=_read_json_stream, stream=True, **kwargs)
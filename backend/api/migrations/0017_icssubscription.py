@@ -0,0 +1,72 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:36
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_brightspacefeed_refresh_stats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IcsSubscription',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ics_url', models.URLField()),
+                ('last_imported_at', models.DateTimeField(blank=True, null=True)),
+                ('etag', models.CharField(blank=True, default='', max_length=255)),
+                ('last_modified', models.CharField(blank=True, default='', max_length=64)),
+                ('content_hash', models.CharField(blank=True, default='', max_length=64)),
+                ('last_attempted_at', models.DateTimeField(blank=True, null=True)),
+                ('last_duration_ms', models.PositiveIntegerField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('consecutive_failures', models.PositiveSmallIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(blank=True, db_index=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('name', models.CharField(max_length=120)),
+                ('is_active', models.BooleanField(default=True)),
+            ],
+        ),
+        migrations.RemoveConstraint(
+            model_name='event',
+            name='unique_google_ical_per_user',
+        ),
+        migrations.AlterField(
+            model_name='event',
+            name='source',
+            field=models.CharField(choices=[('local', 'Created in app'), ('google', 'Created in Google'), ('synced', 'Synced between app and Google'), ('brightspace', 'Imported from Brightspace'), ('subscription', 'Imported from a calendar subscription')], default='local', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='notification',
+            name='type',
+            field=models.CharField(choices=[('event_created', 'Mission created'), ('event_updated', 'Mission updated'), ('event_deleted', 'Mission deleted'), ('google_sync', 'Google Calendar sync'), ('brightspace_import', 'Brightspace import'), ('subscription_import', 'Calendar subscription import')], max_length=50),
+        ),
+        migrations.AddField(
+            model_name='icssubscription',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ics_subscriptions', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='subscription',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='events', to='api.icssubscription'),
+        ),
+        migrations.AddConstraint(
+            model_name='event',
+            constraint=models.UniqueConstraint(condition=models.Q(models.Q(('google_ical_uid', ''), _negated=True), ('subscription__isnull', True)), fields=('pilot', 'google_ical_uid'), name='unique_google_ical_per_user'),
+        ),
+        migrations.AddConstraint(
+            model_name='event',
+            constraint=models.UniqueConstraint(condition=models.Q(('subscription__isnull', False)), fields=('subscription', 'google_ical_uid'), name='unique_ical_uid_per_subscription'),
+        ),
+        migrations.AddConstraint(
+            model_name='icssubscription',
+            constraint=models.UniqueConstraint(fields=('user', 'ics_url'), name='unique_ics_subscription_per_user'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0017_icssubscription'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventException',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('original_start', models.DateTimeField()),
+                ('is_cancelled', models.BooleanField(default=False)),
+                ('title', models.CharField(blank=True, default='', max_length=250)),
+                ('description', models.TextField(blank=True)),
+                ('location', models.CharField(blank=True, default='', max_length=500)),
+                ('start', models.DateTimeField(blank=True, null=True)),
+                ('end', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='exceptions', to='api.event')),
+            ],
+            options={
+                'ordering': ['original_start'],
+                'constraints': [models.UniqueConstraint(fields=('event', 'original_start'), name='unique_exception_per_occurrence')],
+            },
+        ),
+    ]
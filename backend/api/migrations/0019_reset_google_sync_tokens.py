@@ -0,0 +1,19 @@
+from django.db import migrations
+
+
+def reset_sync_tokens(apps, schema_editor):
+    # Sync tokens belong to the old singleEvents=True listing; start each
+    # account over so series are pulled as single rows.
+    GoogleAccount = apps.get_model('api', 'GoogleAccount')
+    GoogleAccount.objects.exclude(sync_token='').update(sync_token='')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0018_eventexception'),
+    ]
+
+    operations = [
+        migrations.RunPython(reset_sync_tokens, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0019_reset_google_sync_tokens'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='googleaccount',
+            name='gmail_history_id',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+    ]
@@ -1,5 +1,7 @@
 import uuid
+from datetime import datetime
 
+from dateutil import rrule
 from django.db import models
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
@@ -13,6 +15,7 @@ class Event(models.Model):
     GOOGLE = "google", "Created in Google"
     SYNCED = "synced", "Synced between app and Google"
     BRIGHTSPACE = "brightspace", "Imported from Brightspace"
+    SUBSCRIPTION = "subscription", "Imported from a calendar subscription"
 
   class RecurrenceFrequency(models.TextChoices):
     NONE = "none", "Does not repeat"
@@ -47,6 +50,13 @@ class Event(models.Model):
   google_ical_uid = models.CharField(max_length=255, blank=True, default="")
   google_updated = models.DateTimeField(null=True, blank=True)
   google_raw = models.JSONField(default=dict, blank=True)
+  subscription = models.ForeignKey(
+    "IcsSubscription",
+    on_delete=models.CASCADE,
+    related_name="events",
+    null=True,
+    blank=True,
+  )
   created_at = models.DateTimeField(auto_now_add=True)
   updated_at = models.DateTimeField(auto_now=True)
 
@@ -84,6 +94,34 @@ class Event(models.Model):
     self.full_clean()
     return super().save(*args, **kwargs)
 
+  def occurrence_rule(self):
+    """The series as a dateutil rrule, or None for a one-off event."""
+    frequencies = {
+      self.RecurrenceFrequency.DAILY: rrule.DAILY,
+      self.RecurrenceFrequency.WEEKLY: rrule.WEEKLY,
+      self.RecurrenceFrequency.MONTHLY: rrule.MONTHLY,
+      self.RecurrenceFrequency.YEARLY: rrule.YEARLY,
+    }
+    frequency = frequencies.get(self.recurrence_frequency)
+    if frequency is None:
+      return None
+    rule_kwargs = {
+      "dtstart": self.start,
+      "interval": self.recurrence_interval,
+    }
+    if self.recurrence_count:
+      rule_kwargs["count"] = self.recurrence_count
+    if self.recurrence_end_date:
+      if self.all_day:
+        rule_kwargs["until"] = datetime.combine(
+          self.recurrence_end_date,
+          datetime.max.time(),
+          tzinfo=self.start.tzinfo,
+        )
+      else:
+        rule_kwargs["until"] = datetime.combine(self.recurrence_end_date, self.start.timetz())
+    return rrule.rrule(frequency, **rule_kwargs)
+
   @property
   def urgency_color(self):
     if not self.start:
@@ -111,9 +149,15 @@ class Event(models.Model):
       ),
       models.UniqueConstraint(
         fields=["pilot", "google_ical_uid"],
-        condition=~Q(google_ical_uid=""),
+        condition=~Q(google_ical_uid="") & Q(subscription__isnull=True),
         name="unique_google_ical_per_user",
       ),
+      # Subscriptions keep their own UID space so two feeds can share UIDs.
+      models.UniqueConstraint(
+        fields=["subscription", "google_ical_uid"],
+        condition=Q(subscription__isnull=False),
+        name="unique_ical_uid_per_subscription",
+      ),
     ]
     indexes = [
       models.Index(fields=["pilot", "google_event_id"]),
@@ -121,6 +165,38 @@ class Event(models.Model):
     ]
 
 
+class EventException(models.Model):
+  """
+  One occurrence of a recurring event that was cancelled or changed.
+
+  ``original_start`` is the start the series rule generated; blank override
+  fields keep the series value.
+  """
+
+  event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name="exceptions")
+  original_start = models.DateTimeField()
+  is_cancelled = models.BooleanField(default=False)
+  title = models.CharField(max_length=250, blank=True, default="")
+  description = models.TextField(blank=True)
+  location = models.CharField(max_length=500, blank=True, default="")
+  start = models.DateTimeField(null=True, blank=True)
+  end = models.DateTimeField(null=True, blank=True)
+  created_at = models.DateTimeField(auto_now_add=True)
+  updated_at = models.DateTimeField(auto_now=True)
+
+  def __str__(self):
+    return f"{self.event_id} @ {self.original_start}"
+
+  class Meta:
+    ordering = ["original_start"]
+    constraints = [
+      models.UniqueConstraint(
+        fields=["event", "original_start"],
+        name="unique_exception_per_occurrence",
+      ),
+    ]
+
+
 class EventAttendee(models.Model):
   class ResponseStatus(models.TextChoices):
     NEEDS_ACTION = "needsAction", "Needs action"
@@ -178,6 +254,8 @@ class GoogleAccount(models.Model):
   watch_channel_id = models.CharField(max_length=255, blank=True)
   watch_resource_id = models.CharField(max_length=255, blank=True)
   watch_expires_at = models.DateTimeField(null=True, blank=True)
+  # Gmail history ID up to which pushed mail has been processed.
+  gmail_history_id = models.CharField(max_length=32, blank=True, default="")
   created_at = models.DateTimeField(auto_now_add=True)
   updated_at = models.DateTimeField(auto_now=True)
 
@@ -189,20 +267,92 @@ class GoogleAccount(models.Model):
     unique_together = (("user", "google_user_id"),)
 
 
-class BrightspaceFeed(models.Model):
+class IcsFeed(models.Model):
+  """
+  An iCal URL the import engine in ``api.feeds`` keeps in sync, plus its
+  fetch and refresh state. Subclasses say which events belong to them.
+  """
+
+  ics_url = models.URLField()
+  last_imported_at = models.DateTimeField(null=True, blank=True)
+  # Validators from the last successful import, sent back as conditional headers.
+  etag = models.CharField(max_length=255, blank=True, default="")
+  last_modified = models.CharField(max_length=64, blank=True, default="")
+  content_hash = models.CharField(max_length=64, blank=True, default="")
+  # Refresh bookkeeping for the scheduled import.
+  last_attempted_at = models.DateTimeField(null=True, blank=True)
+  last_duration_ms = models.PositiveIntegerField(null=True, blank=True)
+  last_error = models.TextField(blank=True, default="")
+  consecutive_failures = models.PositiveSmallIntegerField(default=0)
+  next_attempt_at = models.DateTimeField(null=True, blank=True, db_index=True)
+  created_at = models.DateTimeField(auto_now_add=True)
+  updated_at = models.DateTimeField(auto_now=True)
+
+  class Meta:
+    abstract = True
+
+  def matching_events(self):
+    """Events a feed UID may update."""
+    raise NotImplementedError
+
+  def owned_events(self):
+    """Events removed when their UID drops out of the feed."""
+    raise NotImplementedError
+
+  def new_event_fields(self) -> dict:
+    """Extra field values for events this feed creates."""
+    raise NotImplementedError
+
+
+class BrightspaceFeed(IcsFeed):
   user = models.OneToOneField(
     User,
     on_delete=models.CASCADE,
     related_name="brightspace_feed",
   )
-  ics_url = models.URLField()
-  last_imported_at = models.DateTimeField(null=True, blank=True)
-  created_at = models.DateTimeField(auto_now_add=True)
-  updated_at = models.DateTimeField(auto_now=True)
 
   def __str__(self):
     return f"{self.user.username} Brightspace feed"
 
+  def matching_events(self):
+    return Event.objects.filter(pilot=self.user, subscription__isnull=True)
+
+  def owned_events(self):
+    return self.matching_events().filter(source=Event.Source.BRIGHTSPACE)
+
+  def new_event_fields(self) -> dict:
+    return {"source": Event.Source.BRIGHTSPACE}
+
+
+class IcsSubscription(IcsFeed):
+  user = models.ForeignKey(
+    User,
+    on_delete=models.CASCADE,
+    related_name="ics_subscriptions",
+  )
+  name = models.CharField(max_length=120)
+  is_active = models.BooleanField(default=True)
+
+  class Meta:
+    constraints = [
+      models.UniqueConstraint(
+        fields=["user", "ics_url"],
+        name="unique_ics_subscription_per_user",
+      ),
+    ]
+
+  def __str__(self):
+    return f"{self.user.username} subscription {self.name}"
+
+  def matching_events(self):
+    return Event.objects.filter(subscription=self)
+
+  def owned_events(self):
+    return self.matching_events()
+
+  def new_event_fields(self) -> dict:
+    return {"source": Event.Source.SUBSCRIPTION, "subscription": self}
+
 
 class Notification(models.Model):
   class Type(models.TextChoices):
@@ -211,6 +361,7 @@ class Notification(models.Model):
     EVENT_DELETED = "event_deleted", "Mission deleted"
     GOOGLE_SYNC = "google_sync", "Google Calendar sync"
     BRIGHTSPACE_IMPORT = "brightspace_import", "Brightspace import"
+    SUBSCRIPTION_IMPORT = "subscription_import", "Calendar subscription import"
 
   user = models.ForeignKey(
     User,
@@ -237,6 +388,29 @@ class Notification(models.Model):
 
   class Meta:
     ordering = ["-created_at"]
+    indexes = [
+      models.Index(
+        fields=["user", "type"],
+        condition=Q(read_at__isnull=True),
+        name="notification_unread_idx",
+      ),
+    ]
+
+
+class NotificationCounter(models.Model):
+  """Denormalized unread count per user, kept in step by api.notifications."""
+  user = models.OneToOneField(
+    User,
+    on_delete=models.CASCADE,
+    primary_key=True,
+    related_name="notification_counter",
+  )
+  unread_count = models.PositiveIntegerField(default=0)
+  reconciled_at = models.DateTimeField(null=True, blank=True)
+  updated_at = models.DateTimeField(auto_now=True)
+
+  def __str__(self):
+    return f"NotificationCounter({self.user_id}, {self.unread_count})"
 
 
 class ParsedEmail(models.Model):
@@ -1,15 +1,99 @@
 from __future__ import annotations
 
-from typing import Any, Mapping, MutableMapping, TYPE_CHECKING
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Hashable, List, Mapping, MutableMapping, TYPE_CHECKING
 
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
 from django.utils import timezone
 
-from .models import Event, Notification
+from .cache import SCOPE_NOTIFICATIONS, invalidate_user_cache
+from .models import Event, Notification, NotificationCounter
 
 if TYPE_CHECKING:  # pragma: no cover
     from django.contrib.auth.models import User
 
 
+def counts_as_unread(notification_type: str) -> bool:
+    """Google sync rows never show in the bell, so they never count."""
+    return notification_type != Notification.Type.GOOGLE_SYNC
+
+
+class NotificationBuffer:
+    """
+    Collects notifications and writes them with one bulk_create on flush.
+
+    Notifications for the same user, type, event and action coalesce so only
+    the latest one is written.
+    """
+
+    def __init__(self):
+        self._pending: Dict[Hashable, Notification] = {}
+
+    def __len__(self):
+        return len(self._pending)
+
+    @staticmethod
+    def _coalesce_key(notification: Notification) -> Hashable:
+        event_id = notification.event_id or notification.data.get("event_id")
+        if not event_id:
+            return id(notification)
+        return (notification.user_id, notification.type, event_id, notification.data.get("action"))
+
+    def add(self, notification: Notification) -> None:
+        key = self._coalesce_key(notification)
+        # Re-insert so a coalesced notification takes the latest position.
+        self._pending.pop(key, None)
+        self._pending[key] = notification
+
+    def flush(self) -> List[Notification]:
+        from .realtime import publish_notification
+
+        notifications = list(self._pending.values())
+        self._pending.clear()
+        if not notifications:
+            return []
+
+        unread_by_user = Counter(n.user_id for n in notifications if counts_as_unread(n.type))
+        with transaction.atomic():
+            created = Notification.objects.bulk_create(notifications)
+            for user_id, delta in unread_by_user.items():
+                adjust_unread_count(user_id, delta)
+        # bulk_create skips post_save, so invalidate explicitly.
+        for user_id in {n.user_id for n in notifications}:
+            invalidate_user_cache(SCOPE_NOTIFICATIONS, user_id)
+        transaction.on_commit(lambda: [publish_notification(n) for n in created])
+        return created
+
+
+_active_buffer: ContextVar[NotificationBuffer | None] = ContextVar("notification_buffer", default=None)
+
+
+@contextmanager
+def notification_buffer():
+    """
+    Buffer every create_notification call in the block and bulk-write on exit.
+
+    Nested blocks share the outermost buffer. Usable as a decorator on views
+    and tasks. Nothing is written if the block raises.
+    """
+    current = _active_buffer.get()
+    if current is not None:
+        yield current
+        return
+
+    buffer = NotificationBuffer()
+    token = _active_buffer.set(buffer)
+    try:
+        yield buffer
+    finally:
+        _active_buffer.reset(token)
+    buffer.flush()
+
+
 def create_notification(
     *,
     user: "User",
@@ -19,15 +103,92 @@ def create_notification(
     data: Mapping[str, Any] | None = None,
     event: Event | None = None,
 ) -> Notification:
+    from .realtime import publish_notification
+
     payload: MutableMapping[str, Any] = {"timestamp": timezone.now().isoformat()}
     if data:
         payload.update(data)
-    notification = Notification.objects.create(
-        user=user,
-        type=type,
-        title=title,
-        message=message or "",
-        data=payload,
-        event=event,
-    )
+
+    buffer = _active_buffer.get()
+    if buffer is not None:
+        # Written (and given a pk) when the surrounding buffer flushes.
+        notification = Notification(
+            user=user,
+            type=type,
+            title=title,
+            message=message or "",
+            data=payload,
+            event=event,
+        )
+        buffer.add(notification)
+        return notification
+
+    with transaction.atomic():
+        notification = Notification.objects.create(
+            user=user,
+            type=type,
+            title=title,
+            message=message or "",
+            data=payload,
+            event=event,
+        )
+        if counts_as_unread(type):
+            adjust_unread_count(user.pk, 1)
+    transaction.on_commit(lambda: publish_notification(notification))
     return notification
+
+
+def mark_notifications_read(user: "User", queryset) -> int:
+    """Stamp ``read_at`` on the unread rows of ``queryset`` and update the counter."""
+    now = timezone.now()
+    with transaction.atomic():
+        visible = queryset.exclude(type=Notification.Type.GOOGLE_SYNC).update(read_at=now)
+        hidden = queryset.filter(type=Notification.Type.GOOGLE_SYNC).update(read_at=now)
+        adjust_unread_count(user.pk, -visible)
+    return visible + hidden
+
+
+def adjust_unread_count(user_id: int, delta: int, seed_missing: bool = True) -> None:
+    """Atomically shift the stored unread count, creating the row if needed."""
+    if not delta:
+        return
+    updated = NotificationCounter.objects.filter(user_id=user_id).update(
+        unread_count=Greatest(F("unread_count") + delta, 0),
+        updated_at=timezone.now(),
+    )
+    if not updated and seed_missing:
+        # No counter yet: seed it from the table, which already reflects this change.
+        reconcile_unread_count(user_id)
+
+
+def count_unread_notifications(user_id: int) -> int:
+    return (
+        Notification.objects.filter(user_id=user_id, read_at__isnull=True)
+        .exclude(type=Notification.Type.GOOGLE_SYNC)
+        .count()
+    )
+
+
+def reconcile_unread_count(user_id: int) -> int:
+    """Recount a user's unread notifications and repair the stored counter."""
+    with transaction.atomic():
+        counter, _ = NotificationCounter.objects.select_for_update().get_or_create(user_id=user_id)
+        actual = count_unread_notifications(user_id)
+        if counter.unread_count != actual or counter.reconciled_at is None:
+            counter.unread_count = actual
+            counter.reconciled_at = timezone.now()
+            counter.save(update_fields=["unread_count", "reconciled_at", "updated_at"])
+            invalidate_user_cache(SCOPE_NOTIFICATIONS, user_id)
+    return actual
+
+
+def unread_notification_count(user: "User") -> int:
+    """Unread notifications shown in the bell, read from the counter row."""
+    stored = (
+        NotificationCounter.objects.filter(user=user)
+        .values_list("unread_count", flat=True)
+        .first()
+    )
+    if stored is None:
+        return reconcile_unread_count(user.pk)
+    return stored
@@ -0,0 +1,153 @@
+"""
+Server-push delivery of notifications over Server-Sent Events.
+
+``create_notification`` publishes each new row to a per-user Redis pub/sub
+channel once its transaction commits. Every open stream subscribes to its
+user's channel, so any ASGI worker can serve any tab without polling.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import threading
+import time
+
+import redis
+import redis.asyncio as aioredis
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+logger = logging.getLogger(__name__)
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def _channel_for(user_id: int) -> str:
+    return f"vcal:notifications:{user_id}"
+
+
+def _stream_enabled() -> bool:
+    return getattr(settings, "NOTIFICATION_STREAM_ENABLED", True)
+
+
+def _get_client() -> redis.Redis:
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = redis.Redis.from_url(
+                    settings.NOTIFICATION_PUBSUB_URL,
+                    socket_timeout=2,
+                    socket_connect_timeout=2,
+                )
+    return _client
+
+
+def publish_to_user(user_id: int, event: str, payload) -> None:
+    """Fan a stream event out to every open tab of ``user_id``."""
+    if not _stream_enabled():
+        return
+    message = json.dumps({"event": event, "data": payload}, default=str)
+    try:
+        _get_client().publish(_channel_for(user_id), message)
+    except redis.RedisError as exc:
+        logger.warning("Failed to publish %s for user %s: %s", event, user_id, exc)
+
+
+def publish_notification(notification) -> None:
+    from .models import Notification
+    from .serializers import NotificationSerializer
+
+    if notification.type == Notification.Type.GOOGLE_SYNC:
+        return
+    publish_to_user(
+        notification.user_id,
+        "notification",
+        NotificationSerializer(notification).data,
+    )
+
+
+def publish_unread_count(user) -> None:
+    from .notifications import unread_notification_count
+
+    publish_to_user(user.pk, "unread_count", {"unread_count": unread_notification_count(user)})
+
+
+def _format_sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def _authenticate_stream_token(raw_token: str) -> int | None:
+    try:
+        token = AccessToken(raw_token)
+    except TokenError:
+        return None
+    return token.get(jwt_settings.USER_ID_CLAIM)
+
+
+async def _event_stream(user):
+    heartbeat = getattr(settings, "NOTIFICATION_STREAM_HEARTBEAT_SECONDS", 15)
+    # Streams end periodically so the browser reconnects with a fresh token.
+    deadline = time.monotonic() + getattr(settings, "NOTIFICATION_STREAM_MAX_SECONDS", 600)
+
+    from .notifications import unread_notification_count
+
+    count = await sync_to_async(unread_notification_count)(user)
+    yield "retry: 5000\n\n"
+    yield _format_sse("unread_count", {"unread_count": count})
+
+    client = aioredis.Redis.from_url(settings.NOTIFICATION_PUBSUB_URL)
+    pubsub = client.pubsub()
+    try:
+        await pubsub.subscribe(_channel_for(user.pk))
+        last_sent = time.monotonic()
+        while time.monotonic() < deadline:
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            if message and message.get("type") == "message":
+                envelope = json.loads(message["data"])
+                yield _format_sse(envelope["event"], envelope["data"])
+                last_sent = time.monotonic()
+            elif time.monotonic() - last_sent >= heartbeat:
+                yield ": keepalive\n\n"
+                last_sent = time.monotonic()
+    except redis.RedisError as exc:
+        logger.warning("Notification stream for user %s lost Redis: %s", user.pk, exc)
+    finally:
+        await pubsub.aclose()
+        await client.aclose()
+
+
+@require_GET
+async def notification_stream(request):
+    """
+    Server-Sent Events stream of new notifications and unread-count changes.
+
+    GET /api/notifications/stream/?token=<access token>
+    EventSource cannot send headers, so the JWT access token rides in the query.
+    """
+    if not _stream_enabled() or not isinstance(request, ASGIRequest):
+        return JsonResponse(
+            {"detail": "Notification stream requires the ASGI server."},
+            status=503,
+        )
+
+    user_id = _authenticate_stream_token(request.GET.get("token", ""))
+    if user_id is None:
+        return JsonResponse({"detail": "Invalid or expired token."}, status=401)
+
+    user = await User.objects.filter(pk=user_id, is_active=True).afirst()
+    if user is None:
+        return JsonResponse({"detail": "Invalid or expired token."}, status=401)
+
+    response = StreamingHttpResponse(_event_stream(user), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
@@ -0,0 +1,162 @@
+"""
+Notification retention: per-type TTLs and rollup of notification bursts.
+
+Both jobs work in bounded chunks so a nightly run never holds long locks or
+loads an entire table into memory.
+"""
+from __future__ import annotations
+
+import logging
+from collections import Counter
+from datetime import timedelta
+from typing import Dict, List
+
+from django.conf import settings
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .db import serialized_write
+from .models import Notification
+from .notifications import adjust_unread_count
+
+logger = logging.getLogger(__name__)
+
+# Rows a user still has to act on are never folded into a rollup.
+ACTIONABLE_ACTIONS = ("parsed_email_pending_review",)
+
+ROLLUP_TITLES = {
+    Notification.Type.EVENT_CREATED: "{count} missions scheduled",
+    Notification.Type.EVENT_UPDATED: "{count} missions updated",
+    Notification.Type.EVENT_DELETED: "{count} missions removed",
+    Notification.Type.GOOGLE_SYNC: "{count} Google Calendar syncs",
+    Notification.Type.BRIGHTSPACE_IMPORT: "{count} Brightspace imports",
+    Notification.Type.SUBSCRIPTION_IMPORT: "{count} calendar subscription updates",
+}
+MAX_ROLLUP_EVENT_IDS = 50
+MAX_BURST_SIZE = 1000
+
+
+def _retention_days() -> Dict[str, int]:
+    return getattr(settings, "NOTIFICATION_RETENTION_DAYS", {})
+
+
+def prune_expired_notifications(now=None) -> Dict[str, int]:
+    """Delete notifications older than their type's TTL, in bounded chunks."""
+    now = now or timezone.now()
+    batch_size = getattr(settings, "NOTIFICATION_PRUNE_BATCH_SIZE", 500)
+    max_batches = getattr(settings, "NOTIFICATION_PRUNE_MAX_BATCHES", 200)
+    deleted: Dict[str, int] = {}
+    batches = 0
+
+    for notification_type, days in _retention_days().items():
+        if days is None or days < 0:
+            continue
+        expired = Notification.objects.filter(
+            type=notification_type,
+            created_at__lt=now - timedelta(days=days),
+        )
+        while batches < max_batches:
+            ids = list(expired.order_by("pk").values_list("pk", flat=True)[:batch_size])
+            if not ids:
+                break
+            with serialized_write():
+                # Signals keep unread counters and caches in step per row.
+                Notification.objects.filter(pk__in=ids).delete()
+            deleted[notification_type] = deleted.get(notification_type, 0) + len(ids)
+            batches += 1
+
+    if batches >= max_batches:
+        logger.info("Notification prune hit its batch budget; remaining rows wait for the next run")
+    return deleted
+
+
+def _rollup_candidates(settle_before, types):
+    return (
+        Notification.objects.filter(type__in=types, created_at__lt=settle_before)
+        .exclude(data__has_key="rollup")
+        # Without has_key the lookup is NULL for rows that have no action,
+        # and exclude() would drop them too.
+        .exclude(Q(data__has_key="action") & Q(data__action__in=ACTIONABLE_ACTIONS))
+    )
+
+
+def _flush_burst(user_id: int, notification_type: str, burst: List[dict]) -> None:
+    first, last = burst[0], burst[-1]
+    unread = [row for row in burst if row["read_at"] is None]
+    event_ids = [row["data"].get("event_id") for row in burst if row["data"].get("event_id")]
+    actions = Counter(row["data"].get("action") for row in burst if row["data"].get("action"))
+    count = len(burst)
+
+    with serialized_write():
+        Notification.objects.filter(pk__in=[row["pk"] for row in burst]).delete()
+        rollup = Notification.objects.create(
+            user_id=user_id,
+            type=notification_type,
+            title=ROLLUP_TITLES.get(notification_type, "{count} notifications").format(count=count),
+            message=f"Grouped {count} notifications between {first['created_at']:%Y-%m-%d %H:%M} and {last['created_at']:%H:%M}.",
+            data={
+                "rollup": True,
+                "count": count,
+                "first_at": first["created_at"].isoformat(),
+                "last_at": last["created_at"].isoformat(),
+                "event_ids": event_ids[:MAX_ROLLUP_EVENT_IDS],
+                "actions": dict(actions),
+            },
+            read_at=None if unread else max(row["read_at"] for row in burst),
+        )
+        # Keep the rollup where its burst was in the timeline.
+        Notification.objects.filter(pk=rollup.pk).update(created_at=last["created_at"])
+        if unread and notification_type != Notification.Type.GOOGLE_SYNC:
+            adjust_unread_count(user_id, 1)
+
+
+def rollup_notification_bursts(now=None) -> Dict[str, int]:
+    """
+    Fold bursts of same-type notifications into a single summary row.
+
+    A burst is a run of at least NOTIFICATION_ROLLUP_MIN_SIZE notifications for
+    one user and type, each within NOTIFICATION_ROLLUP_WINDOW_MINUTES of the
+    previous one. Only bursts older than NOTIFICATION_ROLLUP_SETTLE_MINUTES are
+    touched, so a burst still in progress is left alone.
+    """
+    now = now or timezone.now()
+    min_size = getattr(settings, "NOTIFICATION_ROLLUP_MIN_SIZE", 5)
+    window = timedelta(minutes=getattr(settings, "NOTIFICATION_ROLLUP_WINDOW_MINUTES", 10))
+    settle_before = now - timedelta(minutes=getattr(settings, "NOTIFICATION_ROLLUP_SETTLE_MINUTES", 60))
+    types = getattr(settings, "NOTIFICATION_ROLLUP_TYPES", list(ROLLUP_TITLES))
+
+    candidates = _rollup_candidates(settle_before, types)
+    groups = (
+        candidates.values("user_id", "type")
+        .annotate(total=Count("id"))
+        .filter(total__gte=min_size)
+        .order_by()
+    )
+
+    stats = {"rollups": 0, "folded": 0}
+    for group in groups:
+        rows = (
+            candidates.filter(user_id=group["user_id"], type=group["type"])
+            .order_by("created_at", "pk")
+            .values("pk", "created_at", "read_at", "data")
+        )
+        bursts: List[List[dict]] = []
+        burst: List[dict] = []
+        for row in rows.iterator(chunk_size=500):
+            if burst and (
+                row["created_at"] - burst[-1]["created_at"] > window
+                or len(burst) >= MAX_BURST_SIZE
+            ):
+                if len(burst) >= min_size:
+                    bursts.append(burst)
+                burst = []
+            burst.append(row)
+        if len(burst) >= min_size:
+            bursts.append(burst)
+
+        for burst in bursts:
+            _flush_burst(group["user_id"], group["type"], burst)
+            stats["rollups"] += 1
+            stats["folded"] += len(burst)
+
+    return stats
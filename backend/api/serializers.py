@@ -3,7 +3,16 @@ from django.contrib.auth.models import User
 from django.utils import timezone
 from rest_framework import serializers
 
-from .models import Event, EventAttendee, Invitation, Notification, ParsedEmail
+from . import feeds
+from .models import (
+    Event,
+    EventAttendee,
+    EventException,
+    IcsSubscription,
+    Invitation,
+    Notification,
+    ParsedEmail,
+)
 
 class UserSerializer(serializers.ModelSerializer):
     # Register a new user with a hashed password
@@ -76,12 +85,55 @@ class EventAttendeeSerializer(serializers.ModelSerializer):
         )
         read_only_fields = ("id", "is_organizer", "is_self")
 
+
+class EventExceptionSerializer(serializers.ModelSerializer):
+    """A cancelled or changed occurrence; expects the series as ``context["event"]``."""
+
+    class Meta:
+        model = EventException
+        fields = (
+            "id",
+            "original_start",
+            "is_cancelled",
+            "title",
+            "description",
+            "location",
+            "start",
+            "end",
+        )
+        read_only_fields = ("id",)
+        extra_kwargs = {
+            "title": {"required": False, "allow_blank": True},
+            "description": {"required": False, "allow_blank": True},
+            "location": {"required": False, "allow_blank": True},
+            "start": {"required": False, "allow_null": True},
+            "end": {"required": False, "allow_null": True},
+        }
+        # Upserts are keyed on original_start, so the pair check is done by the view.
+        validators = []
+
+    def validate(self, attrs):
+        rule = self.context["event"].occurrence_rule()
+        if rule is None:
+            raise serializers.ValidationError("Only recurring events have occurrences.")
+        if attrs["original_start"] not in rule:
+            raise serializers.ValidationError(
+                {"original_start": "This is not an occurrence of the event."}
+            )
+        start = attrs.get("start")
+        end = attrs.get("end")
+        if start and end and end < start:
+            raise serializers.ValidationError({"end": "End must be >= start."})
+        return attrs
+
+
 class EventSerializer(serializers.ModelSerializer):
     # Expose pilot as ID, but don't allow client to set it
     pilot = serializers.PrimaryKeyRelatedField(read_only=True)
     # Show the pilot's username
     pilot_username = serializers.CharField(source="pilot.username", read_only=True)
     attendees = EventAttendeeSerializer(many=True, required=False)
+    exceptions = EventExceptionSerializer(many=True, read_only=True)
     urgency_color = serializers.SerializerMethodField()
 
     def get_urgency_color(self, obj):
@@ -111,11 +163,13 @@ class EventSerializer(serializers.ModelSerializer):
             "recurrence_count",
             "recurrence_end_date",
             "source",
+            "subscription",
             "pilot",
             "pilot_username",
             "created_at",
             "updated_at",
             "attendees",
+            "exceptions",
             "urgency_color",
         )
 
@@ -124,6 +178,7 @@ class EventSerializer(serializers.ModelSerializer):
             "pilot",
             "pilot_username",
             "source",
+            "subscription",
             "created_at",
             "updated_at",
             "urgency_color",
@@ -262,6 +317,55 @@ class BrightspaceImportSerializer(serializers.Serializer):
     ics_url = serializers.URLField(required=False, allow_blank=True)
 
 
+class IcsSubscriptionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = IcsSubscription
+        fields = (
+            "id",
+            "name",
+            "ics_url",
+            "is_active",
+            "last_imported_at",
+            "last_attempted_at",
+            "last_duration_ms",
+            "last_error",
+            "consecutive_failures",
+            "next_attempt_at",
+            "created_at",
+            "updated_at",
+        )
+        read_only_fields = (
+            "id",
+            "last_imported_at",
+            "last_attempted_at",
+            "last_duration_ms",
+            "last_error",
+            "consecutive_failures",
+            "next_attempt_at",
+            "created_at",
+            "updated_at",
+        )
+
+    def validate_ics_url(self, value):
+        try:
+            return feeds.validate_ics_url(value.strip())
+        except ValueError as exc:
+            raise serializers.ValidationError(str(exc))
+
+    def validate(self, attrs):
+        user = self.context["request"].user
+        existing = IcsSubscription.objects.filter(user=user)
+        if self.instance is not None:
+            existing = existing.exclude(pk=self.instance.pk)
+        ics_url = attrs.get("ics_url")
+        if ics_url and existing.filter(ics_url=ics_url).exists():
+            raise serializers.ValidationError({"ics_url": "You are already subscribed to this calendar."})
+        limit = getattr(settings, "ICS_SUBSCRIPTIONS_MAX_PER_USER", 20)
+        if self.instance is None and existing.count() >= limit:
+            raise serializers.ValidationError(f"You can have at most {limit} calendar subscriptions.")
+        return attrs
+
+
 class NotificationSerializer(serializers.ModelSerializer):
     event = serializers.PrimaryKeyRelatedField(read_only=True)
 
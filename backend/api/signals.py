@@ -0,0 +1,67 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import (
+    SCOPE_BRIGHTSPACE,
+    SCOPE_EVENTS,
+    SCOPE_GOOGLE,
+    SCOPE_NOTIFICATIONS,
+    invalidate_user_cache,
+)
+from .models import (
+    BrightspaceFeed,
+    Event,
+    EventAttendee,
+    EventException,
+    GoogleAccount,
+    Notification,
+)
+from .notifications import adjust_unread_count, counts_as_unread
+
+
+@receiver([post_save, post_delete], sender=GoogleAccount)
+def invalidate_google_cache(sender, instance, **kwargs):
+    invalidate_user_cache(SCOPE_GOOGLE, instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=BrightspaceFeed)
+def invalidate_brightspace_cache(sender, instance, **kwargs):
+    invalidate_user_cache(SCOPE_BRIGHTSPACE, instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=Notification)
+def invalidate_notification_cache(sender, instance, **kwargs):
+    invalidate_user_cache(SCOPE_NOTIFICATIONS, instance.user_id)
+
+
+@receiver(post_delete, sender=Notification)
+def release_unread_notification(sender, instance, **kwargs):
+    if instance.read_at is None and counts_as_unread(instance.type):
+        # Never seed here: the user itself may be mid-deletion.
+        adjust_unread_count(instance.user_id, -1, seed_missing=False)
+
+
+@receiver([post_save, post_delete], sender=Event)
+def invalidate_event_cache(sender, instance, **kwargs):
+    invalidate_user_cache(SCOPE_EVENTS, instance.pilot_id)
+
+
+@receiver([post_save, post_delete], sender=EventException)
+def invalidate_exception_cache(sender, instance, **kwargs):
+    pilot_id = (
+        Event.objects.filter(pk=instance.event_id)
+        .values_list("pilot_id", flat=True)
+        .first()
+    )
+    invalidate_user_cache(SCOPE_EVENTS, pilot_id)
+
+
+@receiver([post_save, post_delete], sender=EventAttendee)
+def invalidate_attendee_cache(sender, instance, **kwargs):
+    pilot_id = (
+        Event.objects.filter(pk=instance.event_id)
+        .values_list("pilot_id", flat=True)
+        .first()
+    )
+    # When the parent event is being deleted its own signal covers the pilot.
+    invalidate_user_cache(SCOPE_EVENTS, pilot_id)
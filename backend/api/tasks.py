@@ -4,6 +4,9 @@ from datetime import timedelta
 from celery import shared_task
 from django.utils import timezone
 
+from .gmail_integration import GmailError
+from .llm import LLMError
+
 logger = logging.getLogger(__name__)
 
 
@@ -59,3 +62,97 @@ def renew_gmail_watches():
       "renewed": renewed_count,
       "failed": failed_count,
   }
+
+
+@shared_task(
+    bind=True,
+    autoretry_for=(GmailError, LLMError),
+    retry_backoff=True,
+    max_retries=3,
+)
+def process_gmail_push(self, account_id: int, history_id: str):
+  """
+  Parse calendar mail for one Gmail push notification.
+
+  Queued by the webhook so Pub/Sub gets its acknowledgement right away.
+  Pushes for an account that is already syncing are folded into that run.
+  """
+  from .gmail_integration import run_gmail_sync
+
+  result = run_gmail_sync(account_id, history_id)
+  if result.get("requeue"):
+      process_gmail_push.delay(account_id, result["requeue"])
+  logger.info(f"Gmail push for account {account_id} up to {history_id}: {result}")
+  return result
+
+
+@shared_task
+def reconcile_notification_counters():
+  """
+  Repair drift between NotificationCounter rows and the notifications table.
+
+  A grouped count finds candidate users cheaply; each mismatch is then
+  recounted under a row lock so concurrent writes are not clobbered.
+  """
+  from django.db.models import Count
+
+  from .models import Notification, NotificationCounter
+  from .notifications import reconcile_unread_count
+
+  actual = dict(
+      Notification.objects.filter(read_at__isnull=True)
+      .exclude(type=Notification.Type.GOOGLE_SYNC)
+      .values("user_id")
+      .annotate(unread=Count("id"))
+      .values_list("user_id", "unread")
+  )
+  stored = dict(NotificationCounter.objects.values_list("user_id", "unread_count"))
+
+  repaired = 0
+  for user_id in set(actual) | set(stored):
+      if actual.get(user_id, 0) == stored.get(user_id):
+          continue
+      before = stored.get(user_id)
+      after = reconcile_unread_count(user_id)
+      if before != after:
+          repaired += 1
+
+  logger.info(f"Notification counter reconciliation complete: {repaired} repaired")
+  return {"checked": len(set(actual) | set(stored)), "repaired": repaired}
+
+
+@shared_task
+def apply_notification_retention():
+  """
+  Roll up notification bursts, then prune rows past their type's TTL.
+
+  Should be run daily via Celery beat scheduler.
+  """
+  from .retention import prune_expired_notifications, rollup_notification_bursts
+
+  rollup_stats = rollup_notification_bursts()
+  deleted = prune_expired_notifications()
+  logger.info(
+      f"Notification retention complete: {rollup_stats['rollups']} rollups "
+      f"({rollup_stats['folded']} folded), {sum(deleted.values())} pruned"
+  )
+  return {**rollup_stats, "deleted": deleted}
+
+
+@shared_task
+def refresh_ics_feeds():
+  """
+  Re-import every Brightspace feed and calendar subscription that is due.
+
+  Should be run every 15 minutes via Celery beat scheduler. Each feed is
+  refreshed at most every BRIGHTSPACE_REFRESH_INTERVAL_MINUTES, with
+  exponential backoff after failures.
+  """
+  from .feeds import refresh_due_feeds
+
+  stats = refresh_due_feeds()
+  logger.info(
+      f"Feed refresh complete: {stats['imported']} imported, "
+      f"{stats['not_modified']} unchanged, {stats['failed']} failed, {stats['deferred']} deferred"
+  )
+  return stats
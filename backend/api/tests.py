@@ -1,20 +1,128 @@
+import base64
+import json
+import threading
 import uuid
-from datetime import timedelta
-from unittest.mock import patch
+from datetime import datetime, timedelta, timezone as dt_timezone
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
 
+import groq
+import httpx
+import requests
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.core import mail
-from django.test import override_settings
+from django.core.cache import cache
+from django.db import IntegrityError, connection
+from django.test import AsyncClient, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APITestCase
+from googleapiclient.errors import HttpError
 
-from .models import BrightspaceFeed, Event, EventAttendee, GoogleAccount, Invitation, Notification
+from .feeds import (
+    FeedFetchError,
+    HostThrottle,
+    PinnedAddressAdapter,
+    _dns_cache,
+    apply_download,
+    claim_feeds,
+    download_ics,
+    due_feeds,
+    get_session,
+    http_pool_stats,
+    sync_events,
+    validate_ics_url,
+    validate_ics_urls,
+)
+from . import llm
+from .db import chunked
+from .email_parser import (
+    parse_cache_key,
+    parse_calendar_invite,
+    parse_cache_stats,
+    parse_email_to_event,
+    parse_emails_to_events,
+    prepare_email_text,
+)
+from .gmail_integration import (
+    GmailError,
+    calendar_categories,
+    calendar_score,
+    fetch_messages,
+    is_calendar_related,
+    message_details,
+    run_gmail_sync,
+    store_parsed_email,
+    sync_gmail_history,
+)
+from .google_calendar import _event_body_for_google, pull_events_from_google
+from .ics import spool_feed
+from .models import (
+    BrightspaceFeed,
+    Event,
+    EventAttendee,
+    EventException,
+    GoogleAccount,
+    IcsSubscription,
+    Invitation,
+    Notification,
+    NotificationCounter,
+    ParsedEmail,
+)
+from .notifications import create_notification, notification_buffer
+from .retention import prune_expired_notifications, rollup_notification_bursts
+from .tasks import reconcile_notification_counters, refresh_ics_feeds
+
+SAMPLE_ICS = b"""BEGIN:VCALENDAR
+VERSION:2.0
+PRODID:-//Brightspace//EN
+BEGIN:VEVENT
+UID:assignment-1@brightspace
+DTSTART:20300110T150000Z
+DTEND:20300110T160000Z
+SUMMARY:Lab report due
+DESCRIPTION:Submit via https://lms.example.com/x
+END:VEVENT
+BEGIN:VEVENT
+UID:assignment-2@brightspace
+DTSTART;VALUE=DATE:20300112
+SUMMARY:Reading week
+END:VEVENT
+BEGIN:VEVENT
+SUMMARY:Missing uid
+DTSTART:20300113T150000Z
+END:VEVENT
+END:VCALENDAR
+"""
+
+RECURRING_ICS = b"""BEGIN:VCALENDAR
+VERSION:2.0
+PRODID:-//Brightspace//EN
+BEGIN:VEVENT
+UID:lecture@brightspace
+DTSTART:20300107T150000Z
+DTEND:20300107T160000Z
+SUMMARY:Lecture
+RRULE:FREQ=WEEKLY;COUNT=6
+EXDATE:20300114T150000Z
+END:VEVENT
+BEGIN:VEVENT
+UID:lecture@brightspace
+RECURRENCE-ID:20300121T150000Z
+DTSTART:20300122T170000Z
+DTEND:20300122T180000Z
+SUMMARY:Lecture (room change)
+END:VEVENT
+END:VCALENDAR
+"""
 
 
 class EventAPITests(APITestCase):
     def setUp(self):
+        cache.clear()
         self.user = User.objects.create_user("alice", password="password123")
         self.other_user = User.objects.create_user("bob", password="password123")
         now = timezone.now()
@@ -220,6 +328,169 @@ class EventRSVPTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
 
+class RecurrenceExceptionTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("planner", password="password123")
+        self.client.force_authenticate(user=self.user)
+        self.series = Event.objects.create(
+            pilot=self.user,
+            title="Standup",
+            start=datetime(2030, 1, 7, 15, 0, tzinfo=dt_timezone.utc),
+            end=datetime(2030, 1, 7, 15, 30, tzinfo=dt_timezone.utc),
+            recurrence_frequency=Event.RecurrenceFrequency.WEEKLY,
+            recurrence_count=4,
+        )
+        self.url = reverse("event-occurrence", args=[self.series.pk])
+
+    def occurrences(self):
+        # The occurrence window is capped a year ahead of now.
+        with patch("api.views.timezone.now", return_value=datetime(2030, 1, 1, tzinfo=dt_timezone.utc)):
+            return self.client.get(
+                reverse("event-occurrences"),
+                {"start": "2030-01-01T00:00:00Z", "end": "2030-03-01T00:00:00Z"},
+            ).data
+
+    def test_single_occurrence_can_be_changed_cancelled_and_restored(self):
+        response = self.client.post(
+            self.url,
+            {"original_start": "2030-01-14T15:00:00Z", "title": "Standup (demo)"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.client.post(
+            self.url,
+            {"original_start": "2030-01-21T15:00:00Z", "is_cancelled": True},
+            format="json",
+        )
+        titles = [item["title"] for item in self.occurrences()]
+        self.assertEqual(titles, ["Standup", "Standup (demo)", "Standup"])
+        self.assertEqual(Event.objects.filter(pilot=self.user).count(), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(f"{self.url}?original_start=2030-01-21T15:00:00Z")
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(len(self.occurrences()), 4)
+
+    def test_rejects_start_that_is_not_an_occurrence(self):
+        response = self.client.post(
+            self.url,
+            {"original_start": "2030-01-15T15:00:00Z", "is_cancelled": True},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_google_body_carries_cancelled_occurrences(self):
+        EventException.objects.create(
+            event=self.series,
+            original_start=datetime(2030, 1, 14, 15, 0, tzinfo=dt_timezone.utc),
+            is_cancelled=True,
+        )
+        body = _event_body_for_google(self.series)
+        self.assertEqual(body["recurrence"], ["RRULE:FREQ=WEEKLY;INTERVAL=1;COUNT=4", "EXDATE:20300114T150000Z"])
+
+    def test_pull_stores_series_once_with_its_exceptions(self):
+        account = GoogleAccount.objects.create(
+            user=self.user,
+            google_user_id="gid",
+            email="planner@example.com",
+            access_token="token",
+            refresh_token="refresh",
+            token_expiry=timezone.now() + timedelta(hours=1),
+            scopes="openid",
+        )
+        series = {
+            "id": "weekly1",
+            "iCalUID": "weekly1@google.com",
+            "summary": "Team sync",
+            "start": {"dateTime": "2030-01-07T10:00:00-05:00", "timeZone": "America/New_York"},
+            "end": {"dateTime": "2030-01-07T11:00:00-05:00", "timeZone": "America/New_York"},
+            "recurrence": ["RRULE:FREQ=WEEKLY;BYDAY=MO", "EXDATE;TZID=America/New_York:20300114T100000"],
+        }
+        moved = {
+            "id": "weekly1_20300121T150000Z",
+            "iCalUID": "weekly1@google.com",
+            "recurringEventId": "weekly1",
+            "originalStartTime": {"dateTime": "2030-01-21T10:00:00-05:00"},
+            "summary": "Team sync (moved)",
+            "start": {"dateTime": "2030-01-22T10:00:00-05:00"},
+            "end": {"dateTime": "2030-01-22T11:00:00-05:00"},
+        }
+        service = MagicMock()
+        # The changed instance is listed before its series.
+        service.events.return_value.list.return_value.execute.return_value = {
+            "items": [moved, series],
+            "nextSyncToken": "sync-1",
+        }
+        Event.objects.all().delete()
+        with patch("api.google_calendar.build_service", return_value=service):
+            stats = pull_events_from_google(account)
+
+        self.assertFalse(service.events.return_value.list.call_args.kwargs["singleEvents"])
+        self.assertEqual(stats["created"], 1)
+        self.assertEqual(stats["exceptions"], 1)
+        event = Event.objects.get(pilot=self.user)
+        self.assertEqual(event.recurrence_frequency, Event.RecurrenceFrequency.WEEKLY)
+        self.assertEqual(
+            list(event.exceptions.values_list("is_cancelled", "title")),
+            [(True, ""), (False, "Team sync (moved)")],
+        )
+
+
+    def test_pull_expands_series_whose_rule_cannot_be_stored(self):
+        account = GoogleAccount.objects.create(
+            user=self.user,
+            google_user_id="gid",
+            email="planner@example.com",
+            access_token="token",
+            refresh_token="refresh",
+            token_expiry=timezone.now() + timedelta(hours=1),
+            scopes="openid",
+        )
+        series = {
+            "id": "mwf1",
+            "iCalUID": "mwf1@google.com",
+            "summary": "Lab",
+            "start": {"dateTime": "2030-01-07T10:00:00-05:00", "timeZone": "America/New_York"},
+            "end": {"dateTime": "2030-01-07T11:00:00-05:00", "timeZone": "America/New_York"},
+            "recurrence": ["RRULE:FREQ=WEEKLY;BYDAY=MO,WE,FR"],
+        }
+        instances = [
+            {
+                "id": f"mwf1_203001{day:02d}T150000Z",
+                "iCalUID": "mwf1@google.com",
+                "recurringEventId": "mwf1",
+                "originalStartTime": {"dateTime": f"2030-01-{day:02d}T10:00:00-05:00"},
+                "summary": "Lab",
+                "start": {"dateTime": f"2030-01-{day:02d}T10:00:00-05:00"},
+                "end": {"dateTime": f"2030-01-{day:02d}T11:00:00-05:00"},
+            }
+            for day in (7, 9, 11)
+        ]
+        service = MagicMock()
+        service.events.return_value.list.return_value.execute.return_value = {
+            "items": [series],
+            "nextSyncToken": "sync-1",
+        }
+        service.events.return_value.instances.return_value.execute.return_value = {"items": instances}
+        Event.objects.all().delete()
+        with patch("api.google_calendar.build_service", return_value=service):
+            stats = pull_events_from_google(account)
+
+        self.assertEqual(stats["created"], 3)
+        self.assertEqual(
+            sorted(Event.objects.filter(pilot=self.user).values_list("google_event_id", flat=True)),
+            [item["id"] for item in instances],
+        )
+        self.assertFalse(Event.objects.exclude(google_ical_uid="").exists())
+
+        # A second pull finds the same rows again instead of duplicating them.
+        with patch("api.google_calendar.build_service", return_value=service):
+            stats = pull_events_from_google(account)
+        self.assertEqual(stats["updated"], 3)
+        self.assertEqual(Event.objects.filter(pilot=self.user).count(), 3)
+
+
 class InvitationAPITests(APITestCase):
     def setUp(self):
         self.inviter = User.objects.create_user("inviter", password="password123")
@@ -317,3 +588,1085 @@ class InvitationRegistrationTests(APITestCase):
         response = self.client.post(self.register_url, payload, format="json")
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertIn("email", response.data)
+
+
+class BrightspaceImportTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("student", password="password123")
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse("calendar-brightspace-import")
+
+    def import_feed(self, payload=SAMPLE_ICS, chunk_size=65536, etag='"v1"'):
+        chunks = [payload[i:i + chunk_size] for i in range(0, len(payload), chunk_size)]
+        with patch("api.feeds.validate_ics_url", side_effect=lambda url: url), \
+                patch("api.feeds.download_ics", return_value=spool_feed(chunks, etag=etag)):
+            return self.client.post(self.url, {"ics_url": "https://lms.example.com/feed.ics"}, format="json")
+
+    def test_import_creates_events_and_skips_invalid_components(self):
+        response = self.import_feed()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["created"], 2)
+        self.assertEqual(response.data["skipped"], 1)
+        event = Event.objects.get(pilot=self.user, google_ical_uid="assignment-1@brightspace")
+        self.assertEqual(event.source, Event.Source.BRIGHTSPACE)
+        self.assertNotIn("https://", event.description)
+        self.assertTrue(Event.objects.get(google_ical_uid="assignment-2@brightspace").all_day)
+
+    def test_reimport_only_updates_changed_events(self):
+        self.import_feed()
+        response = self.import_feed(SAMPLE_ICS.replace(b"Lab report due", b"Lab report moved"))
+        self.assertEqual(response.data["created"], 0)
+        self.assertEqual(response.data["updated"], 1)
+        self.assertEqual(response.data["unchanged"], 1)
+        self.assertEqual(Event.objects.get(google_ical_uid="assignment-1@brightspace").title, "Lab report moved")
+        self.assertEqual(Event.objects.filter(pilot=self.user).count(), 2)
+
+    def test_reimport_removes_events_dropped_from_feed(self):
+        self.import_feed()
+        local = Event.objects.create(
+            pilot=self.user,
+            title="Own mission",
+            start=timezone.now(),
+            end=timezone.now() + timedelta(hours=1),
+        )
+        trimmed = SAMPLE_ICS.replace(b"UID:assignment-2@brightspace\n", b"")
+        response = self.import_feed(trimmed)
+        self.assertEqual(response.data["removed"], 1)
+        self.assertEqual(
+            set(Event.objects.filter(pilot=self.user).values_list("pk", flat=True)),
+            {Event.objects.get(google_ical_uid="assignment-1@brightspace").pk, local.pk},
+        )
+
+    def test_identical_feed_is_not_parsed_again(self):
+        self.import_feed()
+        feed = BrightspaceFeed.objects.get(user=self.user)
+        self.assertEqual(feed.etag, '"v1"')
+        self.assertEqual(len(feed.content_hash), 64)
+        with patch("api.feeds.sync_events") as sync:
+            response = self.import_feed(etag='"v2"')
+        sync.assert_not_called()
+        self.assertTrue(response.data["not_modified"])
+        # The server's new validator is kept even though the body matched.
+        feed.refresh_from_db()
+        self.assertEqual(feed.etag, '"v2"')
+
+    def test_download_sends_validators_and_handles_not_modified(self):
+        response = MagicMock(status_code=304, is_redirect=False, headers={})
+        response.__enter__.return_value = response
+        with patch("api.feeds.requests.Session.get", return_value=response) as get:
+            download = download_ics(
+                "https://lms.example.com/feed.ics",
+                etag='"v1"',
+                last_modified="Tue, 01 Jan 2030 00:00:00 GMT",
+            )
+        self.assertTrue(download.not_modified)
+        headers = get.call_args.kwargs["headers"]
+        self.assertEqual(headers["If-None-Match"], '"v1"')
+        self.assertEqual(headers["If-Modified-Since"], "Tue, 01 Jan 2030 00:00:00 GMT")
+
+    def test_sync_writes_in_bulk(self):
+        rows = {
+            f"item-{i}@brightspace": {
+                "title": f"Item {i}",
+                "start": timezone.now(),
+                "end": timezone.now() + timedelta(hours=1),
+                "source": Event.Source.BRIGHTSPACE,
+            }
+            for i in range(500)
+        }
+        with CaptureQueriesContext(connection) as queries:
+            counts = sync_events(BrightspaceFeed(user=self.user), rows)
+        self.assertEqual(counts["created"], 500)
+        # SQLite caps bound parameters per statement, so inserts still batch.
+        self.assertLess(len(queries), 20)
+
+    def test_import_parses_feed_split_across_small_chunks(self):
+        payload = SAMPLE_ICS.replace(b"SUMMARY:Lab report due", b"SUMMARY:Lab report\r\n  due")
+        response = self.import_feed(payload, chunk_size=7)
+        self.assertEqual(response.data["created"], 2)
+        self.assertEqual(Event.objects.get(google_ical_uid="assignment-1@brightspace").title, "Lab report due")
+
+    def test_import_attaches_vtimezone_to_events(self):
+        payload = b"""BEGIN:VCALENDAR
+VERSION:2.0
+BEGIN:VTIMEZONE
+TZID:Campus Time
+BEGIN:STANDARD
+DTSTART:19701101T020000
+TZOFFSETFROM:-0400
+TZOFFSETTO:-0500
+END:STANDARD
+END:VTIMEZONE
+BEGIN:VEVENT
+UID:quiz@brightspace
+DTSTART;TZID=Campus Time:20300110T090000
+SUMMARY:Quiz
+END:VEVENT
+END:VCALENDAR
+"""
+        self.import_feed(payload)
+        event = Event.objects.get(google_ical_uid="quiz@brightspace")
+        self.assertEqual(event.start, datetime(2030, 1, 10, 14, 0, tzinfo=dt_timezone.utc))
+
+    def test_import_rejects_non_calendar_payload(self):
+        response = self.import_feed(b"<html>Sign in</html>")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(BRIGHTSPACE_MAX_ICS_BYTES=64)
+    def test_import_rejects_oversized_event(self):
+        response = self.import_feed()
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_import_stores_recurring_series_with_exceptions(self):
+        payload = RECURRING_ICS
+        response = self.import_feed(payload)
+        self.assertEqual(response.data["created"], 1)
+        series = Event.objects.get(google_ical_uid="lecture@brightspace")
+        self.assertEqual(series.recurrence_frequency, Event.RecurrenceFrequency.WEEKLY)
+        self.assertEqual(series.recurrence_count, 6)
+        self.assertEqual(series.exceptions.count(), 2)
+
+        cache.clear()
+        # The occurrence window is capped a year ahead of now.
+        with patch("api.views.timezone.now", return_value=datetime(2030, 1, 1, tzinfo=dt_timezone.utc)):
+            response = self.client.get(
+                reverse("event-occurrences"),
+                {"start": "2030-01-01T00:00:00Z", "end": "2030-03-01T00:00:00Z"},
+            )
+        self.assertEqual(len(response.data), 5)
+        moved = next(item for item in response.data if item["title"] == "Lecture (room change)")
+        self.assertEqual(moved["start"], "2030-01-22T17:00:00Z")
+        self.assertEqual(moved["occurrence_id"], f"{series.pk}:2030-01-21T15:00:00+00:00")
+        self.assertNotIn("2030-01-14T15:00:00Z", [item["start"] for item in response.data])
+
+        response = self.import_feed(payload.replace(b"EXDATE:20300114T150000Z\n", b""))
+        self.assertEqual(response.data["updated"], 1)
+        self.assertEqual(series.exceptions.count(), 1)
+
+    def test_import_splits_multi_day_weekly_rule(self):
+        payload = RECURRING_ICS.replace(
+            b"RRULE:FREQ=WEEKLY;COUNT=6",
+            b"RRULE:FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,TH;UNTIL=20300301T000000Z",
+        )
+        self.import_feed(payload)
+        monday = Event.objects.get(google_ical_uid="lecture@brightspace#MO")
+        thursday = Event.objects.get(google_ical_uid="lecture@brightspace#TH")
+        self.assertEqual(monday.start, datetime(2030, 1, 7, 15, 0, tzinfo=dt_timezone.utc))
+        self.assertEqual(thursday.start, datetime(2030, 1, 10, 15, 0, tzinfo=dt_timezone.utc))
+        self.assertEqual(thursday.recurrence_interval, 2)
+        self.assertEqual(str(thursday.recurrence_end_date), "2030-02-28")
+        # The Monday EXDATE and override stay with the Monday series.
+        self.assertEqual(monday.exceptions.count(), 2)
+        self.assertFalse(thursday.exceptions.exists())
+
+    def test_import_keeps_first_occurrence_of_unsupported_rule(self):
+        payload = RECURRING_ICS.replace(b"FREQ=WEEKLY;COUNT=6", b"FREQ=MONTHLY;BYDAY=1MO")
+        self.import_feed(payload)
+        event = Event.objects.get(google_ical_uid="lecture@brightspace")
+        self.assertEqual(event.recurrence_frequency, Event.RecurrenceFrequency.NONE)
+        # With no series to attach to, the override becomes its own event.
+        self.assertTrue(
+            Event.objects.filter(google_ical_uid__startswith="lecture@brightspace#2030-01-21").exists()
+        )
+
+
+class IcsSubscriptionTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("subscriber", password="password123")
+        self.client.force_authenticate(user=self.user)
+        self.list_url = reverse("ics-subscription-list")
+
+    def subscribe(self, url="https://calendars.example.com/holidays.ics", name="Holidays"):
+        with patch("api.feeds.validate_ics_url", side_effect=lambda value: value):
+            return self.client.post(self.list_url, {"name": name, "ics_url": url}, format="json")
+
+    def refresh(self, subscription_id, payload=SAMPLE_ICS):
+        url = reverse("ics-subscription-refresh", args=[subscription_id])
+        with patch("api.feeds.validate_ics_url", side_effect=lambda value: value), \
+                patch("api.feeds.download_ics", return_value=spool_feed([payload])):
+            return self.client.post(url, format="json")
+
+    def test_subscriptions_import_independently(self):
+        first = self.subscribe().data["id"]
+        second = self.subscribe("https://team.example.com/team.ics", "Team").data["id"]
+        self.assertEqual(self.refresh(first).data["created"], 2)
+        # Same UIDs in another feed must not collide.
+        self.assertEqual(self.refresh(second).data["created"], 2)
+        self.assertEqual(Event.objects.filter(subscription_id=first).count(), 2)
+        self.assertEqual(
+            Event.objects.get(subscription_id=second, google_ical_uid="assignment-1@brightspace").source,
+            Event.Source.SUBSCRIPTION,
+        )
+        self.assertEqual(Notification.objects.filter(type=Notification.Type.SUBSCRIPTION_IMPORT).count(), 2)
+
+    def test_deleting_subscription_drops_its_events(self):
+        subscription_id = self.subscribe().data["id"]
+        self.refresh(subscription_id)
+        response = self.client.delete(reverse("ics-subscription-detail", args=[subscription_id]))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(Event.objects.filter(pilot=self.user).exists())
+
+    def test_duplicate_subscription_is_rejected(self):
+        self.subscribe()
+        response = self.subscribe()
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("ics_url", response.data)
+
+    def test_changing_url_resets_fetch_state(self):
+        subscription_id = self.subscribe().data["id"]
+        self.refresh(subscription_id)
+        with patch("api.feeds.validate_ics_url", side_effect=lambda value: value):
+            self.client.patch(
+                reverse("ics-subscription-detail", args=[subscription_id]),
+                {"ics_url": "https://calendars.example.com/other.ics"},
+                format="json",
+            )
+        self.assertEqual(IcsSubscription.objects.get(pk=subscription_id).content_hash, "")
+
+
+class BrightspaceRefreshTests(TestCase):
+    def setUp(self):
+        self.ok_feed = BrightspaceFeed.objects.create(
+            user=User.objects.create_user("fresh", password="password123"),
+            ics_url="https://lms.example.com/ok.ics",
+        )
+        self.failing_feed = BrightspaceFeed.objects.create(
+            user=User.objects.create_user("stale", password="password123"),
+            ics_url="https://other.example.com/down.ics",
+        )
+        self.subscription = IcsSubscription.objects.create(
+            user=self.ok_feed.user,
+            name="Team",
+            ics_url="https://lms.example.com/team.ics",
+        )
+
+    def fake_download(self, url, etag="", last_modified=""):
+        if "down" in url:
+            raise FeedFetchError("ICS host answered 503.", retryable=True)
+        return spool_feed([SAMPLE_ICS])
+
+    def run_refresh(self):
+        with patch("api.feeds.validate_ics_url", side_effect=lambda url: url), \
+                patch("api.feeds.download_ics", side_effect=self.fake_download):
+            return refresh_ics_feeds()
+
+    def test_refresh_imports_due_feeds_and_records_stats(self):
+        stats = self.run_refresh()
+        self.assertEqual(stats["imported"], 2)
+        self.assertEqual(stats["failed"], 1)
+        self.assertEqual(Event.objects.filter(pilot=self.ok_feed.user).count(), 4)
+        self.assertEqual(self.subscription.events.count(), 2)
+
+        self.ok_feed.refresh_from_db()
+        self.assertEqual(self.ok_feed.consecutive_failures, 0)
+        self.assertIsNotNone(self.ok_feed.last_duration_ms)
+        self.assertGreater(self.ok_feed.next_attempt_at, timezone.now() + timedelta(minutes=55))
+
+        self.failing_feed.refresh_from_db()
+        self.assertEqual(self.failing_feed.consecutive_failures, 1)
+        self.assertIn("503", self.failing_feed.last_error)
+        self.assertLess(self.failing_feed.next_attempt_at, timezone.now() + timedelta(minutes=16))
+
+    def test_feeds_are_not_refreshed_before_they_are_due(self):
+        self.run_refresh()
+        self.assertEqual(self.run_refresh()["feeds"], 0)
+
+    def test_overlapping_run_skips_feeds_already_claimed(self):
+        self.assertEqual(len(claim_feeds(due_feeds())), 3)
+        self.assertEqual(due_feeds(), [])
+        # A second run that read the feeds before the claim loses the race.
+        self.assertEqual(claim_feeds([self.failing_feed]), [])
+
+    def test_database_error_fails_one_feed_and_the_rest_are_applied(self):
+        apply = apply_download
+
+        def apply_or_fail(feed, download, ics_url):
+            if isinstance(feed, IcsSubscription):
+                download.close()
+                raise IntegrityError("UNIQUE constraint failed")
+            return apply(feed, download, ics_url)
+
+        with patch("api.feeds.apply_download", side_effect=apply_or_fail):
+            stats = self.run_refresh()
+        self.assertEqual(stats["imported"], 1)
+        self.assertEqual(stats["failed"], 2)
+        self.assertEqual(Event.objects.filter(pilot=self.ok_feed.user).count(), 2)
+        self.subscription.refresh_from_db()
+        self.assertEqual(self.subscription.consecutive_failures, 1)
+        self.assertIn("UNIQUE", self.subscription.last_error)
+
+    @override_settings(BRIGHTSPACE_REFRESH_HOST_FAILURE_LIMIT=2, BRIGHTSPACE_REFRESH_HOST_INTERVAL_SECONDS=0)
+    def test_host_throttle_blocks_host_after_repeated_failures(self):
+        throttle = HostThrottle()
+        error = FeedFetchError("down", retryable=True)
+        throttle.record("lms.example.com", error)
+        self.assertFalse(throttle.blocked("lms.example.com"))
+        throttle.record("lms.example.com", error)
+        self.assertTrue(throttle.blocked("lms.example.com"))
+        self.assertFalse(throttle.blocked("other.example.com"))
+
+
+def fake_addrinfo(*addresses):
+    return [(2, 1, 6, "", (address, 443)) for address in addresses]
+
+
+class IcsUrlValidationTests(TestCase):
+    def setUp(self):
+        _dns_cache.clear()
+
+    def test_validated_host_is_resolved_once(self):
+        with patch("api.feeds.socket.getaddrinfo", return_value=fake_addrinfo("93.184.216.34")) as lookup:
+            validate_ics_url("https://lms.example.com/a.ics")
+            validate_ics_url("https://LMS.example.com/b.ics")
+        self.assertEqual(lookup.call_count, 1)
+
+    def test_private_address_is_rejected(self):
+        with patch("api.feeds.socket.getaddrinfo", return_value=fake_addrinfo("93.184.216.34", "10.0.0.5")):
+            with self.assertRaisesMessage(ValueError, "non-public"):
+                validate_ics_url("https://rebind.example.com/feed.ics")
+
+    def test_batch_validation_reports_each_url(self):
+        def lookup(hostname, *args, **kwargs):
+            return fake_addrinfo("127.0.0.1" if hostname == "internal.example.com" else "93.184.216.34")
+
+        urls = ["https://lms.example.com/a.ics", "https://lms.example.com/b.ics", "https://internal.example.com/c.ics"]
+        with patch("api.feeds.socket.getaddrinfo", side_effect=lookup) as resolver:
+            results = validate_ics_urls(urls)
+        self.assertEqual(results[urls[0]], urls[0])
+        self.assertEqual(results[urls[1]], urls[1])
+        self.assertIsInstance(results[urls[2]], ValueError)
+        self.assertEqual(resolver.call_count, 2)
+
+    def test_adapter_pins_connection_to_validated_address(self):
+        session = requests.Session()
+        request = session.prepare_request(requests.Request("GET", "https://lms.example.com/feed.ics"))
+        with patch("api.feeds.socket.getaddrinfo", return_value=fake_addrinfo("93.184.216.34")):
+            host_params, pool_kwargs = PinnedAddressAdapter().build_connection_pool_key_attributes(request, True)
+        self.assertEqual(host_params["host"], "93.184.216.34")
+        self.assertEqual(pool_kwargs["server_hostname"], "lms.example.com")
+        self.assertEqual(pool_kwargs["assert_hostname"], "lms.example.com")
+
+
+class PooledSessionTests(TestCase):
+    def test_threads_get_own_sessions_on_one_adapter(self):
+        sessions = []
+        worker = threading.Thread(target=lambda: sessions.append(get_session()))
+        worker.start()
+        worker.join()
+        main = get_session()
+        self.assertIs(main, get_session())
+        self.assertIsNot(main, sessions[0])
+        self.assertIs(main.get_adapter("https://lms.example.com"), sessions[0].get_adapter("https://lms.example.com"))
+
+    def test_pool_stats_report_connection_reuse(self):
+        adapter = get_session().get_adapter("https://lms.example.com")
+        adapter.poolmanager.clear()
+        pool = adapter.poolmanager.connection_from_host("lms.example.com", 443, "https")
+        pool.num_connections, pool.num_requests = 1, 4
+        stats = http_pool_stats()
+        self.assertEqual(stats["connections"], 1)
+        self.assertEqual(stats["reused"], 3)
+
+
+class SQLiteTuningTests(TestCase):
+    def test_connection_init_applies_pragmas(self):
+        if connection.vendor != "sqlite":
+            self.skipTest("SQLite-only pragmas")
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertEqual(cursor.fetchone()[0], settings.SQLITE_BUSY_TIMEOUT_MS)
+            cursor.execute("PRAGMA synchronous")
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+
+    def test_chunked_splits_into_bounded_batches(self):
+        self.assertEqual(list(chunked(range(5), 2)), [[0, 1], [2, 3], [4]])
+        self.assertEqual(list(chunked([], 2)), [])
+
+
+class ReadCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("cached", password="password123")
+        self.client.force_authenticate(user=self.user)
+
+    def test_google_status_is_served_from_cache(self):
+        url = reverse("google-status")
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.data, {"connected": False})
+
+    def test_model_change_invalidates_cached_status(self):
+        url = reverse("google-status")
+        self.assertFalse(self.client.get(url).data["connected"])
+        with self.captureOnCommitCallbacks(execute=True):
+            GoogleAccount.objects.create(
+                user=self.user,
+                google_user_id="gid",
+                email="cached@example.com",
+                access_token="token",
+                refresh_token="refresh",
+                scopes="openid",
+            )
+        response = self.client.get(url)
+        self.assertTrue(response.data["connected"])
+        self.assertEqual(response.data["email"], "cached@example.com")
+
+    def test_mark_read_invalidates_unread_count(self):
+        Notification.objects.create(user=self.user, type=Notification.Type.EVENT_CREATED, title="Test")
+        url = reverse("notifications")
+        self.assertEqual(self.client.get(url).data["unread_count"], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(url, {"all": True}, format="json")
+        self.assertEqual(self.client.get(url).data["unread_count"], 0)
+
+
+@override_settings(NOTIFICATION_STREAM_ENABLED=True)
+class NotificationStreamTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("streamer", password="password123")
+
+    def test_create_notification_publishes_after_commit(self):
+        with patch("api.realtime.publish_to_user") as mock_publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                notification = create_notification(
+                    user=self.user,
+                    type=Notification.Type.EVENT_CREATED,
+                    title="Pushed",
+                )
+        mock_publish.assert_called_once()
+        user_id, event_name, payload = mock_publish.call_args.args
+        self.assertEqual((user_id, event_name), (self.user.pk, "notification"))
+        self.assertEqual(payload["id"], notification.pk)
+
+    def test_google_sync_notifications_are_not_pushed(self):
+        with patch("api.realtime.publish_to_user") as mock_publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                create_notification(user=self.user, type=Notification.Type.GOOGLE_SYNC, title="Sync")
+        mock_publish.assert_not_called()
+
+    async def test_stream_rejects_invalid_token(self):
+        response = await AsyncClient().get(reverse("notifications-stream"), {"token": "bogus"})
+        self.assertEqual(response.status_code, 401)
+
+    def test_stream_unavailable_under_wsgi(self):
+        response = self.client.get(reverse("notifications-stream"))
+        self.assertEqual(response.status_code, 503)
+
+
+class NotificationCounterTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("counted", password="password123")
+        self.client.force_authenticate(user=self.user)
+
+    def stored_count(self):
+        return NotificationCounter.objects.get(user=self.user).unread_count
+
+    def test_counter_tracks_create_and_mark_read(self):
+        first = create_notification(user=self.user, type=Notification.Type.EVENT_CREATED, title="One")
+        create_notification(user=self.user, type=Notification.Type.EVENT_UPDATED, title="Two")
+        create_notification(user=self.user, type=Notification.Type.GOOGLE_SYNC, title="Hidden")
+        self.assertEqual(self.stored_count(), 2)
+
+        self.client.post(reverse("notifications"), {"ids": [first.pk]}, format="json")
+        self.assertEqual(self.stored_count(), 1)
+
+        response = self.client.post(reverse("notifications"), {"all": True}, format="json")
+        self.assertEqual(response.data["updated"], 2)
+        self.assertEqual(self.stored_count(), 0)
+
+    def test_deleting_unread_notification_releases_count(self):
+        notification = create_notification(user=self.user, type=Notification.Type.EVENT_CREATED, title="One")
+        notification.delete()
+        self.assertEqual(self.stored_count(), 0)
+
+    def test_reconcile_repairs_drift(self):
+        create_notification(user=self.user, type=Notification.Type.EVENT_CREATED, title="One")
+        NotificationCounter.objects.filter(user=self.user).update(unread_count=7)
+        result = reconcile_notification_counters()
+        self.assertEqual(result["repaired"], 1)
+        self.assertEqual(self.stored_count(), 1)
+
+
+class NotificationRetentionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("retained", password="password123")
+
+    def backdate(self, notification, **delta):
+        Notification.objects.filter(pk=notification.pk).update(created_at=timezone.now() - timedelta(**delta))
+
+    @override_settings(NOTIFICATION_RETENTION_DAYS={"google_sync": 1, "event_created": 90})
+    def test_prune_deletes_rows_past_type_ttl(self):
+        stale_sync = create_notification(user=self.user, type=Notification.Type.GOOGLE_SYNC, title="Sync")
+        recent = create_notification(user=self.user, type=Notification.Type.EVENT_CREATED, title="Recent")
+        stale = create_notification(user=self.user, type=Notification.Type.EVENT_CREATED, title="Old")
+        self.backdate(stale_sync, days=2)
+        self.backdate(recent, days=2)
+        self.backdate(stale, days=91)
+
+        deleted = prune_expired_notifications()
+
+        self.assertEqual(deleted, {"google_sync": 1, "event_created": 1})
+        self.assertEqual(list(Notification.objects.values_list("pk", flat=True)), [recent.pk])
+        self.assertEqual(NotificationCounter.objects.get(user=self.user).unread_count, 1)
+
+    @override_settings(NOTIFICATION_ROLLUP_MIN_SIZE=3)
+    def test_rollup_folds_burst_into_single_row(self):
+        for index in range(4):
+            notification = create_notification(
+                user=self.user,
+                type=Notification.Type.EVENT_UPDATED,
+                title=f"Mission updated {index}",
+                data={"event_id": index + 1, "action": "updated"},
+            )
+            self.backdate(notification, hours=3, minutes=-index)
+        # Import notifications carry no action at all.
+        for index in range(3):
+            notification = create_notification(
+                user=self.user,
+                type=Notification.Type.BRIGHTSPACE_IMPORT,
+                title=f"Brightspace import {index}",
+            )
+            self.backdate(notification, hours=3, minutes=-index)
+
+        stats = rollup_notification_bursts()
+
+        self.assertEqual(stats, {"rollups": 2, "folded": 7})
+        rollup = Notification.objects.get(user=self.user, type=Notification.Type.EVENT_UPDATED)
+        self.assertEqual(rollup.title, "4 missions updated")
+        self.assertEqual(rollup.data["event_ids"], [1, 2, 3, 4])
+        self.assertEqual(
+            Notification.objects.get(user=self.user, type=Notification.Type.BRIGHTSPACE_IMPORT).title,
+            "3 Brightspace imports",
+        )
+        self.assertEqual(NotificationCounter.objects.get(user=self.user).unread_count, 2)
+        self.assertEqual(rollup_notification_bursts(), {"rollups": 0, "folded": 0})
+
+
+class NotificationBufferTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("buffered", password="password123")
+
+    def test_buffer_bulk_writes_and_coalesces_on_exit(self):
+        with notification_buffer() as buffer:
+            for title in ("First", "Second"):
+                create_notification(
+                    user=self.user,
+                    type=Notification.Type.EVENT_UPDATED,
+                    title=title,
+                    data={"event_id": 42, "action": "updated"},
+                )
+            create_notification(user=self.user, type=Notification.Type.BRIGHTSPACE_IMPORT, title="Import")
+            self.assertEqual(len(buffer), 2)
+            self.assertFalse(Notification.objects.exists())
+
+        self.assertEqual(
+            sorted(Notification.objects.values_list("title", flat=True)),
+            ["Import", "Second"],
+        )
+        self.assertEqual(NotificationCounter.objects.get(user=self.user).unread_count, 2)
+
+    def test_buffer_discards_on_error(self):
+        with self.assertRaises(RuntimeError):
+            with notification_buffer():
+                create_notification(user=self.user, type=Notification.Type.EVENT_CREATED, title="Lost")
+                raise RuntimeError("boom")
+        self.assertFalse(Notification.objects.exists())
+
+
+class GmailHistorySyncTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("mailer", password="password123")
+        self.account = GoogleAccount.objects.create(
+            user=self.user,
+            google_user_id="gid",
+            email="mailer@example.com",
+            access_token="token",
+            refresh_token="refresh",
+            token_expiry=timezone.now() + timedelta(hours=1),
+            scopes="openid",
+            gmail_history_id="100",
+        )
+        ParsedEmail.objects.create(user=self.user, message_id="m1", subject="Old", email_body="")
+
+    def sync(self, history_id, service, subjects=None):
+        subjects = subjects or {}
+
+        def fetch_messages(_service, message_ids, message_format="full"):
+            messages = {}
+            for message_id in message_ids:
+                headers = [{"name": "Subject", "value": subjects.get(message_id, "Sync meeting")}]
+                payload = {"headers": headers}
+                if message_format == "full":
+                    body = base64.urlsafe_b64encode(b"Meeting tomorrow at 10:00 am").decode()
+                    payload["body"] = {"data": body}
+                messages[message_id] = {"id": message_id, "snippet": "", "payload": payload}
+            return messages
+
+        with patch("api.gmail_integration.build_gmail_service", return_value=service), \
+                patch("api.gmail_integration.fetch_messages", side_effect=fetch_messages) as fetch, \
+                patch("api.email_parser.parse_emails_to_events",
+                      side_effect=lambda emails: {message_id: {"title": "Sync"} for message_id in emails}) as parse:
+            stats = sync_gmail_history(self.account, history_id)
+        return stats, fetch, parse
+
+    def test_only_new_messages_since_cursor_are_fetched(self):
+        service = MagicMock()
+        service.users.return_value.history.return_value.list.return_value.execute.side_effect = [
+            {
+                "history": [{"messagesAdded": [{"message": {"id": "m1"}}, {"message": {"id": "m2"}}]}],
+                "nextPageToken": "page-2",
+                "historyId": "150",
+            },
+            {"history": [{"messagesAdded": [{"message": {"id": "m3"}}]}], "historyId": "160"},
+        ]
+        stats, fetch, parse = self.sync("155", service)
+
+        list_calls = service.users.return_value.history.return_value.list.call_args_list
+        self.assertEqual(list_calls[0].kwargs["startHistoryId"], "100")
+        self.assertEqual(list_calls[1].kwargs["pageToken"], "page-2")
+        self.assertEqual([call.args[1] for call in fetch.call_args_list], [["m2", "m3"], ["m2", "m3"]])
+        self.assertEqual(fetch.call_args_list[0].kwargs["message_format"], "metadata")
+        self.assertEqual(list(parse.call_args.args[0]), ["m2", "m3"])
+        self.assertEqual(stats["known"], 1)
+        self.assertEqual(stats["parsed_emails_created"], 2)
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.gmail_history_id, "160")
+
+    def test_only_candidate_messages_are_fetched_in_full(self):
+        service = MagicMock()
+        service.users.return_value.history.return_value.list.return_value.execute.return_value = {
+            "history": [{"messagesAdded": [{"message": {"id": "m2"}}, {"message": {"id": "m3"}}]}],
+            "historyId": "160",
+        }
+        stats, fetch, parse = self.sync("155", service, subjects={"m2": "Your receipt"})
+
+        self.assertEqual(fetch.call_args_list[1].args[1], ["m3"])
+        self.assertEqual(stats["screened"], 2)
+        self.assertEqual(stats["fetched"], 1)
+        self.assertEqual(list(parse.call_args.args[0]), ["m3"])
+
+    def test_batch_fetch_skips_deleted_messages_and_raises_on_rate_limits(self):
+        def batch_with(errors):
+            def new_batch_http_request(callback):
+                batch = MagicMock()
+                added = []
+                batch.add.side_effect = lambda request, request_id: added.append(request_id)
+
+                def execute():
+                    for request_id in added:
+                        if request_id in errors:
+                            callback(request_id, None, HttpError(MagicMock(status=errors[request_id]), b""))
+                        else:
+                            callback(request_id, {"id": request_id}, None)
+                batch.execute.side_effect = execute
+                return batch
+            service = MagicMock()
+            service.new_batch_http_request.side_effect = new_batch_http_request
+            return service
+
+        with self.settings(GMAIL_BATCH_SIZE=2):
+            service = batch_with({"m2": 404})
+            messages = fetch_messages(service, ["m1", "m2", "m3"], message_format="metadata")
+            self.assertEqual(sorted(messages), ["m1", "m3"])
+            self.assertEqual(service.new_batch_http_request.call_count, 2)
+            get_kwargs = service.users.return_value.messages.return_value.get.call_args.kwargs
+            self.assertEqual(get_kwargs["metadataHeaders"], ["Subject", "From", "Content-Type"])
+
+            with self.assertRaises(GmailError):
+                fetch_messages(batch_with({"m1": 429}), ["m1"])
+
+    def test_redelivered_notification_does_no_work(self):
+        service = MagicMock()
+        stats, fetch, parse = self.sync("90", service)
+        service.users.assert_not_called()
+        fetch.assert_not_called()
+        self.assertEqual(stats["listed"], 0)
+
+    def push(self, history_id):
+        data = base64.b64encode(
+            json.dumps({"emailAddress": "mailer@example.com", "historyId": history_id}).encode()
+        ).decode()
+        return self.client.post(reverse("gmail-webhook"), {"message": {"data": data}}, content_type="application/json")
+
+    def test_webhook_queues_work_and_acknowledges_at_once(self):
+        with patch("api.tasks.process_gmail_push.delay") as delay:
+            first = self.push(200)
+            redelivered = self.push(200)
+            stale = self.push(90)
+        self.assertEqual(first.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(redelivered.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(stale.status_code, status.HTTP_204_NO_CONTENT)
+        delay.assert_called_once_with(self.account.pk, "200")
+
+    def test_overlapping_pushes_fold_into_the_running_sync(self):
+        cache.set(f"gmail:sync-lock:{self.account.pk}", "other-worker")
+        self.assertEqual(run_gmail_sync(self.account.pk, "200")["status"], "deferred")
+        self.assertEqual(run_gmail_sync(self.account.pk, "180")["status"], "deferred")
+        cache.delete(f"gmail:sync-lock:{self.account.pk}")
+
+        stats = {"parsed_emails_created": 0}
+        with patch("api.gmail_integration.sync_gmail_history", return_value=stats) as sync:
+            result = run_gmail_sync(self.account.pk, "150")
+        self.assertEqual([call.args[1] for call in sync.call_args_list], ["150", "200"])
+        self.assertEqual(result["passes"], 2)
+        self.assertIsNone(result["requeue"])
+
+    def test_push_during_a_pass_is_not_lost_and_lock_is_extended(self):
+        lock_key = f"gmail:sync-lock:{self.account.pk}"
+        seen = []
+
+        def sync(account, history_id):
+            seen.append(history_id)
+            if history_id == "150":
+                # Another push arrives mid-pass, then the lock expires.
+                self.assertEqual(run_gmail_sync(self.account.pk, "300")["status"], "deferred")
+                cache.delete(lock_key)
+            elif history_id == "300":
+                self.assertIsNotNone(cache.get(lock_key))
+                cache.set(lock_key, "other-worker")
+                self.assertEqual(run_gmail_sync(self.account.pk, "400")["status"], "deferred")
+            return {"parsed_emails_created": 0}
+
+        with patch("api.gmail_integration.sync_gmail_history", side_effect=sync):
+            result = run_gmail_sync(self.account.pk, "150")
+        # The second worker owns the lock now, so "400" is handed back.
+        self.assertEqual(seen, ["150", "300"])
+        self.assertEqual(result["requeue"], "400")
+        self.assertEqual(cache.get(lock_key), "other-worker")
+
+
+    def test_failed_pass_still_notifies_for_stored_emails(self):
+        def sync(account, history_id):
+            details = {"id": "m2", "subject": "Standup", "sender": "lead@example.com"}
+            store_parsed_email(account, details, {"title": "Standup"})
+            raise llm.LLMError("Groq unavailable")
+
+        with patch("api.gmail_integration.sync_gmail_history", side_effect=sync):
+            with self.assertRaises(llm.LLMError):
+                run_gmail_sync(self.account.pk, "150")
+        parsed = ParsedEmail.objects.get(message_id="m2")
+        notification = Notification.objects.get(user=self.user)
+        self.assertEqual(notification.title, "New event suggestion: Standup")
+        self.assertEqual(notification.data["parsed_email_id"], parsed.pk)
+
+
+class CalendarClassifierTests(TestCase):
+    def test_score_counts_distinct_categories_case_insensitively(self):
+        text = "MEETING moved: the meeting is Tuesday at 3:30 PM in Room 4, on Zoom."
+        self.assertEqual(
+            calendar_categories(text),
+            {"meeting", "weekday", "clock_time", "location", "video_call"},
+        )
+        self.assertEqual(calendar_score(text), 5)
+        self.assertEqual(calendar_score("Your receipt is attached."), 0)
+
+    def test_scan_stops_at_threshold_and_prefix(self):
+        text = "Meeting tomorrow in the lobby room."
+        self.assertEqual(len(calendar_categories(text, stop_at=2)), 2)
+        self.assertTrue(is_calendar_related(text))
+        self.assertFalse(is_calendar_related(text, threshold=4))
+
+        newsletter = "x" * 500 + " meeting tomorrow"
+        with self.settings(GMAIL_CLASSIFIER_MAX_CHARS=100):
+            self.assertFalse(is_calendar_related(newsletter))
+        self.assertTrue(is_calendar_related(newsletter))
+
+
+def groq_stream(content, piece_size=7):
+    """A fake streamed Groq completion delivering ``content`` in small pieces."""
+    pieces = [content[index:index + piece_size] for index in range(0, len(content), piece_size)]
+    chunks = [SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=piece))]) for piece in pieces]
+    stream = MagicMock()
+    stream.__iter__.return_value = iter(chunks)
+    return stream
+
+
+@patch.dict("os.environ", {"GROQ_API_KEY": "test-key"})
+class EmailParseCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        llm.reset()
+        self.addCleanup(llm.reset)
+
+    def groq_reply(self, groq):
+        groq.return_value.chat.completions.create.return_value = groq_stream(json.dumps(
+            {"title": "Design review", "start": "2030-01-02T10:00:00", "end": "2030-01-02T11:00:00"}
+        ))
+
+    def test_identical_email_is_parsed_once(self):
+        with patch("api.llm.Groq") as groq:
+            self.groq_reply(groq)
+            first = parse_email_to_event("Design review\ntomorrow at 10am")
+            forwarded = parse_email_to_event("> Design review\n>   tomorrow at 10am  ")
+
+        self.assertEqual(groq.return_value.chat.completions.create.call_count, 1)
+        self.assertEqual(forwarded, first)
+        self.assertEqual(forwarded["start"], datetime(2030, 1, 2, 10, 0))
+        self.assertEqual(parse_cache_stats(), {"hits": 1, "misses": 1, "hit_rate": 0.5})
+
+    def test_emails_are_parsed_in_one_call_with_single_call_fallback(self):
+        batch_reply = groq_stream(json.dumps({"events": [
+            {"message_id": "m1", "title": "Standup", "start": "2030-01-02T09:00:00", "end": "2030-01-02T09:15:00"},
+            {"message_id": "m2", "title": "Missing end", "start": "2030-01-02T12:00:00"},
+        ]}))
+        single_reply = groq_stream("```json\n" + json.dumps(
+            {"title": "Lunch", "start": "2030-01-02T12:00:00", "end": "2030-01-02T13:00:00"}
+        ) + "\n```")
+        with patch("api.llm.Groq") as groq:
+            create = groq.return_value.chat.completions.create
+            create.side_effect = [batch_reply, single_reply]
+            results = parse_emails_to_events({"m1": "Standup at 9", "m2": "Lunch at noon", "m3": "  "})
+            again = parse_emails_to_events({"m1": "Standup at 9", "m2": "Lunch at noon"})
+
+        self.assertEqual(create.call_count, 2)
+        self.assertIn("=== Email m2 ===", create.call_args_list[0].kwargs["messages"][0]["content"])
+        self.assertEqual({key: value["title"] for key, value in results.items()}, {"m1": "Standup", "m2": "Lunch"})
+        self.assertEqual(results["m1"]["description"], "Standup at 9")
+        self.assertEqual(results["m2"]["description"], "Lunch at noon")
+        self.assertEqual(again, results)
+
+    def test_description_falls_back_to_the_original_email(self):
+        email_text = "Design review tomorrow at 10am.\n\n-- \nSam Rivera | Chief Pilot"
+        with patch("api.llm.Groq") as groq:
+            self.groq_reply(groq)
+            event_data = parse_email_to_event(email_text)
+        prompt = groq.return_value.chat.completions.create.call_args.kwargs["messages"][0]["content"]
+        self.assertNotIn("Chief Pilot", prompt)
+        self.assertEqual(event_data["description"], email_text)
+
+    def test_key_changes_with_reference_day(self):
+        monday = datetime(2030, 1, 7, 9, 0)
+        self.assertEqual(
+            parse_cache_key("Standup tomorrow", monday),
+            parse_cache_key("Standup   tomorrow", monday.replace(hour=17)),
+        )
+        self.assertNotEqual(
+            parse_cache_key("Standup tomorrow", monday),
+            parse_cache_key("Standup tomorrow", datetime(2030, 1, 8, 9, 0)),
+        )
+
+
+@patch.dict("os.environ", {"GROQ_API_KEY": "test-key"})
+@override_settings(LLM_REQUESTS_PER_MINUTE=0, LLM_TOKENS_PER_MINUTE=0)
+class LLMClientTests(TestCase):
+    def setUp(self):
+        llm.reset()
+        self.addCleanup(llm.reset)
+
+    def rate_limited(self, retry_after=None):
+        headers = {"retry-after": retry_after} if retry_after else {}
+        request = httpx.Request("POST", "https://api.groq.com/openai/v1/chat/completions")
+        response = httpx.Response(429, headers=headers, request=request)
+        return groq.RateLimitError("slow down", response=response, body=None)
+
+    def test_client_is_shared_and_rate_limits_are_retried(self):
+        with patch("api.llm.Groq") as client_class, patch("api.llm.time.sleep") as sleep:
+            create = client_class.return_value.chat.completions.create
+            create.side_effect = [self.rate_limited("2"), self.rate_limited(), "done"]
+            self.assertIs(llm.get_client(), llm.get_client())
+            result = llm.complete([{"role": "user", "content": "hi"}], max_tokens=10)
+
+        self.assertEqual(result, "done")
+        client_class.assert_called_once()
+        self.assertEqual(client_class.call_args.kwargs["max_retries"], 0)
+        self.assertEqual(create.call_args.kwargs["model"], llm.DEFAULT_MODEL)
+        self.assertEqual(sleep.call_args_list[0].args[0], 2.0)
+        self.assertEqual(sleep.call_count, 2)
+
+    def test_json_stream_is_closed_once_the_object_is_complete(self):
+        content = 'Sure: {"title": "Brief {room} \\"A\\"", "tags": ["x]"]} and then some rambling'
+        stream = groq_stream(content, piece_size=5)
+        with patch("api.llm.Groq") as client_class:
+            client_class.return_value.chat.completions.create.return_value = stream
+            result = llm.complete_json([{"role": "user", "content": "hi"}], max_tokens=10)
+
+        self.assertEqual(result, {"title": 'Brief {room} "A"', "tags": ["x]"]})
+        kwargs = client_class.return_value.chat.completions.create.call_args.kwargs
+        self.assertTrue(kwargs["stream"])
+        self.assertEqual(kwargs["response_format"], {"type": "json_object"})
+        stream.close.assert_called_once()
+        self.assertIsNotNone(next(iter(stream), None))  # the rambling was never read
+
+    def test_json_mode_rejection_falls_back_and_prose_is_abandoned(self):
+        request = httpx.Request("POST", "https://api.groq.com/openai/v1/chat/completions")
+        rejected = groq.BadRequestError(
+            "json_validate_failed", response=httpx.Response(400, request=request), body=None,
+        )
+        with patch("api.llm.Groq") as client_class:
+            create = client_class.return_value.chat.completions.create
+            create.side_effect = [rejected, groq_stream("[1, 2]")]
+            self.assertEqual(llm.complete_json([{"role": "user", "content": "hi"}], max_tokens=10), [1, 2])
+            self.assertNotIn("response_format", create.call_args.kwargs)
+
+            create.side_effect = [groq_stream("I am sorry, " * 100 + "{}")]
+            with self.assertRaises(ValueError):
+                llm.complete_json([{"role": "user", "content": "hi"}], max_tokens=10, json_mode=False)
+
+    def test_stream_failing_midway_is_retried(self):
+        broken = groq_stream('{"title": "Brief", ', piece_size=4)
+        chunks = list(broken.__iter__.return_value)
+
+        def interrupted():
+            yield from chunks
+            raise httpx.ReadTimeout("stream stalled")
+        broken.__iter__.return_value = interrupted()
+
+        with patch("api.llm.Groq") as client_class, patch("api.llm.time.sleep"):
+            create = client_class.return_value.chat.completions.create
+            create.side_effect = [broken, groq_stream('{"title": "Brief"}')]
+            result = llm.complete_json([{"role": "user", "content": "hi"}], max_tokens=10)
+        self.assertEqual(result, {"title": "Brief"})
+        self.assertEqual(create.call_count, 2)
+        broken.close.assert_called_once()
+
+        llm.reset()
+        with patch("api.llm.Groq") as client_class, patch("api.llm.time.sleep"), \
+                override_settings(LLM_MAX_RETRIES=0):
+            failing = groq_stream("")
+            failing.__iter__.side_effect = groq.APIError("overloaded", request=None, body=None)
+            client_class.return_value.chat.completions.create.return_value = failing
+            with self.assertRaises(llm.LLMError):
+                llm.complete_json([{"role": "user", "content": "hi"}], max_tokens=10)
+
+    @override_settings(LLM_MAX_RETRY_WAIT_SECONDS=60)
+    def test_long_retry_after_fails_at_once(self):
+        with patch("api.llm.Groq") as client_class, patch("api.llm.time.sleep") as sleep:
+            create = client_class.return_value.chat.completions.create
+            create.side_effect = self.rate_limited("3600")
+            with self.assertRaises(llm.LLMError):
+                llm.complete([{"role": "user", "content": "hi"}], max_tokens=10)
+        create.assert_called_once()
+        sleep.assert_not_called()
+
+    @override_settings(LLM_MAX_RETRIES=1)
+    def test_gives_up_with_llm_error(self):
+        with patch("api.llm.Groq") as client_class, patch("api.llm.time.sleep"):
+            client_class.return_value.chat.completions.create.side_effect = self.rate_limited()
+            with self.assertRaises(llm.LLMError):
+                llm.complete([{"role": "user", "content": "hi"}], max_tokens=10)
+        self.assertEqual(client_class.return_value.chat.completions.create.call_count, 2)
+
+    def test_token_bucket_makes_callers_wait_once_spent(self):
+        bucket = llm.TokenBucket(per_minute=60)
+        self.assertEqual(bucket.reserve(60), 0.0)
+        self.assertAlmostEqual(bucket.reserve(30), 30.0, delta=0.5)
+
+
+INVITE_ICS = """BEGIN:VCALENDAR
+VERSION:2.0
+METHOD:REQUEST
+BEGIN:VEVENT
+UID:invite-1@example.com
+SUMMARY:Flight planning
+DTSTART;TZID=America/Chicago:20300107T090000
+DTEND;TZID=America/Chicago:20300107T103000
+RRULE:FREQ=WEEKLY;COUNT=4
+LOCATION:Hangar 2
+ATTENDEE;CN=Sam:mailto:sam@example.com
+END:VEVENT
+END:VCALENDAR
+"""
+
+
+@patch.dict("os.environ", {"GROQ_API_KEY": "test-key"})
+class CalendarInviteTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        llm.reset()
+        self.addCleanup(llm.reset)
+
+    def test_invite_is_read_without_the_llm(self):
+        email_text = f"You have been invited.\n\n{INVITE_ICS}"
+        with patch("api.llm.Groq") as groq_client:
+            event_data = parse_email_to_event(email_text)
+        groq_client.return_value.chat.completions.create.assert_not_called()
+
+        self.assertEqual(event_data["title"], "Flight planning")
+        self.assertEqual(event_data["start"].isoformat(), "2030-01-07T09:00:00-06:00")
+        self.assertEqual(event_data["end"] - event_data["start"], timedelta(minutes=90))
+        self.assertEqual(event_data["location"], "Hangar 2")
+        self.assertEqual(event_data["attendees"], ["sam@example.com"])
+        self.assertEqual(event_data["timezone"], "America/Chicago")
+        self.assertEqual(event_data["recurrence_frequency"], Event.RecurrenceFrequency.WEEKLY)
+        self.assertEqual(event_data["recurrence_count"], 4)
+
+        with self.assertRaises(ValueError):
+            parse_calendar_invite(INVITE_ICS.replace("METHOD:REQUEST", "METHOD:CANCEL"))
+
+    def test_rsvp_replies_are_not_suggested_as_events(self):
+        reply = INVITE_ICS.replace("METHOD:REQUEST", "METHOD:REPLY").replace(
+            "SUMMARY:Flight planning", "SUMMARY:Accepted: Flight planning"
+        )
+        for ics_text in (reply, reply.replace("METHOD:REPLY", "METHOD:COUNTER")):
+            with self.assertRaises(ValueError):
+                parse_calendar_invite(ics_text)
+        self.assertEqual(parse_emails_to_events({"m1": f"Sam accepted.\n{reply}"}), {})
+        self.assertIsNotNone(parse_calendar_invite(INVITE_ICS.replace("METHOD:REQUEST", "METHOD:PUBLISH")))
+
+    def test_gmail_invite_attachment_is_extracted(self):
+        encoded = base64.urlsafe_b64encode(INVITE_ICS.encode()).decode()
+        service = MagicMock()
+        service.users.return_value.messages.return_value.attachments.return_value.get.return_value.execute.return_value = {
+            "data": encoded,
+        }
+        message = {
+            "id": "m9",
+            "payload": {
+                "mimeType": "multipart/mixed",
+                "headers": [{"name": "Subject", "value": "Invitation: Flight planning"}],
+                "parts": [
+                    {"mimeType": "text/plain", "body": {"data": base64.urlsafe_b64encode(b"See invite").decode()}},
+                    {"mimeType": "application/ics", "filename": "invite.ics", "body": {"attachmentId": "att-1"}},
+                ],
+            },
+        }
+        details = message_details(message, service)
+        self.assertEqual(details["content"], "See invite")
+        self.assertEqual(details["calendar"], INVITE_ICS)
+        self.assertEqual(parse_calendar_invite(details["calendar"])["title"], "Flight planning")
+
+
+class EmailPreprocessingTests(TestCase):
+    def test_reply_history_signature_and_tracking_are_stripped(self):
+        email_text = (
+            "Can we move the checkride to Friday at 2:30 pm? Join: https://zoom.us/j/123?pwd=abc\n"
+            "Agenda: https://example.com/agenda?id=7&utm_source=mail&utm_medium=email\n"
+            "\n"
+            "-- \n"
+            "Sam Rivera | Chief Pilot\n"
+            "\n"
+            "CONFIDENTIALITY NOTICE: This message is intended only for the addressee.\n"
+            "\n"
+            "On Mon, Jan 6, 2030 at 9:00 AM Alex <alex@example.com> wrote:\n"
+            "> The checkride is Thursday at 10am.\n"
+        )
+        text = prepare_email_text(email_text)
+        self.assertIn("Friday at 2:30 pm", text)
+        self.assertIn("https://zoom.us/j/123?pwd=abc", text)
+        self.assertIn("https://example.com/agenda?id=7\n", text + "\n")
+        for dropped in ("Chief Pilot", "CONFIDENTIALITY", "Thursday", "utm_source"):
+            self.assertNotIn(dropped, text)
+
+    def test_quoted_message_is_kept_when_it_holds_the_event(self):
+        email_text = "Sounds good, see you there.\n\nOn Mon, Jan 6 Alex wrote:\n> Ground school is Tuesday at 9am.\n"
+        self.assertIn("Ground school is Tuesday at 9am.", prepare_email_text(email_text))
+
+    def test_may_the_verb_is_not_a_date(self):
+        email_text = "We may need a bigger room.\n\nOn Mon, Jan 6 Alex wrote:\n> Ground school is Tuesday at 9am.\n"
+        self.assertIn("Ground school is Tuesday at 9am.", prepare_email_text(email_text))
+        dated = "Moved to May 12, we may need a bigger room.\n\nOn Mon, Jan 6 Alex wrote:\n> Ground school is Tuesday.\n"
+        self.assertNotIn("Ground school", prepare_email_text(dated))
+
+    @override_settings(EMAIL_PARSE_MAX_INPUT_TOKENS=40)
+    def test_long_text_is_cut_around_dates(self):
+        filler = " ".join(f"Newsletter item {index} has nothing to do with scheduling." for index in range(40))
+        email_text = f"Hello team. {filler} The safety briefing is on March 3 at 08:00. {filler} Thanks."
+        text = prepare_email_text(email_text)
+        self.assertIn("The safety briefing is on March 3 at 08:00.", text)
+        self.assertIn("Hello team.", text)
+        self.assertIn("[…]", text)
+        self.assertLessEqual(len(text) // 4, 45)
@@ -4,6 +4,7 @@ from .views import (
     EventViewSet,
     EventOccurrencesView,
     BrightspaceImportView,
+    IcsSubscriptionViewSet,
     GoogleDisconnectView,
     GoogleOAuthCallbackView,
     GoogleOAuthStartView,
@@ -17,11 +18,13 @@ from .views import (
     GmailWatchWebhookView,
     GmailWatchManageView,
 )
+from .realtime import notification_stream
 
 router = DefaultRouter()
 router.register(r"events", EventViewSet, basename="event")
 router.register(r"invitations", InvitationViewSet, basename="invitation")
 router.register(r"parsed-emails", ParsedEmailViewSet, basename="parsed-email")
+router.register(r"calendar/subscriptions", IcsSubscriptionViewSet, basename="ics-subscription")
 
 urlpatterns = [
     path("events/occurrences/", EventOccurrencesView.as_view(), name="event-occurrences"),
@@ -36,5 +39,6 @@ urlpatterns = [
     path("gmail/webhook/", GmailWatchWebhookView.as_view(), name="gmail-webhook"),
     path("gmail/watch/", GmailWatchManageView.as_view(), name="gmail-watch"),
     path("notifications/", NotificationListView.as_view(), name="notifications"),
+    path("notifications/stream/", notification_stream, name="notifications-stream"),
     path("invitations/lookup/<uuid:token>/", InvitationLookupView.as_view(), name="invitation-lookup"),
 ]
@@ -1,16 +1,11 @@
-from urllib.parse import urlencode, urlparse, urljoin
-from datetime import datetime, timedelta, time, date
+from urllib.parse import urlencode
+from datetime import timedelta
 import logging
-import re
-import ipaddress
-import socket
 
 from dateutil import parser as date_parser
-from dateutil import rrule
-import requests
-from icalendar import Calendar
 from django.conf import settings
 from django.contrib.auth.models import User
+from django.db import transaction
 from django.http import HttpResponseRedirect
 from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
@@ -35,8 +30,10 @@ from .google_calendar import (
 from .models import (
     Event,
     EventAttendee,
+    EventException,
     GoogleAccount,
     BrightspaceFeed,
+    IcsSubscription,
     Invitation,
     Notification,
     ParsedEmail,
@@ -44,18 +41,36 @@ from .models import (
 from .serializers import (
     UserSerializer,
     EventSerializer,
+    EventExceptionSerializer,
     EventOccurrenceSerializer,
     BrightspaceImportSerializer,
+    IcsSubscriptionSerializer,
     NotificationSerializer,
     InvitationSerializer,
     ParsedEmailSerializer,
 )
-from .notifications import create_notification
+from .cache import (
+    SCOPE_BRIGHTSPACE,
+    SCOPE_EVENTS,
+    SCOPE_GOOGLE,
+    SCOPE_NOTIFICATIONS,
+    cached_for_user,
+    invalidate_user_cache,
+    query_fingerprint,
+)
+from .notifications import (
+    create_notification,
+    mark_notifications_read,
+    notification_buffer,
+    unread_notification_count,
+)
+from .realtime import publish_unread_count
 from .invitations import send_invitation_email
+from .llm import LLMError
+from . import feeds
 
 logger = logging.getLogger(__name__)
-BRIGHTSPACE_MAX_BYTES = getattr(settings, "BRIGHTSPACE_MAX_ICS_BYTES", 5 * 1024 * 1024)
-BRIGHTSPACE_REDIRECT_LIMIT = 3
+
 
 class CreateUserView(generics.CreateAPIView):
     queryset = User.objects.all()
@@ -67,7 +82,11 @@ class EventViewSet(viewsets.ModelViewSet):
     # /api/events/      GET, POST
     #
     # /api/events/{id}      GET, PUT, PATCH, DELETE
-    queryset = Event.objects.select_related("pilot").prefetch_related("attendees").order_by("start")
+    queryset = (
+        Event.objects.select_related("pilot")
+        .prefetch_related("attendees", "exceptions")
+        .order_by("start")
+    )
     serializer_class = EventSerializer
     permission_classes = [IsAuthenticated]
 
@@ -171,12 +190,52 @@ class EventViewSet(viewsets.ModelViewSet):
 
         hydrated = (
             Event.objects.select_related("pilot")
-            .prefetch_related("attendees")
+            .prefetch_related("attendees", "exceptions")
             .get(pk=event.pk)
         )
         serializer = EventSerializer(hydrated, context=self.get_serializer_context())
         return Response(serializer.data)
 
+    @action(detail=True, methods=["post", "delete"], url_path="occurrences", url_name="occurrence")
+    def occurrences(self, request, pk=None):
+        """
+        POST cancels or overrides one occurrence of a recurring event (keyed
+        on ``original_start``); DELETE ``?original_start=`` restores it.
+        """
+        event = self.get_object()
+        if request.method == "DELETE":
+            raw_start = request.query_params.get("original_start") or ""
+            try:
+                original_start = date_parser.isoparse(raw_start)
+            except (ValueError, TypeError):
+                return Response(
+                    {"detail": "Invalid original_start. Use ISO 8601 format."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            deleted, _ = EventException.objects.filter(
+                event=event,
+                original_start=original_start,
+            ).delete()
+            if not deleted:
+                return Response(status=status.HTTP_404_NOT_FOUND)
+            self._sync_event_to_google(event)
+            return Response(status=status.HTTP_204_NO_CONTENT)
+
+        serializer = EventExceptionSerializer(data=request.data, context={"event": event})
+        serializer.is_valid(raise_exception=True)
+        values = dict(serializer.validated_data)
+        original_start = values.pop("original_start")
+        exception, created = EventException.objects.update_or_create(
+            event=event,
+            original_start=original_start,
+            defaults=values,
+        )
+        self._sync_event_to_google(event)
+        return Response(
+            EventExceptionSerializer(exception, context={"event": event}).data,
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK,
+        )
+
     def _sync_event_to_google(self, event):
         try:
             account = event.pilot.google_account
@@ -256,20 +315,24 @@ class EventOccurrencesView(APIView):
         if window_end > max_span:
             window_end = max_span
 
+        data = cached_for_user(
+            SCOPE_EVENTS,
+            request.user.pk,
+            f"occurrences:{query_fingerprint(start_param, end_param)}",
+            lambda: self._build_occurrences(request.user, window_start, window_end, now),
+            timeout=getattr(settings, "OCCURRENCE_CACHE_TIMEOUT_SECONDS", 60),
+        )
+        return Response(data)
+
+    @staticmethod
+    def _build_occurrences(user, window_start, window_end, now):
         events = (
-            Event.objects.filter(pilot=request.user)
-            .prefetch_related("attendees")
+            Event.objects.filter(pilot=user)
+            .prefetch_related("attendees", "exceptions")
             .order_by("start")
         )
         occurrences = []
 
-        freq_map = {
-            Event.RecurrenceFrequency.DAILY: rrule.DAILY,
-            Event.RecurrenceFrequency.WEEKLY: rrule.WEEKLY,
-            Event.RecurrenceFrequency.MONTHLY: rrule.MONTHLY,
-            Event.RecurrenceFrequency.YEARLY: rrule.YEARLY,
-        }
-
         for event in events:
             attendee_objects = list(event.attendees.all())
             attendees_payload = [
@@ -317,31 +380,38 @@ class EventOccurrencesView(APIView):
                     )
                 continue
 
-            rule_kwargs = {
-                "dtstart": event.start,
-                "interval": event.recurrence_interval,
+            rule = event.occurrence_rule()
+            exceptions = {
+                exception.original_start: exception
+                for exception in event.exceptions.all()
             }
+            # Overrides are placed by their own times, so an occurrence moved
+            # into the window from outside it still shows up.
+            instances = [
+                (start, start, None)
+                for start in rule.between(window_start, window_end, inc=True)
+                if start not in exceptions
+            ]
+            for exception in exceptions.values():
+                if exception.is_cancelled:
+                    continue
+                start = exception.start or exception.original_start
+                end = exception.end or start + event_duration
+                if end >= window_start and start <= window_end:
+                    instances.append((start, exception.original_start, exception))
+            instances.sort(key=lambda item: item[0])
 
-            if event.recurrence_count:
-                rule_kwargs["count"] = event.recurrence_count
-            if event.recurrence_end_date:
-                if event.all_day:
-                    end_time = datetime.combine(
-                        event.recurrence_end_date,
-                        datetime.max.time(),
-                        tzinfo=event.start.tzinfo,
-                    )
-                else:
-                    end_time = datetime.combine(
-                        event.recurrence_end_date,
-                        event.start.timetz(),
-                    )
-                rule_kwargs["until"] = end_time
-
-            rule = rrule.rrule(freq_map[event.recurrence_frequency], **rule_kwargs)
             generated = 0
-            for occurrence_start in rule.between(window_start, window_end, inc=True):
+            for occurrence_start, original_start, exception in instances:
                 occurrence_end = occurrence_start + event_duration
+                title = event.title
+                description = event.description
+                location = event.location
+                if exception is not None:
+                    occurrence_end = exception.end or occurrence_end
+                    title = exception.title or title
+                    description = exception.description or description
+                    location = exception.location or location
                 # Calculate urgency color for this specific occurrence
                 time_diff = occurrence_start - now
                 if time_diff.total_seconds() > 2 * 24 * 3600:
@@ -354,14 +424,14 @@ class EventOccurrencesView(APIView):
                 occurrences.append(
                     {
                         "event_id": event.id,
-                        "occurrence_id": f"{event.id}:{occurrence_start.isoformat()}",
-                        "title": event.title,
-                        "description": event.description,
+                        "occurrence_id": f"{event.id}:{original_start.isoformat()}",
+                        "title": title,
+                        "description": description,
                         "start": occurrence_start,
                         "end": occurrence_end,
                         "all_day": event.all_day,
                         "emoji": event.emoji,
-                        "location": event.location,
+                        "location": location,
                         "source": event.source,
                         "is_recurring": True,
                         "recurrence_frequency": event.recurrence_frequency,
@@ -378,114 +448,35 @@ class EventOccurrencesView(APIView):
 
         occurrences.sort(key=lambda item: item["start"])
         serializer = EventOccurrenceSerializer(occurrences, many=True)
-        return Response(serializer.data)
+        return serializer.data
 
 
 class BrightspaceImportView(APIView):
   permission_classes = [IsAuthenticated]
 
-  @staticmethod
-  def _validate_ics_url(raw_url: str) -> str:
-    parsed = urlparse(raw_url)
-    if parsed.scheme not in ("http", "https") or not parsed.netloc:
-      raise ValueError("ICS URL must be an absolute http(s) URL.")
-
-    hostname = parsed.hostname
-    if hostname is None:
-      raise ValueError("ICS URL is missing a hostname.")
-
-    try:
-      addr_info = socket.getaddrinfo(hostname, None)
-    except socket.gaierror as exc:
-      raise ValueError(f"Could not resolve host {hostname}.") from exc
-
-    for _, _, _, _, sockaddr in addr_info:
-      ip_str = sockaddr[0]
-      ip = ipaddress.ip_address(ip_str)
-      if any(
-        (
-          ip.is_loopback,
-          ip.is_link_local,
-          ip.is_private,
-          ip.is_reserved,
-          ip.is_multicast,
-        )
-      ):
-        raise ValueError("ICS URL resolves to a non-public address.")
-
-    return parsed.geturl()
-
-  @staticmethod
-  def _resolve_redirect(current_url: str, location: str) -> str:
-    next_url = urljoin(current_url, location)
-    return BrightspaceImportView._validate_ics_url(next_url)
-
-  def _download_ics(self, initial_url: str) -> bytes:
-    session = requests.Session()
-    current_url = initial_url
-
-    for _ in range(BRIGHTSPACE_REDIRECT_LIMIT + 1):
-      try:
-        with session.get(
-          current_url,
-          timeout=15,
-          stream=True,
-          allow_redirects=False,
-        ) as response:
-          if response.is_redirect or response.status_code in (301, 302, 303, 307, 308):
-            location = response.headers.get("Location")
-            if not location:
-              raise ValueError("Redirect response missing Location header.")
-            current_url = self._resolve_redirect(current_url, location)
-            continue
-
-          response.raise_for_status()
-
-          content_length = response.headers.get("Content-Length")
-          if content_length:
-            try:
-              declared_size = int(content_length)
-            except ValueError:
-              declared_size = None
-            else:
-              if declared_size > BRIGHTSPACE_MAX_BYTES:
-                raise ValueError("ICS feed exceeds allowed size.")
-
-          buffer = bytearray()
-          for chunk in response.iter_content(chunk_size=65536):
-            buffer.extend(chunk)
-            if len(buffer) > BRIGHTSPACE_MAX_BYTES:
-              raise ValueError("ICS feed exceeds allowed size.")
-          return bytes(buffer)
-      except requests.RequestException as exc:
-        raise ValueError(f"Failed to download ICS feed: {exc}") from exc
-
-    raise ValueError("ICS feed exceeded redirect limit.")
-
   def get(self, request):
-    try:
-      feed = request.user.brightspace_feed
-    except BrightspaceFeed.DoesNotExist:
-      return Response({"connected": False})
+    data = cached_for_user(
+      SCOPE_BRIGHTSPACE,
+      request.user.pk,
+      "status",
+      lambda: self._status_payload(request.user),
+    )
+    return Response(data)
 
-    data = {
+  @staticmethod
+  def _status_payload(user) -> dict:
+    feed = BrightspaceFeed.objects.filter(user=user).first()
+    if feed is None:
+      return {"connected": False}
+    return {
       "connected": True,
       "ics_url": feed.ics_url,
       "last_imported_at": feed.last_imported_at,
+      "next_refresh_at": feed.next_attempt_at,
+      "last_error": feed.last_error,
     }
-    return Response(data)
-
-  @staticmethod
-  def _normalize_datetime(value):
-    if isinstance(value, datetime):
-      if timezone.is_naive(value):
-        value = timezone.make_aware(value, timezone.get_current_timezone())
-      return value
-    if isinstance(value, date):
-      naive = datetime.combine(value, time.min)
-      return timezone.make_aware(naive, timezone.get_current_timezone())
-    return None
 
+  @notification_buffer()
   def post(self, request):
     serializer = BrightspaceImportSerializer(data=request.data)
     serializer.is_valid(raise_exception=True)
@@ -495,12 +486,19 @@ class BrightspaceImportView(APIView):
     safe_ics_url = None
     if provided_url:
       try:
-        safe_ics_url = self._validate_ics_url(provided_url)
+        safe_ics_url = feeds.validate_ics_url(provided_url)
       except ValueError as exc:
         return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+      defaults = {"ics_url": safe_ics_url}
+      existing_url = (
+        BrightspaceFeed.objects.filter(user=request.user).values_list("ics_url", flat=True).first()
+      )
+      if existing_url != safe_ics_url:
+        # Validators and failure history belong to the old URL.
+        defaults.update(etag="", last_modified="", content_hash="", consecutive_failures=0, last_error="")
       feed_instance, _ = BrightspaceFeed.objects.update_or_create(
         user=request.user,
-        defaults={"ics_url": safe_ics_url},
+        defaults=defaults,
       )
       ics_url = safe_ics_url
     else:
@@ -516,153 +514,83 @@ class BrightspaceImportView(APIView):
       ics_url = feed_instance.ics_url
 
       try:
-        safe_ics_url = self._validate_ics_url(ics_url)
+        safe_ics_url = feeds.validate_ics_url(ics_url)
       except ValueError as exc:
         return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
       ics_url = safe_ics_url
 
     try:
-      ics_payload = self._download_ics(ics_url)
+      result = feeds.import_feed(feed_instance, ics_url)
     except ValueError as exc:
       return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
 
-    try:
-      calendar = Calendar.from_ical(ics_payload)
-    except ValueError:
-      return Response(
-        {"detail": "The provided ICS feed is not valid."},
-        status=status.HTTP_400_BAD_REQUEST,
-      )
-
-    created = 0
-    updated = 0
-    skipped = 0
-
-    for component in calendar.walk("vevent"):
-      dtstart_prop = component.get("dtstart")
-      if dtstart_prop is None:
-        skipped += 1
-        continue
-
-      uid = str(component.get("uid", "")).strip()
-      if not uid:
-        skipped += 1
-        continue
-
-      summary = component.get("summary")
-      description = component.get("description")
-      location = component.get("location")
-      dtend_prop = component.get("dtend")
-      duration_prop = component.get("duration")
-
-      dtstart_raw = dtstart_prop.dt
-      dtend_raw = dtend_prop.dt if dtend_prop else None
-      duration_value = duration_prop.dt if duration_prop else None
-
-      is_all_day = isinstance(dtstart_raw, date) and not isinstance(dtstart_raw, datetime)
-
-      start_dt = self._normalize_datetime(dtstart_raw)
-      if start_dt is None:
-        skipped += 1
-        continue
-
-      if dtend_raw is not None:
-        end_dt = self._normalize_datetime(dtend_raw)
-        if end_dt is not None and is_all_day:
-          end_dt = end_dt - timedelta(seconds=1)
-      elif isinstance(duration_value, timedelta):
-        end_dt = start_dt + duration_value
-      else:
-        end_dt = start_dt + (timedelta(days=1) if is_all_day else timedelta(hours=1))
-
-      if end_dt <= start_dt:
-        end_dt = start_dt + (timedelta(days=1) if is_all_day else timedelta(hours=1))
-
-      description_text = ""
-      if summary:
-        title = str(summary)
-      else:
-        title = "Brightspace event"
-      if description:
-        raw_description = str(description)
-        description_clean = re.sub(r"https?://\S+", "", raw_description, flags=re.IGNORECASE)
-        description_text = description_clean.strip()
-      if location:
-        location_text = str(location)
-        if description_text:
-          description_text = f"{description_text}\nLocation: {location_text}"
-        else:
-          description_text = f"Location: {location_text}"
-
-      defaults = {
-        "title": title,
-        "description": description_text,
-        "start": start_dt,
-        "end": end_dt,
-        "all_day": is_all_day,
-        "source": Event.Source.BRIGHTSPACE,
-        "recurrence_frequency": Event.RecurrenceFrequency.NONE,
-        "recurrence_interval": 1,
-        "recurrence_count": None,
-        "recurrence_end_date": None,
-        "google_event_id": "",
-        "google_etag": "",
-        "google_ical_uid": uid,
-        "google_raw": {
-          "source": "brightspace",
-          "ics_url": ics_url,
-        },
-      }
-
-      event, event_created = Event.objects.update_or_create(
-        pilot=request.user,
-        google_ical_uid=uid,
-        defaults=defaults,
-      )
-      if event_created:
-        created += 1
-      else:
-        updated += 1
-
-    if feed_instance:
-      feed_instance.last_imported_at = timezone.now()
-      feed_instance.save(update_fields=["last_imported_at", "updated_at"])
-
     summary = {
-      "created": created,
-      "updated": updated,
-      "skipped": skipped,
+      **result,
       "saved_url": True,
       "used_saved_url": not bool(provided_url),
     }
-
-    create_notification(
-      user=request.user,
-      type=Notification.Type.BRIGHTSPACE_IMPORT,
-      title="Brightspace calendar import completed",
-      message=f"Imported {created} new and updated {updated} missions.",
-      data=summary,
-    )
+    if not result["not_modified"]:
+      feeds.notify_import(feed_instance, summary)
 
     return Response(summary, status=status.HTTP_200_OK)
 
 
+class IcsSubscriptionViewSet(viewsets.ModelViewSet):
+    # /api/calendar/subscriptions/            GET, POST
+    # /api/calendar/subscriptions/{id}/       GET, PATCH, PUT, DELETE (deleting drops its events)
+    # /api/calendar/subscriptions/{id}/refresh/  POST, import now
+    serializer_class = IcsSubscriptionSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return IcsSubscription.objects.filter(user=self.request.user).order_by("name", "pk")
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+    def perform_update(self, serializer):
+        subscription = serializer.instance
+        if serializer.validated_data.get("ics_url", subscription.ics_url) != subscription.ics_url:
+            feeds.reset_feed_state(subscription)
+        serializer.save()
+
+    @action(detail=True, methods=["post"])
+    @notification_buffer()
+    def refresh(self, request, pk=None):
+        subscription = self.get_object()
+        try:
+            ics_url = feeds.validate_ics_url(subscription.ics_url)
+            result = feeds.import_feed(subscription, ics_url)
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        if not result["not_modified"]:
+            feeds.notify_import(subscription, result)
+        return Response(result)
+
+
 class GoogleStatusView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        try:
-            account = request.user.google_account
-        except GoogleAccount.DoesNotExist:
-            return Response({"connected": False})
+        data = cached_for_user(
+            SCOPE_GOOGLE,
+            request.user.pk,
+            "status",
+            lambda: self._status_payload(request.user),
+        )
+        return Response(data)
 
-        data = {
+    @staticmethod
+    def _status_payload(user) -> dict:
+        account = GoogleAccount.objects.filter(user=user).first()
+        if account is None:
+            return {"connected": False}
+        return {
             "connected": True,
             "email": account.email,
             "last_synced_at": account.last_synced_at,
             "scopes": account.scopes.split() if account.scopes else [],
         }
-        return Response(data)
 
 
 class GoogleOAuthStartView(APIView):
@@ -997,7 +925,12 @@ class NotificationListView(APIView):
         )
         notifications = base_queryset.order_by("-created_at")[:limit]
         serializer = NotificationSerializer(notifications, many=True)
-        unread_count = base_queryset.filter(read_at__isnull=True).count()
+        unread_count = cached_for_user(
+            SCOPE_NOTIFICATIONS,
+            request.user.pk,
+            "unread_count",
+            lambda: unread_notification_count(request.user),
+        )
         return Response({
             "results": serializer.data,
             "unread_count": unread_count,
@@ -1012,7 +945,10 @@ class NotificationListView(APIView):
                 return Response({"detail": "ids must be a list."}, status=status.HTTP_400_BAD_REQUEST)
             queryset = queryset.filter(pk__in=ids)
 
-        updated = queryset.update(read_at=timezone.now())
+        updated = mark_notifications_read(request.user, queryset)
+        if updated:
+            invalidate_user_cache(SCOPE_NOTIFICATIONS, request.user.pk)
+            transaction.on_commit(lambda: publish_unread_count(request.user))
         return Response({"updated": updated})
 
 
@@ -1086,6 +1022,13 @@ class ParseEmailView(APIView):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
+        except LLMError as e:
+            logger.warning(f"Email parsing unavailable: {e}")
+            return Response(
+                {"error": "The AI parser is busy right now. Please try again in a minute."},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            )
+
         except Exception as e:
             logger.error(f"Unexpected error parsing email: {e}", exc_info=True)
             return Response(
@@ -1100,7 +1043,9 @@ class GmailWatchWebhookView(APIView):
     Webhook endpoint for Gmail push notifications from Google Cloud Pub/Sub.
 
     POST /api/gmail/webhook/
-    Receives notifications when new emails arrive and processes calendar-related ones.
+    Receives notifications when new emails arrive and queues a Celery task to
+    process the calendar-related ones. Pub/Sub is acknowledged with a 204 right
+    away, since slow responses make it redeliver.
     """
     permission_classes = [AllowAny]  # Google Pub/Sub doesn't use user auth
 
@@ -1121,10 +1066,8 @@ class GmailWatchWebhookView(APIView):
         try:
             import base64
             import json
-            from django.db import IntegrityError
-            from .gmail_integration import get_message_details, is_calendar_related, build_gmail_service
-            from .email_parser import parse_email_to_event
-            from .models import ParsedEmail
+            from .gmail_integration import accept_push, release_push
+            from .tasks import process_gmail_push
 
             # Extract message from Pub/Sub payload
             message_data = request.data.get("message", {})
@@ -1132,7 +1075,7 @@ class GmailWatchWebhookView(APIView):
 
             if not encoded_data:
                 logger.warning("Received Gmail webhook with no data")
-                return Response({"status": "ignored"}, status=status.HTTP_200_OK)
+                return Response(status=status.HTTP_204_NO_CONTENT)
 
             # Decode the Pub/Sub message
             decoded_data = base64.b64decode(encoded_data).decode("utf-8")
@@ -1143,107 +1086,28 @@ class GmailWatchWebhookView(APIView):
 
             if not email_address or not history_id:
                 logger.warning("Gmail webhook missing required fields")
-                return Response({"status": "ignored"}, status=status.HTTP_200_OK)
+                return Response(status=status.HTTP_204_NO_CONTENT)
 
             # Find the Google account by email
-            try:
-                account = GoogleAccount.objects.get(email=email_address)
-            except GoogleAccount.DoesNotExist:
+            account = GoogleAccount.objects.filter(email=email_address).first()
+            if account is None:
                 logger.warning(f"No GoogleAccount found for email: {email_address}")
-                return Response({"status": "ignored"}, status=status.HTTP_200_OK)
-
-            # Process new messages since the last history ID
-            logger.info(f"Processing Gmail notification for {email_address}, historyId: {history_id}")
-
-            # Fetch and filter calendar-related messages
-            service = build_gmail_service(account)
-            parsed_emails_created = 0
-
-            try:
-                # Get the latest messages from inbox to check
-                messages_response = service.users().messages().list(
-                    userId="me",
-                    labelIds=["INBOX"],
-                    maxResults=5  # Check recent messages
-                ).execute()
-
-                messages = messages_response.get("messages", [])
-
-                for msg in messages:
-                    message_id = msg.get("id")
-                    if not message_id:
-                        continue
-
-                    # Fetch full message details (subject, sender, content)
-                    message_details = get_message_details(service, message_id)
-
-                    if not message_details or not message_details.get("content"):
-                        continue
-
-                    # Check if calendar-related
-                    if is_calendar_related(message_details["content"]):
-                        logger.info(f"Found calendar-related email: {message_id} - {message_details.get('subject', 'No subject')}")
-
-                        # Parse email with AI
-                        try:
-                            event_data = parse_email_to_event(message_details["content"])
-
-                            # Convert datetime objects to ISO strings for JSON storage
-                            json_safe_data = {**event_data}
-                            if 'start' in json_safe_data and json_safe_data['start']:
-                                json_safe_data['start'] = json_safe_data['start'].isoformat()
-                            if 'end' in json_safe_data and json_safe_data['end']:
-                                json_safe_data['end'] = json_safe_data['end'].isoformat()
-                            if 'recurrence_end_date' in json_safe_data and json_safe_data['recurrence_end_date']:
-                                json_safe_data['recurrence_end_date'] = json_safe_data['recurrence_end_date'].isoformat()
-
-                            # Create ParsedEmail for user review (with deduplication)
-                            try:
-                                parsed_email = ParsedEmail.objects.create(
-                                    user=account.user,
-                                    message_id=message_id,
-                                    subject=message_details.get("subject", "No subject"),
-                                    email_body=message_details.get("content", ""),
-                                    sender=message_details.get("sender", ""),
-                                    parsed_data=json_safe_data,
-                                    status=ParsedEmail.Status.PENDING,
-                                )
-
-                                # Create notification
-                                create_notification(
-                                    user=account.user,
-                                    type=Notification.Type.EVENT_CREATED,  # Reusing existing type
-                                    title=f"New event suggestion: {event_data.get('title', 'Untitled')}",
-                                    message=f"Gmail found a calendar invitation from {message_details.get('sender', 'unknown sender')}. Review and approve to add to your calendar.",
-                                    data={
-                                        "parsed_email_id": parsed_email.pk,
-                                        "action": "parsed_email_pending_review",
-                                        "subject": message_details.get("subject", ""),
-                                        "message_id": message_id,
-                                    },
-                                )
-
-                                logger.info(f"Created ParsedEmail {parsed_email.pk} from Gmail message {message_id}")
-                                parsed_emails_created += 1
-
-                            except IntegrityError:
-                                # Message already processed (deduplication)
-                                logger.info(f"Gmail message {message_id} already processed, skipping")
-
-                        except Exception as e:
-                            logger.warning(f"Failed to parse calendar email {message_id}: {e}")
-
-            except Exception as e:
-                logger.error(f"Error processing Gmail messages: {e}", exc_info=True)
-
-            return Response({
-                "status": "processed",
-                "parsed_emails_created": parsed_emails_created
-            }, status=status.HTTP_200_OK)
+                return Response(status=status.HTTP_204_NO_CONTENT)
+
+            if accept_push(account, str(history_id)):
+                logger.info(f"Queueing Gmail notification for {email_address}, historyId: {history_id}")
+                try:
+                    process_gmail_push.delay(account.pk, str(history_id))
+                except Exception as e:
+                    # Without a queue, let Pub/Sub redeliver later.
+                    logger.error(f"Failed to queue Gmail notification: {e}")
+                    release_push(account, str(history_id))
+                    return Response(status=status.HTTP_503_SERVICE_UNAVAILABLE)
 
         except Exception as e:
             logger.error(f"Error handling Gmail webhook: {e}", exc_info=True)
-            return Response({"status": "error"}, status=status.HTTP_200_OK)
+
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
 
 class GmailWatchManageView(APIView):
@@ -1258,18 +1122,27 @@ class GmailWatchManageView(APIView):
 
     def get(self, request):
         """Get current Gmail watch status."""
-        try:
-            account = request.user.google_account
-        except GoogleAccount.DoesNotExist:
+        watch_status = cached_for_user(
+            SCOPE_GOOGLE,
+            request.user.pk,
+            "gmail_watch",
+            lambda: self._watch_status_payload(request.user),
+        )
+        if watch_status is None:
             return Response(
                 {"error": "Google Calendar not connected"},
                 status=status.HTTP_404_NOT_FOUND,
             )
+        return Response(watch_status)
 
+    @staticmethod
+    def _watch_status_payload(user):
         from .gmail_integration import get_watch_status
 
-        watch_status = get_watch_status(account)
-        return Response(watch_status)
+        account = GoogleAccount.objects.filter(user=user).first()
+        if account is None:
+            return None
+        return get_watch_status(account)
 
     def post(self, request):
         """Start Gmail watch subscription."""
@@ -3,6 +3,10 @@ ASGI config for backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve this module (e.g. ``uvicorn backend.asgi:application``) to enable the
+long-lived notification stream at /api/notifications/stream/; under WSGI the
+stream endpoint answers 503 and the frontend falls back to polling.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
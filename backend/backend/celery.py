@@ -15,6 +15,18 @@ app.conf.beat_schedule = {
         'task': 'api.tasks.renew_gmail_watches',
         'schedule': crontab(hour=2, minute=0),  # Run daily at 2 AM
     },
+    'reconcile-notification-counters-hourly': {
+        'task': 'api.tasks.reconcile_notification_counters',
+        'schedule': crontab(minute=15),  # Run hourly at :15
+    },
+    'apply-notification-retention-daily': {
+        'task': 'api.tasks.apply_notification_retention',
+        'schedule': crontab(hour=3, minute=30),  # Run daily at 3:30 AM
+    },
+    'refresh-ics-feeds': {
+        'task': 'api.tasks.refresh_ics_feeds',
+        'schedule': crontab(minute='*/15'),  # Run every 15 minutes
+    },
 }
 
 
@@ -101,6 +101,17 @@ DATABASES = {
     }
 }
 
+# SQLite pragmas applied to every new connection (see api.db). WAL plus
+# synchronous=NORMAL keeps readers unblocked and avoids an fsync per commit.
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "wal")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "normal")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(128 * 1024 * 1024)))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", str(64 * 1024)))
+
+# Rows written per transaction by bulk writers (Brightspace import, Google pull)
+BULK_WRITE_CHUNK_SIZE = int(os.getenv("BULK_WRITE_CHUNK_SIZE", "200"))
+
 # --- Password validators ---
 AUTH_PASSWORD_VALIDATORS = [
     {"NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator"},
@@ -153,6 +164,37 @@ GOOGLE_OAUTH_PROMPT = os.getenv("GOOGLE_OAUTH_PROMPT", "consent")
 GOOGLE_API_TIMEOUT_SECONDS = int(os.getenv("GOOGLE_API_TIMEOUT_SECONDS", "15"))
 GOOGLE_PUBSUB_TOPIC = os.getenv("GOOGLE_PUBSUB_TOPIC", "")
 GOOGLE_WEBHOOK_BASE_URL = os.getenv("GOOGLE_WEBHOOK_BASE_URL", "http://localhost:8000")
+# Inbox messages checked when a Gmail push arrives without a usable history cursor.
+GMAIL_RESCAN_MAX_MESSAGES = int(os.getenv("GMAIL_RESCAN_MAX_MESSAGES", "10"))
+# Pushes are processed by Celery: redeliveries of a queued push are dropped for
+# GMAIL_PUSH_DEDUP_SECONDS, and one worker at a time holds an account's sync.
+GMAIL_PUSH_DEDUP_SECONDS = int(os.getenv("GMAIL_PUSH_DEDUP_SECONDS", "600"))
+GMAIL_SYNC_LOCK_SECONDS = int(os.getenv("GMAIL_SYNC_LOCK_SECONDS", "300"))
+# Messages per Gmail batch request (Gmail accepts up to 100).
+GMAIL_BATCH_SIZE = min(int(os.getenv("GMAIL_BATCH_SIZE", "50")), 100)
+# An email is sent to the parser once it hits this many calendar keyword
+# categories within the first GMAIL_CLASSIFIER_MAX_CHARS characters.
+GMAIL_CALENDAR_THRESHOLD = int(os.getenv("GMAIL_CALENDAR_THRESHOLD", "2"))
+GMAIL_CLASSIFIER_MAX_CHARS = int(os.getenv("GMAIL_CLASSIFIER_MAX_CHARS", "20000"))
+# Parsed emails are cached by normalized content and day; 0 disables the cache.
+EMAIL_PARSE_CACHE_SECONDS = int(os.getenv("EMAIL_PARSE_CACHE_SECONDS", "86400"))
+# Emails parsed together in one Groq call, by count and estimated prompt tokens.
+EMAIL_PARSE_BATCH_SIZE = int(os.getenv("EMAIL_PARSE_BATCH_SIZE", "8"))
+EMAIL_PARSE_BATCH_TOKENS = int(os.getenv("EMAIL_PARSE_BATCH_TOKENS", "6000"))
+# Emails are trimmed to about this many tokens before going into a prompt.
+EMAIL_PARSE_MAX_INPUT_TOKENS = int(os.getenv("EMAIL_PARSE_MAX_INPUT_TOKENS", "1500"))
+# Groq calls share one client per process: at most LLM_MAX_CONCURRENCY in
+# flight, throttled to the plan's requests/tokens per minute (0 = unlimited),
+# and retried with jittered backoff on rate limits and server errors.
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+LLM_REQUESTS_PER_MINUTE = int(os.getenv("LLM_REQUESTS_PER_MINUTE", "30"))
+LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", "12000"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "30"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_RETRY_BASE_SECONDS = float(os.getenv("LLM_RETRY_BASE_SECONDS", "1"))
+# A Retry-After longer than this fails the call instead of blocking a request
+# or a Gmail sync that holds the account lock.
+LLM_MAX_RETRY_WAIT_SECONDS = float(os.getenv("LLM_MAX_RETRY_WAIT_SECONDS", "30"))
 API_USER_THROTTLE_RATE = os.getenv("API_USER_THROTTLE_RATE", "300/min")
 API_ANON_THROTTLE_RATE = os.getenv("API_ANON_THROTTLE_RATE", "60/min")
 
@@ -196,6 +238,53 @@ CELERY_TASK_ALWAYS_EAGER = os.getenv(
 ).lower() == "true"
 CELERY_TASK_EAGER_PROPAGATES = True
 
+# --- Cache (Redis in production, in-process for local dev) ---
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "locmem" if DEBUG else "redis").lower()
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://127.0.0.1:6379/2")
+if CACHE_BACKEND == "redis":
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": CACHE_REDIS_URL,
+            "KEY_PREFIX": "vcal",
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "vcal",
+        }
+    }
+API_CACHE_TIMEOUT_SECONDS = int(os.getenv("API_CACHE_TIMEOUT_SECONDS", "300"))
+# Occurrences carry "now"-relative urgency colors, so keep them short-lived.
+OCCURRENCE_CACHE_TIMEOUT_SECONDS = int(os.getenv("OCCURRENCE_CACHE_TIMEOUT_SECONDS", "60"))
+
+# --- Notification stream (SSE over Redis pub/sub, served by backend.asgi) ---
+NOTIFICATION_STREAM_ENABLED = os.getenv(
+    "NOTIFICATION_STREAM_ENABLED",
+    "false" if DEBUG else "true",
+).lower() == "true"
+NOTIFICATION_PUBSUB_URL = os.getenv("NOTIFICATION_PUBSUB_URL", CELERY_BROKER_URL)
+NOTIFICATION_STREAM_HEARTBEAT_SECONDS = int(os.getenv("NOTIFICATION_STREAM_HEARTBEAT_SECONDS", "15"))
+NOTIFICATION_STREAM_MAX_SECONDS = int(os.getenv("NOTIFICATION_STREAM_MAX_SECONDS", "600"))
+
+# --- Notification retention ---
+# Days each Notification.Type is kept before the nightly prune deletes it.
+NOTIFICATION_RETENTION_DAYS = {
+    "event_created": int(os.getenv("NOTIFICATION_RETENTION_EVENT_DAYS", "90")),
+    "event_updated": int(os.getenv("NOTIFICATION_RETENTION_EVENT_DAYS", "90")),
+    "event_deleted": int(os.getenv("NOTIFICATION_RETENTION_EVENT_DAYS", "90")),
+    "google_sync": int(os.getenv("NOTIFICATION_RETENTION_GOOGLE_SYNC_DAYS", "1")),
+    "brightspace_import": int(os.getenv("NOTIFICATION_RETENTION_IMPORT_DAYS", "30")),
+    "subscription_import": int(os.getenv("NOTIFICATION_RETENTION_IMPORT_DAYS", "30")),
+}
+NOTIFICATION_PRUNE_BATCH_SIZE = int(os.getenv("NOTIFICATION_PRUNE_BATCH_SIZE", "500"))
+NOTIFICATION_PRUNE_MAX_BATCHES = int(os.getenv("NOTIFICATION_PRUNE_MAX_BATCHES", "200"))
+NOTIFICATION_ROLLUP_MIN_SIZE = int(os.getenv("NOTIFICATION_ROLLUP_MIN_SIZE", "5"))
+NOTIFICATION_ROLLUP_WINDOW_MINUTES = int(os.getenv("NOTIFICATION_ROLLUP_WINDOW_MINUTES", "10"))
+NOTIFICATION_ROLLUP_SETTLE_MINUTES = int(os.getenv("NOTIFICATION_ROLLUP_SETTLE_MINUTES", "60"))
+
 # --- Email / Invitations ---
 EMAIL_BACKEND = os.getenv(
     "DJANGO_EMAIL_BACKEND",
@@ -205,7 +294,31 @@ DEFAULT_FROM_EMAIL = os.getenv("DJANGO_DEFAULT_FROM_EMAIL", "V-Cal <no-reply@v-c
 INVITATION_EXPIRY_DAYS = int(os.getenv("INVITATION_EXPIRY_DAYS", "14"))
 
 # --- Brightspace ---
+# Feeds are parsed as they stream in: the first limit bounds one event (and so
+# memory per import), the second bounds the whole download.
 BRIGHTSPACE_MAX_ICS_BYTES = int(os.getenv("BRIGHTSPACE_MAX_ICS_BYTES", str(5 * 1024 * 1024)))
+BRIGHTSPACE_MAX_STREAM_BYTES = int(os.getenv("BRIGHTSPACE_MAX_STREAM_BYTES", str(50 * 1024 * 1024)))
+# Calendar subscriptions share the Brightspace feed engine and the limits here.
+ICS_SUBSCRIPTIONS_MAX_PER_USER = int(os.getenv("ICS_SUBSCRIPTIONS_MAX_PER_USER", "20"))
+# Validated DNS answers for feed hosts are cached (and connections pinned to them).
+BRIGHTSPACE_DNS_CACHE_SECONDS = int(os.getenv("BRIGHTSPACE_DNS_CACHE_SECONDS", "300"))
+# Shared HTTP connection pool for feed downloads (hosts kept, connections per host).
+BRIGHTSPACE_HTTP_POOL_HOSTS = int(os.getenv("BRIGHTSPACE_HTTP_POOL_HOSTS", "16"))
+BRIGHTSPACE_HTTP_POOL_SIZE = int(os.getenv("BRIGHTSPACE_HTTP_POOL_SIZE", "8"))
+BRIGHTSPACE_HTTP_RETRIES = int(os.getenv("BRIGHTSPACE_HTTP_RETRIES", "2"))
+# Scheduled refresh: how often feeds are re-fetched, retry backoff after
+# failures, and the download pool's size and per-host politeness.
+BRIGHTSPACE_REFRESH_INTERVAL_MINUTES = int(os.getenv("BRIGHTSPACE_REFRESH_INTERVAL_MINUTES", "60"))
+BRIGHTSPACE_REFRESH_RETRY_MINUTES = int(os.getenv("BRIGHTSPACE_REFRESH_RETRY_MINUTES", "15"))
+BRIGHTSPACE_REFRESH_MAX_BACKOFF_MINUTES = int(os.getenv("BRIGHTSPACE_REFRESH_MAX_BACKOFF_MINUTES", str(24 * 60)))
+BRIGHTSPACE_REFRESH_BATCH_SIZE = int(os.getenv("BRIGHTSPACE_REFRESH_BATCH_SIZE", "500"))
+BRIGHTSPACE_REFRESH_WORKERS = int(os.getenv("BRIGHTSPACE_REFRESH_WORKERS", "8"))
+BRIGHTSPACE_REFRESH_PER_HOST = int(os.getenv("BRIGHTSPACE_REFRESH_PER_HOST", "2"))
+BRIGHTSPACE_REFRESH_HOST_INTERVAL_SECONDS = float(os.getenv("BRIGHTSPACE_REFRESH_HOST_INTERVAL_SECONDS", "1.0"))
+BRIGHTSPACE_REFRESH_HOST_MAX_BACKOFF_SECONDS = float(os.getenv("BRIGHTSPACE_REFRESH_HOST_MAX_BACKOFF_SECONDS", "60"))
+BRIGHTSPACE_REFRESH_HOST_FAILURE_LIMIT = int(os.getenv("BRIGHTSPACE_REFRESH_HOST_FAILURE_LIMIT", "3"))
+# How long a run holds the feeds it picked up, so overlapping runs skip them.
+BRIGHTSPACE_REFRESH_CLAIM_MINUTES = int(os.getenv("BRIGHTSPACE_REFRESH_CLAIM_MINUTES", "60"))
 
 # DRF throttle rates (configured after constants to use env values)
 REST_FRAMEWORK["DEFAULT_THROTTLE_RATES"] = {
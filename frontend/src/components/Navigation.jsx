@@ -4,6 +4,10 @@ import "../styles/Navigation.css";
 import { ACCESS_TOKEN, REFRESH_TOKEN } from "../constants";
 import api from "../api";
 
+const POLL_INTERVAL = 30000;
+const STREAM_RETRY_MIN_DELAY = 5000;
+const STREAM_RETRY_MAX_DELAY = 5 * 60 * 1000;
+
 function Navigation() {
   const location = useLocation();
   const navigate = useNavigate();
@@ -112,8 +116,80 @@ function Navigation() {
     if (!isAuthenticated) {
       return undefined;
     }
-    const interval = setInterval(fetchNotifications, 30000);
-    return () => clearInterval(interval);
+
+    let source = null;
+    let pollInterval = null;
+    let reconnectTimeout = null;
+    let retryDelay = STREAM_RETRY_MIN_DELAY;
+    let stopped = false;
+
+    const startPolling = () => {
+      if (!pollInterval) {
+        pollInterval = setInterval(fetchNotifications, POLL_INTERVAL);
+      }
+    };
+
+    const stopPolling = () => {
+      if (pollInterval) {
+        clearInterval(pollInterval);
+        pollInterval = null;
+      }
+    };
+
+    const connect = () => {
+      const token = localStorage.getItem(ACCESS_TOKEN);
+      if (typeof EventSource === "undefined" || !token) {
+        startPolling();
+        return;
+      }
+
+      const base = (api.defaults.baseURL || "").replace(/\/+$/, "");
+      source = new EventSource(
+        `${base}/api/notifications/stream/?token=${encodeURIComponent(token)}`,
+      );
+
+      source.addEventListener("open", () => {
+        retryDelay = STREAM_RETRY_MIN_DELAY;
+        stopPolling();
+      });
+
+      source.addEventListener("notification", (event) => {
+        const notification = JSON.parse(event.data);
+        setNotifications((current) =>
+          [notification, ...current.filter((item) => item.id !== notification.id)].slice(0, 10),
+        );
+        if (!notification.read_at) {
+          setUnreadCount((count) => count + 1);
+        }
+      });
+
+      source.addEventListener("unread_count", (event) => {
+        const { unread_count: count } = JSON.parse(event.data);
+        setUnreadCount(count || 0);
+      });
+
+      source.onerror = () => {
+        source.close();
+        source = null;
+        if (stopped) return;
+        // Poll while the stream is down; the API call also refreshes an expired token.
+        startPolling();
+        reconnectTimeout = setTimeout(async () => {
+          await fetchNotifications();
+          if (!stopped) connect();
+        }, retryDelay);
+        retryDelay = Math.min(retryDelay * 2, STREAM_RETRY_MAX_DELAY);
+      };
+    };
+
+    connect();
+
+    return () => {
+      stopped = true;
+      if (source) source.close();
+      stopPolling();
+      clearTimeout(reconnectTimeout);
+    };
   }, [fetchNotifications, isAuthenticated]);
 
   useEffect(() => {
@@ -250,7 +250,7 @@ export default function Dashboard() {
     try {
       const { data } = await api.post("/api/calendar/brightspace/import/", { ics_url: trimmed });
       setBrightspaceLinked(true);
-      setBrightspaceMessage(`Imported ${data.created} new, updated ${data.updated}.`);
+      setBrightspaceMessage(`Imported ${data.created} new, updated ${data.updated}, removed ${data.removed ?? 0}.`);
       await fetchOccurrences();
     } catch (err) {
       const message = err.response?.data?.detail || "Failed to import Brightspace calendar.";
@@ -268,7 +268,11 @@ export default function Dashboard() {
     try {
       const { data } = await api.post("/api/calendar/brightspace/import/", {});
       setBrightspaceLinked(true);
-      setBrightspaceMessage(`Refreshed: imported ${data.created}, updated ${data.updated}.`);
+      setBrightspaceMessage(
+        data.not_modified
+          ? "Brightspace calendar is already up to date."
+          : `Refreshed: imported ${data.created}, updated ${data.updated}, removed ${data.removed ?? 0}.`,
+      );
       await fetchOccurrences();
     } catch (err) {
       const message = err.response?.data?.detail || "Failed to refresh Brightspace calendar.";